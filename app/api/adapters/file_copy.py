@@ -0,0 +1,148 @@
+# Kernel-assisted file copy using copy_file_range, falling back to sendfile and then buffered reads
+import errno
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean a copy method isn't available for this pair of files, so the next one should be tried
+FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.EPERM}
+
+
+@dataclass
+class FileCopyResult:
+    bytes_copied: int
+    duration_seconds: float
+    method: str
+
+    @property
+    def throughput_mb_s(self) -> float:
+        if self.duration_seconds <= 0:
+            return 0.0
+        return self.bytes_copied / (1024 * 1024) / self.duration_seconds
+
+
+class FileCopier:
+    """Copies files in large chunks with the kernel doing the data movement where it can.
+
+    copy_file_range keeps the data in the kernel and lets filesystems that support it share
+    extents, sendfile is the older in-kernel path and buffered reads work everywhere. When
+    drop_cache is set the source is read with sequential read-ahead and both files are
+    dropped from the page cache as the copy progresses, so copying a large remux doesn't
+    evict what the media server is playing.
+    """
+    def __init__(self, chunk_size: int = 64 * 1024 * 1024, buffer_size: int = 8 * 1024 * 1024, drop_cache: bool = True):
+        self.chunk_size = chunk_size
+        self.buffer_size = buffer_size
+        self.drop_cache = drop_cache and hasattr(os, "posix_fadvise")
+
+    def copy(self, source: str, destination: str, progress: Optional[Callable[[int, int], None]] = None, throttle: Optional[Callable[[int], None]] = None) -> FileCopyResult:
+        """Copy the file contents and permission bits, like shutil.copy
+
+        Args:
+            source (str): The file to copy
+            destination (str): The file to create or truncate
+            progress (Optional[Callable[[int, int], None]]): Called with the bytes copied so far and the total after each chunk
+            throttle (Optional[Callable[[int], None]]): Called with the size of each chunk before it is copied, may block to limit the rate
+        Returns:
+            FileCopyResult: The bytes copied, how long it took and the method used
+        """
+        start_time = time.perf_counter()
+        with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+            source_fd = source_file.fileno()
+            destination_fd = destination_file.fileno()
+            size = os.fstat(source_fd).st_size
+            self._advise(source_fd, 0, 0, "POSIX_FADV_SEQUENTIAL")
+
+            methods = [("copy_file_range", self._copy_file_range), ("sendfile", self._sendfile), ("read", self._read_write)]
+            methods = [(name, function) for name, function in methods if name == "read" or hasattr(os, name)]
+            method_index = 0
+            method_copied = 0
+            offset = 0
+            while offset < size:
+                name, function = methods[method_index]
+                count = min(self.chunk_size, size - offset)
+                if throttle:
+                    throttle(count)
+                try:
+                    copied = function(source_fd, destination_fd, offset, count)
+                except OSError as e:
+                    if e.errno not in FALLBACK_ERRNOS or method_index == len(methods) - 1:
+                        raise
+                    logger.debug(f"{name} not available for {destination} ({os.strerror(e.errno)}), falling back to {methods[method_index + 1][0]}")
+                    method_index += 1
+                    method_copied = 0
+                    continue
+                if copied == 0:
+                    # Some filesystems (FUSE, NFS, overlays) signal an unsupported method by copying nothing on the first call
+                    if method_copied == 0 and method_index < len(methods) - 1:
+                        logger.debug(f"{name} copied nothing for {destination}, falling back to {methods[method_index + 1][0]}")
+                        method_index += 1
+                        continue
+                    # The source got shorter while we were copying it
+                    break
+                self._release_pages(source_fd, destination_fd, offset, copied)
+                offset += copied
+                method_copied += copied
+                if progress:
+                    progress(offset, size)
+
+        # Never let a short copy pass for a complete one, it would be renamed over the good file
+        if offset != size:
+            raise OSError(errno.EIO, f"Short copy of {source}: {offset} of {size} bytes", destination)
+
+        shutil.copymode(source, destination)
+        return FileCopyResult(bytes_copied=offset, duration_seconds=time.perf_counter() - start_time, method=methods[method_index][0])
+
+    def _copy_file_range(self, source_fd: int, destination_fd: int, offset: int, count: int) -> int:
+        copied = 0
+        while copied < count:
+            result = os.copy_file_range(source_fd, destination_fd, count - copied, offset + copied, offset + copied)
+            if result == 0:
+                break
+            copied += result
+        return copied
+
+    def _sendfile(self, source_fd: int, destination_fd: int, offset: int, count: int) -> int:
+        # sendfile writes at the current position of the destination
+        os.lseek(destination_fd, offset, os.SEEK_SET)
+        copied = 0
+        while copied < count:
+            result = os.sendfile(destination_fd, source_fd, offset + copied, count - copied)
+            if result == 0:
+                break
+            copied += result
+        return copied
+
+    def _read_write(self, source_fd: int, destination_fd: int, offset: int, count: int) -> int:
+        copied = 0
+        while copied < count:
+            data = os.pread(source_fd, min(self.buffer_size, count - copied), offset + copied)
+            if not data:
+                break
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(destination_fd, view, offset + copied)
+                copied += written
+                view = view[written:]
+        return copied
+
+    def _release_pages(self, source_fd: int, destination_fd: int, offset: int, count: int) -> None:
+        if not self.drop_cache:
+            return
+        # Dirty pages can't be dropped, so write the chunk out before advising
+        os.fdatasync(destination_fd)
+        self._advise(source_fd, offset, count, "POSIX_FADV_DONTNEED")
+        self._advise(destination_fd, offset, count, "POSIX_FADV_DONTNEED")
+
+    def _advise(self, fd: int, offset: int, length: int, advice: str) -> None:
+        if not self.drop_cache:
+            return
+        try:
+            os.posix_fadvise(fd, offset, length, getattr(os, advice))
+        except OSError:
+            pass
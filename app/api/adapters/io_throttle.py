@@ -0,0 +1,86 @@
+# Bandwidth throttling and Linux I/O scheduling classes for background file copies
+import ctypes
+import ctypes.util
+import logging
+import platform
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# ioprio_set/ioprio_get aren't wrapped by libc, so they are called by syscall number
+IOPRIO_SYSCALLS = {
+    "x86_64": (251, 252),
+    "aarch64": (30, 31),
+    "armv7l": (314, 315),
+}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_CLASS_IDLE = 3
+
+
+class TokenBucket:
+    """Limits throughput to a rate in bytes per second, allowing bursts of up to one second.
+
+    A request larger than the bucket is let through once the bucket is full and leaves it in
+    debt, so large copy chunks still average out to the configured rate.
+    """
+    def __init__(self, rate_bytes_per_second: float):
+        self.rate = rate_bytes_per_second
+        self.capacity = rate_bytes_per_second
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, count: int) -> float:
+        """Take count bytes from the bucket, sleeping until they are available
+
+        Returns:
+            float: The seconds spent waiting
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= count
+            wait_seconds = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+
+class IoPriority:
+    """Sets the I/O scheduling class of the calling thread, like `ionice -c 3` does for a process"""
+    _libc = None
+
+    @classmethod
+    def _get_syscalls(cls):
+        syscalls = IOPRIO_SYSCALLS.get(platform.machine())
+        if syscalls is None or platform.system() != "Linux":
+            return None
+        if cls._libc is None:
+            cls._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        return syscalls
+
+    @classmethod
+    @contextmanager
+    def idle(cls):
+        """Run the block in the idle I/O class, so it only gets disk time nobody else wants"""
+        syscalls = cls._get_syscalls()
+        if syscalls is None:
+            yield
+            return
+
+        ioprio_set, ioprio_get = syscalls
+        # Thread id 0 means the calling thread
+        previous = cls._libc.syscall(ioprio_get, IOPRIO_WHO_PROCESS, 0)
+        if cls._libc.syscall(ioprio_set, IOPRIO_WHO_PROCESS, 0, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) != 0:
+            logger.debug(f"Failed to set idle I/O priority: errno {ctypes.get_errno()}")
+            yield
+            return
+        try:
+            yield
+        finally:
+            if previous >= 0:
+                cls._libc.syscall(ioprio_set, IOPRIO_WHO_PROCESS, 0, previous)
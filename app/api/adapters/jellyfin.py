@@ -1,5 +1,7 @@
 import httpx
+import time
 from typing import Optional, Dict, Any
+from app.core.metrics import JELLYFIN_REQUEST_DURATION_SECONDS
 from app.core.status import Status
 import logging
 
@@ -17,14 +19,25 @@ class JellyfinClient:
             }
         )
 
+    async def _request(self, method: str, endpoint: str, **kwargs) -> httpx.Response:
+        """Send a request, recording its latency by endpoint and status, or error when it failed"""
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await self.client.request(method, endpoint, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            JELLYFIN_REQUEST_DURATION_SECONDS.observe(time.perf_counter() - started, method=method, endpoint=endpoint, status=status)
+
     async def get_system_info(self) -> Dict[str, Any]:
         """Get Jellyfin system information"""
-        response = await self.client.get("/System/Info")
+        response = await self._request("GET", "/System/Info")
         return response.json()
 
     async def get_libraries(self) -> Dict[str, Any]:
         """Get all Jellyfin libraries"""
-        response = await self.client.get("/Library/MediaFolders")
+        response = await self._request("GET", "/Library/MediaFolders")
         return response.json()
 
     async def get_items(
@@ -42,7 +55,7 @@ class JellyfinClient:
         if include_item_types:
             params["includeItemTypes"] = include_item_types
 
-        response = await self.client.get("/Items", params=params)
+        response = await self._request("GET", "/Items", params=params)
         return response.json()
 
     async def close(self):
@@ -52,7 +65,7 @@ class JellyfinClient:
     async def refresh_media(self):
         """Refresh the media library"""
         try:
-            response = await self.client.post("/Library/Refresh")
+            response = await self._request("POST", "/Library/Refresh")
             if response.status_code == 204:  # No Content
                 return {
                     "status": Status.SUCCESS,
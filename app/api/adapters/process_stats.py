@@ -0,0 +1,36 @@
+# Resource counters of this process, to see what a piece of work cost beyond its wall time
+import logging
+import platform
+import resource
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PROC_IO_FILE = "/proc/self/io"
+
+@dataclass
+class ProcessStats:
+    cpu_seconds: float              # User and system time of all threads
+    syscalls: Optional[int]         # Read and write class syscalls, None where /proc/self/io isn't available
+    peak_rss_bytes: int             # High-water mark of the resident set since the process started
+
+def _read_syscalls() -> Optional[int]:
+    try:
+        with open(PROC_IO_FILE, "r") as f:
+            counters = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(counters["syscr"]) + int(counters["syscw"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def get_process_stats() -> ProcessStats:
+    """Take a snapshot of the counters, subtract two of them to get the cost of the work in between"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    peak_rss_bytes = max_rss if platform.system() == "Darwin" else max_rss * 1024
+    return ProcessStats(
+        cpu_seconds=time.process_time(),
+        syscalls=_read_syscalls(),
+        peak_rss_bytes=peak_rss_bytes
+    )
@@ -0,0 +1,36 @@
+# FastAPI dependencies that hand the routers the shared managers of the application container
+from fastapi import Request
+
+from app.api.managers.cache_manager import CacheManager
+from app.api.managers.data_manager import DataManager
+from app.api.managers.job_manager import JobManager
+from app.api.managers.media_manager import MediaManager
+from app.api.managers.media_server import MediaServer
+from app.api.managers.sync_history_manager import SyncHistoryManager
+from app.api.managers.sync_manager import SyncManager
+from app.core.container import AppContainer
+
+def get_container(request: Request) -> AppContainer:
+    """Dependency to get the application container created in the lifespan"""
+    return request.app.state.container
+
+def get_media_manager(request: Request) -> MediaManager:
+    return get_container(request).media_manager
+
+def get_cache_manager(request: Request) -> CacheManager:
+    return get_container(request).cache_manager
+
+def get_sync_manager(request: Request) -> SyncManager:
+    return get_container(request).sync_manager
+
+def get_sync_history_manager(request: Request) -> SyncHistoryManager:
+    return get_container(request).sync_history_manager
+
+def get_job_manager(request: Request) -> JobManager:
+    return get_container(request).job_manager
+
+def get_data_manager(request: Request) -> DataManager:
+    return get_container(request).data_manager
+
+def get_media_server(request: Request) -> MediaServer:
+    return get_container(request).media_server
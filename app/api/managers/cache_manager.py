@@ -1,6 +1,6 @@
 import logging
 from datetime import datetime
-from typing import List, Dict, Optional, Any
+from typing import Iterator, List, Dict, Optional, Any, Tuple
 from pathlib import Path
 
 from app.api.managers.data_manager import DataManager
@@ -13,12 +13,12 @@ from app.api.models.search_request import SearchRequest
 logger = logging.getLogger(__name__)
 
 class CacheManager:
-    def __init__(self, config: dict[str, Any]):
+    def __init__(self, config: dict[str, Any], media_manager: Optional[MediaManager] = None, item_manager: Optional[ItemManager] = None):
         self.config = config
         self.cache_path = Path(config.get("cache_path", ""))
-        self.media_manager = MediaManager(config)
+        self.media_manager = media_manager or MediaManager(config)
         self.data_manager = DataManager(config)
-        self.item_manager = ItemManager(config)
+        self.item_manager = item_manager or ItemManager(config)
 
     def list_cache(self) -> MediaItemGroupDict:
         """List all cache contents"""
@@ -47,6 +47,15 @@ class CacheManager:
             logger.error(f"Error listing cache: {str(e)}", exc_info=True)
             raise e
 
+    def iter_cache(self) -> Iterator[Tuple[str, MediaItem]]:
+        """Lazily yield all cache contents as (group, item) pairs, using the same groups as list_cache"""
+        for item in self.media_manager.iter_media(SearchRequest(query="", db_type=[MediaDbType.CACHE])):
+            yield "cache", item
+        for item in self.data_manager.get_add_cache_items():
+            yield "add_cache", item
+        for item in self.data_manager.get_remove_cache_items():
+            yield "remove_cache", item
+
     def add_to_cache(self, data: dict, dry_run: bool = False) -> Dict:
         """Add items to cache based on search criteria"""
         try:
@@ -60,9 +69,14 @@ class CacheManager:
                 episode=data.get("episode"),
                 matrix_filepath=data.get("matrix_filepath"),
                 relative_filepath=data.get("relative_filepath"),
-                db_type=[MediaDbType.MEDIA]
+                db_type=[MediaDbType.MEDIA],
+                add_extended_info=True
             )
 
+            # Pick up anything downloaded since the last scan, reading only the folders the request can match
+            if not self.media_manager.media_index.live:
+                self.media_manager.refresh_media_for_request(request)
+
             # Use media manager to search for items
             result = self.media_manager.search_media(request)
 
@@ -122,6 +136,12 @@ class CacheManager:
             logger.error(f"Error removing from cache: {str(e)}", exc_info=True)
             raise e
 
+    def remove_pre_cache_items(self, add_items: List[MediaItem], remove_items: List[MediaItem]):
+        """Remove only the given items from the pre cache, requests made since they were read are kept"""
+        self.data_manager.remove_add_cache_items(add_items)
+        self.data_manager.remove_remove_cache_items(remove_items)
+        self.data_manager.update()
+
     def clear_pre_cache(self):
         """Clear the pre cache"""
         # Clear both add and remove cache lists
@@ -1,5 +1,6 @@
 # class to store persisted data between sessions
 
+import threading
 from typing import Any
 
 from app.api.models.media_models import MediaItem
@@ -20,17 +21,29 @@ class DataManager(BaseDataPersistence):
             super().__init__(system_folder=config["system_data_path"], data_filename="data.json")
             self.config = config
             self.item_manager = ItemManager(config)
+            # The API threads, the watcher and a running sync all update the pre-cache lists and request count
+            self._lock = threading.RLock()
             self._initialized = True
 
+    def update(self) -> None:
+        with self._lock:
+            super().update()
+
     def set_add_cache_items(self, items: list[MediaItem]):
         self.set_data("add_cache_items", [item.model_dump() for item in items])
 
     def append_add_cache_items(self, items: list[MediaItem]):
-        # Get existing items
-        existing_items = self.get_add_cache_items()
-        # Merge with new items ensuring uniqueness
-        merged_list = self.item_manager.merge_unique_items(existing_items, items)
-        self.set_data("add_cache_items", [item.model_dump() for item in merged_list])
+        with self._lock:
+            # Get existing items
+            existing_items = self.get_add_cache_items()
+            # Merge with new items ensuring uniqueness
+            merged_list = self.item_manager.merge_unique_items(existing_items, items)
+            self.set_data("add_cache_items", [item.model_dump() for item in merged_list])
+
+    def remove_add_cache_items(self, items: list[MediaItem]):
+        with self._lock:
+            remaining_items = self.item_manager.remove_items_from_list(self.get_add_cache_items(), items)
+            self.set_add_cache_items(remaining_items)
 
     def get_add_cache_items(self) -> list[MediaItem]:
         data = self.get_data("add_cache_items") or []
@@ -61,19 +74,32 @@ class DataManager(BaseDataPersistence):
         return valid_items
 
     def append_remove_cache_items(self, items: list[MediaItem]):
-        # Get existing items
-        existing_items = [MediaItem(**item) for item in (self.get_data("remove_cache_items") or []) if item is not None]
-        # Merge with new items ensuring uniqueness
-        merged_list = self.item_manager.merge_unique_items(existing_items, items)
-        self.set_data("remove_cache_items", [item.model_dump() for item in merged_list])
+        with self._lock:
+            # Get existing items
+            existing_items = [MediaItem(**item) for item in (self.get_data("remove_cache_items") or []) if item is not None]
+            # Merge with new items ensuring uniqueness
+            merged_list = self.item_manager.merge_unique_items(existing_items, items)
+            self.set_data("remove_cache_items", [item.model_dump() for item in merged_list])
+
+    def remove_remove_cache_items(self, items: list[MediaItem]):
+        with self._lock:
+            remaining_items = self.item_manager.remove_items_from_list(self.get_remove_cache_items(), items)
+            self.set_data("remove_cache_items", [item.model_dump() for item in remaining_items])
 
     def get_media_library_update_request(self) -> int   :
         return self.get_data("media_library_update_request") or 0   
 
     def set_media_library_update_request(self):
-        no_requests = self.get_media_library_update_request()
-        self.set_data("media_library_update_request", no_requests + 1)
-        self.update()
+        with self._lock:
+            no_requests = self.get_media_library_update_request()
+            self.set_data("media_library_update_request", no_requests + 1)
+            self.update()
 
     def clear_media_library_update_request(self) -> None:
         self.set_data("media_library_update_request", 0)
+
+    def remove_media_library_update_requests(self, count: int) -> None:
+        """Take away the requests a sync has handled, keeping those made while it ran"""
+        with self._lock:
+            no_requests = self.get_media_library_update_request()
+            self.set_data("media_library_update_request", max(0, no_requests - count))
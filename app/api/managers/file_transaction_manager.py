@@ -2,14 +2,152 @@ import logging
 import os
 import shutil
 import json
-from typing import Any, List
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from app.api.models.file_transaction_models import ExistingFileAction, FileApplyTransactionSettings, FileOperationType, FileSequenceTransaction, FileSequenceTransactionOperation, FileTransaction, FileTransactionList, FileTransactionSettings, FileTransactionSummary
+from app.api.adapters.file_copy import FileCopier, FileCopyResult
+from app.api.adapters.file_locality import get_physical_offset
+from app.api.adapters.io_throttle import IoPriority, TokenBucket
+from app.api.managers.fingerprint_cache import FingerprintCache
+from app.api.managers.transaction_journal import TransactionJournal, TransactionJournalState
+from app.api.models.file_transaction_models import ExistingFileAction, FileApplyTransactionSettings, FileCopyStats, FileOperationType, FileSequenceTransaction, FileSequenceTransactionOperation, FileTransaction, FileTransactionList, FileTransactionPriority, FileTransactionSettings, FileTransactionSummary
+from app.core.metrics import FILE_TRANSACTION_BYTES, FILE_TRANSACTIONS
+from app.core.settings import settings as app_settings
+
+@dataclass
+class FileTransactionResult:
+    """The summary list a transaction goes in, and the file operation it performed"""
+    summary_field: Optional[str] = None
+    operation: Optional[FileSequenceTransactionOperation] = None
+    copy_result: Optional[FileCopyResult] = None
+
+class DeviceMap:
+    """Maps paths to the block device they live on
+
+    Paths are mapped to the DEVICES entry with the longest matching mount_point, and
+    otherwise to the st_dev of the path or its nearest existing parent.
+    """
+    def __init__(self, devices: Dict[str, Dict[str, Any]]):
+        self.devices = devices or {}
+        self._folder_devices: Dict[str, str] = {}
+
+    def get_device_key(self, path: str) -> str:
+        folder = os.path.dirname(path)
+        device_key = self._folder_devices.get(folder)
+        if device_key is not None:
+            return device_key
+
+        mount_points = [(name, device["mount_point"]) for name, device in self.devices.items() if device.get("mount_point")]
+        matches = [(len(mount_point), name) for name, mount_point in mount_points
+                   if path == mount_point or path.startswith(mount_point.rstrip(os.sep) + os.sep)]
+        if matches:
+            device_key = max(matches)[1]
+        else:
+            existing_path = folder
+            while existing_path and not os.path.exists(existing_path) and os.path.dirname(existing_path) != existing_path:
+                existing_path = os.path.dirname(existing_path)
+            try:
+                device_key = f"st_dev:{os.stat(existing_path or os.sep).st_dev}"
+            except OSError:
+                device_key = "st_dev:unknown"
+        self._folder_devices[folder] = device_key
+        return device_key
+
+    def get_device_setting(self, device_key: str, name: str, default: Any) -> Any:
+        """Get a setting of a DEVICES entry, devices only known by st_dev get the default"""
+        return self.devices.get(device_key, {}).get(name, default)
+
+class DeviceLimiter:
+    """Limits how many file operations run at once on each block device"""
+    def __init__(self, device_map: DeviceMap, default_concurrency: int):
+        self.device_map = device_map
+        self.default_concurrency = default_concurrency
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.Semaphore] = {}
+
+    def _get_semaphore(self, device_key: str) -> threading.Semaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(device_key)
+            if semaphore is None:
+                concurrency = self.device_map.get_device_setting(device_key, "max_concurrency", self.default_concurrency)
+                semaphore = self._semaphores[device_key] = threading.Semaphore(max(1, int(concurrency)))
+            return semaphore
+
+    @contextmanager
+    def limit(self, paths: List[str]):
+        """Hold a slot on the device of every path, taken in a fixed order so workers can't deadlock"""
+        semaphores = [self._get_semaphore(device_key) for device_key in sorted({self.device_map.get_device_key(path) for path in paths if path})]
+        acquired = []
+        try:
+            for semaphore in semaphores:
+                semaphore.acquire()
+                acquired.append(semaphore)
+            yield
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+
+class DeviceThrottle:
+    """Limits the copy bandwidth of each block device with a token bucket, max_mb_s of 0 means unlimited"""
+    def __init__(self, device_map: DeviceMap, default_mb_s: float):
+        self.device_map = device_map
+        self.default_mb_s = default_mb_s
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}
+
+    def _get_bucket(self, device_key: str) -> Optional[TokenBucket]:
+        with self._lock:
+            if device_key not in self._buckets:
+                mb_s = float(self.device_map.get_device_setting(device_key, "max_mb_s", self.default_mb_s) or 0)
+                self._buckets[device_key] = TokenBucket(mb_s * 1024 * 1024) if mb_s > 0 else None
+            return self._buckets[device_key]
+
+    def is_throttled(self, paths: List[str]) -> bool:
+        return any(self._get_bucket(self.device_map.get_device_key(path)) for path in paths if path)
+
+    def consume(self, paths: List[str], count: int) -> None:
+        """Wait until count bytes may be read from or written to the device of every path"""
+        for device_key in sorted({self.device_map.get_device_key(path) for path in paths if path}):
+            bucket = self._get_bucket(device_key)
+            if bucket:
+                bucket.consume(count)
 
 class FileTransactionManager:
+    # Copies are written under this suffix and renamed into place once complete
+    PARTIAL_SUFFIX = ".mvm-partial"
+
     def __init__(self, config: dict[str, Any]):
         self.config = config
         self.file_transaction_settings = FileTransactionSettings(existing_file_action=ExistingFileAction.OVERWRITE)
+        file_transactions_config = config.get("file_transactions", {})
+        self.parallel = file_transactions_config.get("parallel", False)
+        self.max_workers = file_transactions_config.get("max_workers", 8)
+        self.device_concurrency = file_transactions_config.get("device_concurrency", 2)
+        self.device_map = DeviceMap(app_settings.DEVICES or {})
+        self.device_throttle = DeviceThrottle(self.device_map, file_transactions_config.get("max_mb_s", 0))
+        # How copies are ordered on each source device: "plan", "path", "inode" or "extent" (falls back to inode)
+        self.copy_order = file_transactions_config.get("copy_order", "extent")
+        # Run BACKGROUND priority transactions in the idle I/O class, so they yield the disk to playback
+        self.background_idle_io = file_transactions_config.get("background_idle_io", True)
+        self.file_copier = FileCopier(
+            chunk_size=file_transactions_config.get("copy_chunk_mb", 64) * 1024 * 1024,
+            drop_cache=file_transactions_config.get("copy_drop_cache", True))
+        # Called with the transaction, bytes copied so far and the file size while a COPY runs
+        self.copy_progress_callback: Optional[Callable[[FileTransaction, int, int], None]] = None
+        # Called before each transaction, an exception it raises stops the apply between two transactions
+        self.before_transaction_callback: Optional[Callable[[FileTransaction], None]] = None
+        # Called after each transaction has been applied
+        self.after_transaction_callback: Optional[Callable[[FileTransaction], None]] = None
+        # Records every apply so an interrupted one can be finished by resume_file_transactions
+        self.journal = None
+        if file_transactions_config.get("journal", True) and config.get("system_data_path"):
+            self.journal = TransactionJournal(config)
+        self.fingerprint_cache = FingerprintCache(config) if config.get("system_data_path") else None
 
     def _write_metadata_file(self, file_path: str, metadata: dict[str, Any]) -> None:
         """Write metadata to a .meta file alongside the target file
@@ -46,22 +184,95 @@ class FileTransactionManager:
             
         if settings.existing_file_action == ExistingFileAction.SKIP_IF_SAME_SIZE:
             return os.path.exists(source_path) and os.path.exists(dest_path) and os.path.getsize(source_path) == os.path.getsize(dest_path)
+
+        if settings.existing_file_action == ExistingFileAction.SKIP_IF_SAME_INODE:
+            return self.is_same_inode(source_path, dest_path)
+
+        if settings.existing_file_action == ExistingFileAction.SKIP_IF_SAME_FINGERPRINT:
+            if self.fingerprint_cache:
+                return self.fingerprint_cache.is_same_content(source_path, dest_path)
+            return (os.path.exists(source_path) and os.path.getsize(source_path) == os.path.getsize(dest_path)
+                    and FingerprintCache.compute_digest(source_path, os.path.getsize(source_path)) == FingerprintCache.compute_digest(dest_path, os.path.getsize(dest_path)))
             
         return False
 
-    def _ensure_target_directory_exists(self, file_path: str, sequence_transactions: List[FileSequenceTransaction], dry_run: bool = False) -> None:
-        """Ensure the target directory exists for a file path
+    def is_same_content(self, source_path: str, dest_path: str) -> bool:
+        """Check if the destination already holds the content of the source, as a COPY would skip it
+
+        Args:
+            source_path (str): Path to the source file
+            dest_path (str): Path to the destination file
+
+        Returns:
+            bool: True if the destination exists and has the same fingerprint as the source
+        """
+        return self._should_skip_file(source_path, dest_path, FileTransactionSettings(existing_file_action=ExistingFileAction.SKIP_IF_SAME_FINGERPRINT))
+
+    def is_same_inode(self, source_path: str, dest_path: str) -> bool:
+        """Check if both paths are the same file on the same device, as a hard link is
         
         Args:
-            file_path (str): Path to the target file
+            source_path (str): Path to the source file
+            dest_path (str): Path to the destination file
+            
+        Returns:
+            bool: True if both exist and share (st_dev, st_ino), False otherwise
+        """
+        try:
+            source_stat = os.stat(source_path)
+            dest_stat = os.stat(dest_path)
+        except FileNotFoundError:
+            return False
+        return (source_stat.st_dev, source_stat.st_ino) == (dest_stat.st_dev, dest_stat.st_ino)
+
+    def _create_target_directories(self, transactions: List[FileTransaction], summary: FileTransactionSummary, dry_run: bool = False) -> List[str]:
+        """Create the target directories of the transactions once, before any file operation
+
+        Each directory is checked once, in sorted order so parents come before their children,
+        and the folders makedirs creates along the way are remembered rather than checked again.
+
+        Args:
+            transactions (List[FileTransaction]): The transactions about to be applied
+            summary (FileTransactionSummary): The summary to record the created folders and their cost in
             dry_run (bool): If True, simulate the operation without actually performing it
+        Returns:
+            List[str]: The folders that were created, ancestors included
         """
-        target_dir = os.path.dirname(file_path)
-        if target_dir and not os.path.exists(target_dir):
-            if not dry_run:
-                os.makedirs(target_dir)
-            sequence_transactions.append(FileSequenceTransaction(operation=FileSequenceTransactionOperation.CREATE_FOLDER, source=target_dir, destination=target_dir))
-            
+        start_time = time.perf_counter()
+        created_folders = []
+        target_dirs = sorted({os.path.dirname(transaction.destination) for transaction in transactions
+                              if transaction.type != FileOperationType.DELETE and os.path.dirname(transaction.destination)})
+        existing_dirs = set()
+        for target_dir in target_dirs:
+            if target_dir in existing_dirs:
+                continue
+            if not os.path.isdir(target_dir):
+                if not dry_run:
+                    folder = target_dir
+                    while folder and folder not in existing_dirs and not os.path.isdir(folder):
+                        created_folders.append(folder)
+                        parent = os.path.dirname(folder)
+                        folder = parent if parent != folder else None
+                    os.makedirs(target_dir, exist_ok=True)
+                summary.sequence_transactions.append(FileSequenceTransaction(operation=FileSequenceTransactionOperation.CREATE_FOLDER, source=target_dir, destination=target_dir))
+                summary.folders_created += 1
+            # Every ancestor exists now as well
+            folder = target_dir
+            while folder and folder not in existing_dirs:
+                existing_dirs.add(folder)
+                parent = os.path.dirname(folder)
+                folder = parent if parent != folder else None
+        summary.folder_creation_seconds += time.perf_counter() - start_time
+        return created_folders
+
+    def _remove_created_folders(self, created_folders: List[str]) -> None:
+        """Remove the created folders that are still empty, deepest first"""
+        for folder in sorted(created_folders, key=lambda x: x.count(os.sep), reverse=True):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                pass
+
     def _is_dir_empty(self, dir_path: str) -> bool:
         """Check if a directory is empty
         
@@ -96,6 +307,248 @@ class FileTransactionManager:
             logging.error(f"Error while removing empty parent directories for {file_path}: {str(e)}")
             raise
 
+    def _apply_file_transaction(self, transaction: FileTransaction, settings: FileApplyTransactionSettings, dry_run: bool = False) -> FileTransactionResult:
+        """Apply a single file transaction, the target directory must already exist
+        
+        Args:
+            transaction (FileTransaction): The file transaction to apply
+            settings (FileApplyTransactionSettings): Settings for applying transactions
+            dry_run (bool): If True, simulate the operation without actually performing it
+            
+        Returns:
+            FileTransactionResult: Where the transaction goes in the summary
+        """
+        transaction_settings = transaction.settings or self.file_transaction_settings
+        if transaction.type == FileOperationType.COPY:
+            if os.path.exists(transaction.destination):
+                if self._should_skip_file(transaction.source, transaction.destination, transaction_settings):
+                    return FileTransactionResult(summary_field="skipped_transactions")
+                # The old file stays in place until the new copy is renamed over it
+                result = FileTransactionResult(summary_field="updated_transactions", operation=FileSequenceTransactionOperation.UPDATE_FILE)
+            else:
+                result = FileTransactionResult(summary_field="added_transactions", operation=FileSequenceTransactionOperation.COPY_FILE)
+            if not dry_run:
+                result.copy_result = self._copy_file(transaction)
+                if settings.write_file_metadata and transaction.metadata:
+                    self._write_metadata_file(transaction.destination, transaction.metadata)
+            return result
+        elif transaction.type == FileOperationType.MOVE:
+            if os.path.exists(transaction.destination):
+                if self._should_skip_file(transaction.source, transaction.destination, transaction_settings):
+                    return FileTransactionResult(summary_field="skipped_transactions")
+                if not dry_run:
+                    os.remove(transaction.destination)
+                result = FileTransactionResult(summary_field="updated_transactions", operation=FileSequenceTransactionOperation.UPDATE_FILE)
+            else:
+                result = FileTransactionResult(summary_field="added_transactions", operation=FileSequenceTransactionOperation.MOVE_FILE)
+            if not dry_run:
+                shutil.move(transaction.source, transaction.destination)
+                if settings.write_file_metadata and transaction.metadata:
+                    self._write_metadata_file(transaction.destination, transaction.metadata)
+            return result
+        elif transaction.type == FileOperationType.DELETE:
+            if not os.path.exists(transaction.source):
+                return FileTransactionResult()
+            if not dry_run:
+                os.remove(transaction.source)
+                # Also remove metadata file if it exists
+                meta_path = f"{transaction.source}.meta"
+                if os.path.exists(meta_path):
+                    os.remove(meta_path)
+                # Remove empty parent directories
+                #self._remove_empty_parent_dirs(transaction.source)
+            return FileTransactionResult(summary_field="deleted_transactions", operation=FileSequenceTransactionOperation.DELETE_FILE)
+        elif transaction.type == FileOperationType.LINK:
+            if os.path.exists(transaction.destination):
+                if self._should_skip_file(transaction.source, transaction.destination, transaction_settings):
+                    return FileTransactionResult(summary_field="skipped_transactions")
+                if not dry_run:
+                    os.remove(transaction.destination)
+                result = FileTransactionResult(summary_field="updated_transactions", operation=FileSequenceTransactionOperation.UPDATE_FILE)
+            else:
+                result = FileTransactionResult(summary_field="linked_transactions", operation=FileSequenceTransactionOperation.LINK_FILE)
+            if not dry_run:
+                os.link(transaction.source, transaction.destination)
+                if settings.write_file_metadata and transaction.metadata:
+                    self._write_metadata_file(transaction.destination, transaction.metadata)
+            return result
+        else:
+            raise ValueError(f"Invalid file operation type: {transaction.type}")
+
+    def _run_file_transaction(self, transaction: FileTransaction, settings: FileApplyTransactionSettings, dry_run: bool = False) -> FileTransactionResult:
+        if transaction.priority == FileTransactionPriority.BACKGROUND and self.background_idle_io and not dry_run:
+            with IoPriority.idle():
+                return self._apply_file_transaction(transaction, settings, dry_run)
+        return self._apply_file_transaction(transaction, settings, dry_run)
+
+    def _order_copies(self, transactions: List[FileTransaction], dry_run: bool = False) -> List[FileTransaction]:
+        """Reorder the copies by priority, then by source device and where the source sits on it
+
+        Reading the sources in disk order keeps a hard disk head moving forward instead of
+        seeking across the platter between every file. Copies are only reordered within a
+        run of consecutive copies, so a copy never moves past a delete of its destination or
+        a link to it. Copies sharing a path with another copy of the run keep their place,
+        the others are sorted into the remaining places, so the result is the same as in plan
+        order. A dry run only sorts by priority, it doesn't read where the sources sit.
+        """
+        ordered = []
+        run: List[FileTransaction] = []
+        for transaction in transactions + [None]:
+            if transaction is not None and transaction.type == FileOperationType.COPY:
+                run.append(transaction)
+                continue
+            path_counts = Counter(path for copy in run for path in (copy.source, copy.destination))
+            free_slots = [i for i, copy in enumerate(run) if path_counts[copy.source] == 1 and path_counts[copy.destination] == 1]
+            if self.copy_order == "plan" or dry_run:
+                sort_key = lambda x: x.priority.order
+            else:
+                sort_key = lambda x: (x.priority.order, self.device_map.get_device_key(x.source), self._get_locality_key(x.source))
+            for slot, copy in zip(free_slots, sorted((run[i] for i in free_slots), key=sort_key)):
+                run[slot] = copy
+            ordered.extend(run)
+            run = []
+            if transaction is not None:
+                ordered.append(transaction)
+        return ordered
+
+    def _get_locality_key(self, path: str) -> Tuple:
+        if self.copy_order == "path":
+            return tuple(os.path.normpath(path).split(os.sep))
+        try:
+            inode = os.stat(path).st_ino
+        except OSError:
+            # Missing sources fail on their own, keep them out of the way
+            return (2, 0)
+        if self.copy_order == "extent":
+            offset = get_physical_offset(path)
+            if offset is not None:
+                return (0, offset)
+        return (1, inode)
+
+    def _copy_file(self, transaction: FileTransaction) -> FileCopyResult:
+        progress = None
+        if self.copy_progress_callback:
+            progress = lambda copied, total: self.copy_progress_callback(transaction, copied, total)
+        throttle = None
+        if self.device_throttle.is_throttled([transaction.source, transaction.destination]):
+            throttle = lambda count: self.device_throttle.consume([transaction.source, transaction.destination], count)
+        # Copy to a temporary name first, so a crash never leaves a partial file under the real name
+        partial_path = f"{transaction.destination}{self.PARTIAL_SUFFIX}"
+        try:
+            copy_result = self.file_copier.copy(transaction.source, partial_path, progress=progress, throttle=throttle)
+            # The journal marks a copy done durably once this returns, so the data and the rename must be on disk first
+            self._fsync_path(partial_path)
+            os.replace(partial_path, transaction.destination)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        self._fsync_path(os.path.dirname(transaction.destination))
+        logging.debug(f"Copied {copy_result.bytes_copied} bytes to {transaction.destination} in {copy_result.duration_seconds:.2f}s "
+                      f"({copy_result.throughput_mb_s:.1f} MB/s, {copy_result.method})")
+        return copy_result
+
+    def _fsync_path(self, path: str) -> None:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _record_transaction_result(self, summary: FileTransactionSummary, transaction: FileTransaction, result: FileTransactionResult, dry_run: bool = False) -> None:
+        if not dry_run:
+            FILE_TRANSACTIONS.inc(type=transaction.type.value, result=result.summary_field.removesuffix("_transactions") if result.summary_field else "none")
+            if result.copy_result:
+                FILE_TRANSACTION_BYTES.inc(result.copy_result.bytes_copied, type=transaction.type.value)
+        if result.summary_field:
+            getattr(summary, result.summary_field).append(transaction)
+        if result.operation:
+            summary.sequence_transactions.append(FileSequenceTransaction(operation=result.operation, source=transaction.source, destination=transaction.destination))
+        if result.copy_result:
+            summary.copied_bytes += result.copy_result.bytes_copied
+            summary.copy_stats.append(FileCopyStats(
+                source=transaction.source,
+                destination=transaction.destination,
+                bytes_copied=result.copy_result.bytes_copied,
+                duration_seconds=result.copy_result.duration_seconds,
+                throughput_mb_s=result.copy_result.throughput_mb_s,
+                method=result.copy_result.method))
+
+    def _apply_file_transactions_parallel(self, transactions: List[FileTransaction], indexes: List[int], summary: FileTransactionSummary, settings: FileApplyTransactionSettings, journal: Optional[TransactionJournal] = None) -> None:
+        """Apply the file transactions on a worker pool, with the concurrency limited per device
+
+        Target directories have been created up front by the caller. Transactions that share
+        a path run in order on the same worker, and with apply_delete_first every delete
+        finishes before anything else starts. The results are recorded in transaction order,
+        so the summary is the same as a serial run.
+
+        Args:
+            transactions (List[FileTransaction]): The file transactions, in order
+            indexes (List[int]): The indexes of the transactions to apply
+            summary (FileTransactionSummary): The summary to record the results in
+            settings (FileApplyTransactionSettings): Settings for applying transactions
+            journal (Optional[TransactionJournal]): If set, each finished transaction is marked done in it
+        """
+        if settings.apply_delete_first:
+            delete_indexes = [i for i in indexes if transactions[i].type == FileOperationType.DELETE]
+            other_indexes = [i for i in indexes if transactions[i].type != FileOperationType.DELETE]
+            phases = [delete_indexes, other_indexes]
+        else:
+            phases = [indexes]
+
+        device_limiter = DeviceLimiter(self.device_map, self.device_concurrency)
+        results: Dict[int, FileTransactionResult] = {}
+
+        def apply_chain(chain: List[int]) -> None:
+            for i in chain:
+                transaction = transactions[i]
+                if self.before_transaction_callback:
+                    self.before_transaction_callback(transaction)
+                with device_limiter.limit([transaction.source, transaction.destination]):
+                    results[i] = self._run_file_transaction(transaction, settings)
+                if journal:
+                    journal.mark_done(i, durable=transaction.type in (FileOperationType.COPY, FileOperationType.MOVE))
+                if self.after_transaction_callback:
+                    self.after_transaction_callback(transaction)
+
+        for phase in phases:
+            chains = self._get_transaction_chains(transactions, phase)
+            executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="file-transaction")
+            try:
+                for future in as_completed([executor.submit(apply_chain, chain) for chain in chains]):
+                    future.result()
+            finally:
+                # Stop queued chains as soon as one fails, like the serial loop stops at the failing transaction
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        for i in indexes:
+            self._record_transaction_result(summary, transactions[i], results[i])
+
+    def _get_transaction_chains(self, transactions: List[FileTransaction], indexes: List[int]) -> List[List[int]]:
+        """Group the transactions that share a source or destination path, keeping their order within each group"""
+        parents = {i: i for i in indexes}
+
+        def find(i: int) -> int:
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        path_owners: Dict[str, int] = {}
+        for i in indexes:
+            for path in (transactions[i].source, transactions[i].destination):
+                if not path:
+                    continue
+                if path in path_owners:
+                    parents[find(i)] = find(path_owners[path])
+                else:
+                    path_owners[path] = i
+
+        chains: Dict[int, List[int]] = {}
+        for i in indexes:
+            chains.setdefault(find(i), []).append(i)
+        return list(chains.values())
+
     def apply_file_transactions(self, file_transactions: FileTransactionList, settings: FileApplyTransactionSettings = None, dry_run: bool = False) -> FileTransactionSummary:
         """Apply the file transactions to the file system
         
@@ -108,98 +561,122 @@ class FileTransactionManager:
             FileTransactionSummary: Summary of the applied transactions
         """
         settings = settings or FileApplyTransactionSettings()
+        # A dry run may run next to a real apply, it leaves the journal of that apply alone
+        journal = self.journal if not dry_run else None
 
         try:
-            summary = FileTransactionSummary(
-                added_transactions=[],
-                skipped_transactions=[],
-                deleted_transactions=[],
-                linked_transactions=[],
-                updated_transactions=[],
-                sequence_transactions=[]
-            )
+            summary = self._create_summary()
             
             # Apply list in this order: DELETE, LINK, COPY, MOVE, if apply_delete_first set
-            transactions = file_transactions.transactions 
+            transactions = list(file_transactions.transactions)
             if settings.apply_delete_first:
-               # Make a copy of the transactions list
-               transactions = FileTransactionList(transactions=[transactions])
-               transactions.sort(key=lambda x: x.type.order)
-
-            for transaction in transactions:
-                transaction_settings = transaction.settings or self.file_transaction_settings
-                if transaction.type == FileOperationType.COPY:
-                    self._ensure_target_directory_exists(transaction.destination, summary.sequence_transactions, dry_run=dry_run)
-                    if os.path.exists(transaction.destination):
-                        if self._should_skip_file(transaction.source, transaction.destination, transaction_settings):
-                            summary.skipped_transactions.append(transaction)
-                            continue
-                        if not dry_run:
-                            os.remove(transaction.destination)
-                        summary.updated_transactions.append(transaction)
-                        summary.sequence_transactions.append(FileSequenceTransaction(operation=FileSequenceTransactionOperation.UPDATE_FILE, source=transaction.source, destination=transaction.destination))
-                    else:
-                        summary.added_transactions.append(transaction)
-                        summary.sequence_transactions.append(FileSequenceTransaction(operation=FileSequenceTransactionOperation.COPY_FILE, source=transaction.source, destination=transaction.destination))
-                    if not dry_run:
-                        shutil.copy(transaction.source, transaction.destination)
-                        if settings.write_file_metadata and transaction.metadata:
-                            self._write_metadata_file(transaction.destination, transaction.metadata)
-                elif transaction.type == FileOperationType.MOVE:
-                    self._ensure_target_directory_exists(transaction.destination, summary.sequence_transactions, dry_run=dry_run)
-                    if os.path.exists(transaction.destination):
-                        if self._should_skip_file(transaction.source, transaction.destination, transaction_settings):
-                            summary.skipped_transactions.append(transaction)
-                            continue
-                        if not dry_run:
-                            os.remove(transaction.destination)
-                        summary.updated_transactions.append(transaction)
-                        summary.sequence_transactions.append(FileSequenceTransaction(operation=FileSequenceTransactionOperation.UPDATE_FILE, source=transaction.source, destination=transaction.destination))
-                    else:
-                        summary.added_transactions.append(transaction)
-                        summary.sequence_transactions.append(FileSequenceTransaction(operation=FileSequenceTransactionOperation.MOVE_FILE, source=transaction.source, destination=transaction.destination))
-                    if not dry_run:
-                        shutil.move(transaction.source, transaction.destination)
-                        if settings.write_file_metadata and transaction.metadata:
-                            self._write_metadata_file(transaction.destination, transaction.metadata)
-                elif transaction.type == FileOperationType.DELETE:
-                    if os.path.exists(transaction.source):
-                        if not dry_run:
-                            os.remove(transaction.source)
-                            # Also remove metadata file if it exists
-                            meta_path = f"{transaction.source}.meta"
-                            if os.path.exists(meta_path):
-                                os.remove(meta_path)
-                            # Remove empty parent directories
-                            #self._remove_empty_parent_dirs(transaction.source)
-                        summary.deleted_transactions.append(transaction)
-                        summary.sequence_transactions.append(FileSequenceTransaction(operation=FileSequenceTransactionOperation.DELETE_FILE, source=transaction.source, destination=transaction.destination))
-                elif transaction.type == FileOperationType.LINK:
-                    self._ensure_target_directory_exists(transaction.destination, summary.sequence_transactions, dry_run=dry_run)
-                    if os.path.exists(transaction.destination):
-                        if self._should_skip_file(transaction.source, transaction.destination, transaction_settings):
-                            summary.skipped_transactions.append(transaction)
-                            continue
-                        if not dry_run:
-                            os.remove(transaction.destination)
-                        summary.updated_transactions.append(transaction)
-                        summary.sequence_transactions.append(FileSequenceTransaction(operation=FileSequenceTransactionOperation.UPDATE_FILE, source=transaction.source, destination=transaction.destination))
-                    else:
-                        summary.linked_transactions.append(transaction)
-                        summary.sequence_transactions.append(FileSequenceTransaction(operation=FileSequenceTransactionOperation.LINK_FILE, source=transaction.source, destination=transaction.destination))
-                    if not dry_run:
-                        os.link(transaction.source, transaction.destination)
-                        if settings.write_file_metadata and transaction.metadata:
-                            self._write_metadata_file(transaction.destination, transaction.metadata)
-                else:
-                    raise ValueError(f"Invalid file operation type: {transaction.type}")
-            
+                transactions.sort(key=lambda x: x.type.order)
+            transactions = self._order_copies(transactions, dry_run)
+
+            if journal:
+                journal.begin(transactions, settings)
+            self._apply_indexed_transactions(transactions, list(range(len(transactions))), summary, settings, dry_run, journal)
+            if journal:
+                journal.complete()
+
             return summary
             
         except Exception as e:
             logging.error(f"Error applying file transactions: {str(e)}", exc_info=True)
+            if journal:
+                journal.close()
+            raise e
+
+    def has_interrupted_transactions(self) -> bool:
+        return self.journal is not None and self.journal.exists()
+
+    def load_interrupted_transactions(self, dry_run: bool = False) -> Optional[TransactionJournalState]:
+        """Load the journal of an interrupted apply, to resume it with resume_file_transactions
+
+        Args:
+            dry_run (bool): If True, only read the journal, otherwise keep it open to record into
+        Returns:
+            Optional[TransactionJournalState]: The journaled transactions, None if there is nothing to resume
+        """
+        if not self.journal:
+            return None
+        return self.journal.load() if dry_run else self.journal.resume()
+
+    def resume_file_transactions(self, dry_run: bool = False, state: Optional[TransactionJournalState] = None) -> Optional[FileTransactionSummary]:
+        """Finish the transactions of an interrupted apply from the journal, without planning them again
+
+        Transactions marked done are not looked at again. One that was running when the apply
+        was interrupted is applied again, a copy that had finished is then skipped by its
+        existing file action and an unfinished copy never got past its temporary name.
+
+        Args:
+            dry_run (bool): If True, only show what would be applied
+            state (Optional[TransactionJournalState]): The state from load_interrupted_transactions, loaded here if not set
+        Returns:
+            Optional[FileTransactionSummary]: Summary of the remaining transactions, None if there is nothing to resume
+        """
+        if not self.journal:
+            return None
+
+        try:
+            if state is None:
+                state = self.load_interrupted_transactions(dry_run)
+            if state is None:
+                return None
+
+            remaining_indexes = state.get_remaining_indexes()
+            logging.info(f"Resuming {len(remaining_indexes)} of {len(state.transactions)} file transactions")
+            summary = self._create_summary()
+            self._apply_indexed_transactions(state.transactions, remaining_indexes, summary, state.settings, dry_run,
+                                             None if dry_run else self.journal)
+            if not dry_run:
+                self.journal.complete()
+            return summary
+
+        except Exception as e:
+            logging.error(f"Error resuming file transactions: {str(e)}", exc_info=True)
+            if not dry_run:
+                self.journal.close()
             raise e
 
+    def _create_summary(self) -> FileTransactionSummary:
+        return FileTransactionSummary(
+            added_transactions=[],
+            skipped_transactions=[],
+            deleted_transactions=[],
+            linked_transactions=[],
+            updated_transactions=[],
+            sequence_transactions=[]
+        )
+
+    def _apply_indexed_transactions(self, transactions: List[FileTransaction], indexes: List[int], summary: FileTransactionSummary, settings: FileApplyTransactionSettings, dry_run: bool, journal: Optional[TransactionJournal]) -> None:
+        created_folders = self._create_target_directories([transactions[i] for i in indexes], summary, dry_run=dry_run)
+        try:
+            self._run_indexed_transactions(transactions, indexes, summary, settings, dry_run, journal)
+        except BaseException:
+            # The folders were made up front, those of transactions that never ran would stay behind empty
+            self._remove_created_folders(created_folders)
+            raise
+
+    def _run_indexed_transactions(self, transactions: List[FileTransaction], indexes: List[int], summary: FileTransactionSummary, settings: FileApplyTransactionSettings, dry_run: bool, journal: Optional[TransactionJournal]) -> None:
+        parallel = settings.parallel if settings.parallel is not None else self.parallel
+        if parallel and not dry_run:
+            self._apply_file_transactions_parallel(transactions, indexes, summary, settings, journal)
+            return
+
+        # The progress callbacks belong to the job of the real apply, a dry run doesn't report to it
+        before_callback = self.before_transaction_callback if not dry_run else None
+        after_callback = self.after_transaction_callback if not dry_run else None
+        for i in indexes:
+            transaction = transactions[i]
+            if before_callback:
+                before_callback(transaction)
+            self._record_transaction_result(summary, transaction, self._run_file_transaction(transaction, settings, dry_run), dry_run)
+            if journal:
+                journal.mark_done(i, durable=transaction.type in (FileOperationType.COPY, FileOperationType.MOVE))
+            if after_callback:
+                after_callback(transaction)
+
     def get_file_transactions_remove_unreferenced_files(self, base_path: str, file_transactions: FileTransactionList) -> FileTransactionList:
         # Recursively get all files in base_path, and if this does not exist in the file transactions for COPY, UPDATE then add to a delete trasnaction list
         delete_transactions = []
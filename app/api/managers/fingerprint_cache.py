@@ -0,0 +1,110 @@
+# Cheap content fingerprints of media files, cached per inode in the system data folder
+import hashlib
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+@dataclass
+class FileFingerprint:
+    size: int
+    mtime_ns: int
+    digest: str
+
+    def is_same_content(self, other: "FileFingerprint") -> bool:
+        """Compare the content only, a copy gets a new mtime so it isn't part of the comparison"""
+        return self.size == other.size and self.digest == other.digest
+
+
+class FingerprintCache:
+    """Fingerprints files by their size and a hash of a few sampled blocks.
+
+    Hashing the head, middle and tail catches re-encodes and truncated copies that happen
+    to have the same size, without reading the whole of a multi-gigabyte file. Fingerprints
+    are cached by device and inode, and only recomputed when the size or mtime changes.
+    """
+    _instance = None
+    CACHE_FILE_NAME = "file_fingerprints.db"
+    BLOCK_SIZE = 64 * 1024
+    # Files up to this size are hashed in full, the samples would cover most of them anyway
+    FULL_HASH_SIZE = 4 * BLOCK_SIZE
+
+    def __new__(cls, config: dict[str, Any]):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, config: dict[str, Any]):
+        if not self._initialized:
+            self.system_folder = config["system_data_path"]
+            self.cache_file = os.path.join(self.system_folder, self.CACHE_FILE_NAME)
+
+            # Create system folder if it doesn't exist
+            os.makedirs(self.system_folder, exist_ok=True)
+
+            # Shared by the file transaction workers, so guard the connection with a lock
+            self._lock = threading.RLock()
+            self._connection = sqlite3.connect(self.cache_file, check_same_thread=False)
+            with self._lock, self._connection:
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.execute("""
+                    CREATE TABLE IF NOT EXISTS file_fingerprints (
+                        device INTEGER NOT NULL,
+                        inode INTEGER NOT NULL,
+                        size INTEGER NOT NULL,
+                        mtime_ns INTEGER NOT NULL,
+                        digest TEXT NOT NULL,
+                        PRIMARY KEY (device, inode)
+                    )""")
+            self._initialized = True
+
+    def get_fingerprint(self, path: str) -> Optional[FileFingerprint]:
+        """Get the fingerprint of a file, None if it doesn't exist"""
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT size, mtime_ns, digest FROM file_fingerprints WHERE device = ? AND inode = ?",
+                (stat_result.st_dev, stat_result.st_ino)).fetchone()
+        if row and row[0] == stat_result.st_size and row[1] == stat_result.st_mtime_ns:
+            return FileFingerprint(size=row[0], mtime_ns=row[1], digest=row[2])
+
+        fingerprint = FileFingerprint(
+            size=stat_result.st_size,
+            mtime_ns=stat_result.st_mtime_ns,
+            digest=self.compute_digest(path, stat_result.st_size))
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO file_fingerprints (device, inode, size, mtime_ns, digest) VALUES (?, ?, ?, ?, ?)",
+                (stat_result.st_dev, stat_result.st_ino, fingerprint.size, fingerprint.mtime_ns, fingerprint.digest))
+        return fingerprint
+
+    @classmethod
+    def compute_digest(cls, path: str, size: int) -> str:
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            if size <= cls.FULL_HASH_SIZE:
+                hasher.update(f.read())
+            else:
+                for offset in (0, size // 2 - cls.BLOCK_SIZE // 2, size - cls.BLOCK_SIZE):
+                    hasher.update(os.pread(f.fileno(), cls.BLOCK_SIZE, offset))
+        return hasher.hexdigest()
+
+    def is_same_content(self, source_path: str, dest_path: str) -> bool:
+        # Files of different sizes differ, don't read either of them to tell
+        try:
+            if os.stat(source_path).st_size != os.stat(dest_path).st_size:
+                return False
+        except FileNotFoundError:
+            return False
+        source_fingerprint = self.get_fingerprint(source_path)
+        dest_fingerprint = self.get_fingerprint(dest_path)
+        if source_fingerprint is None or dest_fingerprint is None:
+            return False
+        return source_fingerprint.is_same_content(dest_fingerprint)
@@ -1,20 +1,51 @@
 from enum import Enum
 import os
 from pathlib import Path
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
 from app.api.managers.matrix_manager import MatrixManager
-from app.api.models.media_models import ExtendedMediaInfo, MediaDbType, MediaItem
+from app.api.models.media_models import ExtendedMediaInfo, MediaDbType, MediaItem, MediaLibraryInfo
 
 class ItemMatchKey(Enum):
     RELATIVE_TITLE_FILEPATH = "relative_title_filepath"
     FULL_PATH = "full_path"
     TITLE_PATH = "title_path"
 
+class MediaItemIndex:
+    """Items grouped by the key of an ItemMatchKey, so matching an item is a dict lookup instead of a list scan.
+
+    Build it once for the list being searched and reuse it for every lookup.
+    """
+    def __init__(self, items: Iterable[MediaItem], key_function: Callable[[MediaItem], str]):
+        self.key_function = key_function
+        self._items: Dict[str, List[MediaItem]] = {}
+        for item in items:
+            self.add(item)
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._items.values())
+
+    def __contains__(self, item: MediaItem) -> bool:
+        return self.key_function(item) in self._items
+
+    def add(self, item: MediaItem) -> None:
+        self._items.setdefault(self.key_function(item), []).append(item)
+
+    def contains_key(self, key: str) -> bool:
+        return key in self._items
+
+    def get(self, item: MediaItem) -> Optional[MediaItem]:
+        """Get the first indexed item with the same key as the item"""
+        items = self._items.get(self.key_function(item))
+        return items[0] if items else None
+
+    def get_all(self, item: MediaItem) -> List[MediaItem]:
+        """Get every indexed item with the same key as the item, in the order they were added"""
+        return list(self._items.get(self.key_function(item), []))
+
 class ItemManager:
-    def __init__(self, config: dict[str, Any]):
+    def __init__(self, config: dict[str, Any], media_library_info: Optional[MediaLibraryInfo] = None):
         self.config = config
-        self.matrix_manager = MatrixManager(config)
-        self.media_library_info = self.matrix_manager.get_media_library_info()
+        self.media_library_info = media_library_info or MatrixManager(config).get_media_library_info()
         
     def get_extended_info(self, item: MediaItem) -> ExtendedMediaInfo:
         if item.extended:
@@ -39,6 +70,14 @@ class ItemManager:
         elif match_key == ItemMatchKey.RELATIVE_TITLE_FILEPATH:
             return self.get_relative_title_file_path
 
+    def create_item_index(self, items: Iterable[MediaItem], match_key: ItemMatchKey=ItemMatchKey.FULL_PATH) -> MediaItemIndex:
+        return MediaItemIndex(items, self.get_match_key_function(match_key))
+
+    def _get_item_index(self, items: Union[list[MediaItem], MediaItemIndex], match_key: ItemMatchKey) -> MediaItemIndex:
+        if isinstance(items, MediaItemIndex):
+            return items
+        return self.create_item_index(items, match_key)
+
     def get_unique_id(self, item: MediaItem, match_key: ItemMatchKey=ItemMatchKey.FULL_PATH) -> str:
         # Unique id is the title relative path
         return self.get_unique_id_by_function(item, self.get_match_key_function(match_key))
@@ -125,10 +164,10 @@ class ItemManager:
         Returns:
             list[MediaItem]: Combined list with duplicates removed
         """
-        # Get unique IDs for existing items
-        existing_ids = self.get_unique_id_list(existing_items)
+        # Index the existing items
+        existing_index = self.create_item_index(existing_items)
         # Filter out items that already exist
-        unique_new_items = [item for item in new_items if self.get_unique_id(item) not in existing_ids]
+        unique_new_items = [item for item in new_items if item not in existing_index]
         # Return combined list
         combined_list = existing_items + unique_new_items
         return combined_list
@@ -140,39 +179,38 @@ class ItemManager:
             items (list[MediaItem]): List of items to remove from
             remove_items (list[MediaItem]): List of items to remove
         """
-        # Get unique IDs for remove items
-        remove_ids = self.get_unique_id_list(remove_items)
+        # Index the remove items
+        remove_index = self.create_item_index(remove_items)
         # Filter out items that are in the remove list
-        remaining_items = [item for item in items if self.get_unique_id(item) not in remove_ids]
+        remaining_items = [item for item in items if item not in remove_index]
         # Return the remaining items
         return remaining_items
 
-    def is_item_in_list(self, item: MediaItem, items: list[MediaItem], match_key: ItemMatchKey=ItemMatchKey.FULL_PATH) -> bool:
+    def is_item_in_list(self, item: MediaItem, items: Union[list[MediaItem], MediaItemIndex], match_key: ItemMatchKey=ItemMatchKey.FULL_PATH) -> bool:
         """Check if an item is in a list based on unique_id.
         
         Args:
             item (MediaItem): Item to check
-            items (list[MediaItem]): List of items to check against
+            items (list[MediaItem] | MediaItemIndex): List of items to check against, pass an index built with
+                create_item_index when checking many items against the same list
         """
-        func = self.get_match_key_function(match_key)
-        return any(func(item) == func(existing_item) for existing_item in items)
+        return item in self._get_item_index(items, match_key)
         
-    def get_matching_item(self, item: MediaItem, items: list[MediaItem], match_key: ItemMatchKey=ItemMatchKey.FULL_PATH) -> MediaItem:
+    def get_matching_item(self, item: MediaItem, items: Union[list[MediaItem], MediaItemIndex], match_key: ItemMatchKey=ItemMatchKey.FULL_PATH) -> MediaItem:
         """Get the first item in a list that matches a given item based on unique_id.
         
         Args:
             item (MediaItem): Item to check
-            items (list[MediaItem]): List of items to check against
+            items (list[MediaItem] | MediaItemIndex): List of items to check against, pass an index built with
+                create_item_index when matching many items against the same list
         """
-        func = self.get_match_key_function(match_key)
-        return next((existing_item for existing_item in items if func(item) == func(existing_item)), None)
+        return self._get_item_index(items, match_key).get(item)
 
-    def get_matching_items(self, item: MediaItem, items: list[MediaItem], match_key: ItemMatchKey=ItemMatchKey.FULL_PATH) -> list[MediaItem]:
+    def get_matching_items(self, item: MediaItem, items: Union[list[MediaItem], MediaItemIndex], match_key: ItemMatchKey=ItemMatchKey.FULL_PATH) -> list[MediaItem]:
         """Get all items in a list that match a given item based on unique_id.
         
         Args:
             item (MediaItem): Item to check
-            items (list[MediaItem]): List of items to check against
+            items (list[MediaItem] | MediaItemIndex): List of items to check against
         """
-        func = self.get_match_key_function(match_key)
-        return [existing_item for existing_item in items if func(item) == func(existing_item)]
+        return self._get_item_index(items, match_key).get_all(item)
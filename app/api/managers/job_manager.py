@@ -0,0 +1,268 @@
+# Background jobs for long running operations such as sync, with progress and cooperative cancellation
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.api.managers.file_transaction_manager import FileTransactionManager
+from app.api.models.file_transaction_models import FileOperationType, FileTransaction
+from app.api.models.job_models import Job, JobStatus, JobType
+
+logger = logging.getLogger(__name__)
+
+# Phases of a job that hasn't started its work yet, other requests can still be coalesced into it
+WAITING_PHASES = ("pending", "waiting")
+
+class JobCancelledError(Exception):
+    """Raised inside a job at the next safe point after it has been asked to cancel"""
+
+class JobHandle:
+    """What a running job uses to report its progress and to notice a cancel request
+
+    Updates come from worker threads, so they go through a lock, and readers get a copy.
+    """
+    def __init__(self, job: Job):
+        self._job = job
+        self._lock = threading.Lock()
+        self._copied: Dict[int, int] = {}
+        self._sizes: Dict[int, int] = {}
+        self._progress_started_at: Optional[float] = None
+
+    @property
+    def id(self) -> str:
+        return self._job.id
+
+    def snapshot(self) -> Job:
+        with self._lock:
+            return self._job.model_copy(deep=True)
+
+    def set_phase(self, phase: str, cancellable: bool = True) -> None:
+        """Move on to the next phase, a cancel requested so far stops the job here if it's cancellable"""
+        if cancellable:
+            self.check_cancelled()
+        with self._lock:
+            self._job.progress.phase = phase
+        logger.debug(f"Job {self.id} phase: {phase}")
+
+    def check_cancelled(self) -> None:
+        if self._job.cancel_requested:
+            raise JobCancelledError(f"Job {self.id} was cancelled")
+
+    def request_cancel(self) -> None:
+        with self._lock:
+            self._job.cancel_requested = True
+
+    def start(self) -> None:
+        with self._lock:
+            self._job.status = JobStatus.RUNNING
+            self._job.started_at = time.time()
+
+    def finish(self, status: JobStatus, result: Any = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._job.status = status
+            self._job.result = result
+            self._job.error = error
+            self._job.finished_at = time.time()
+            if status == JobStatus.COMPLETED:
+                self._job.progress.phase = "done"
+                self._job.progress.eta_seconds = 0
+
+    def is_finished(self) -> bool:
+        return self._job.status.is_finished
+
+    def merge_parameters(self, merge: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]) -> bool:
+        """Coalesce another request into this job while it hasn't started its work
+
+        Args:
+            merge (Callable): Gets the current parameters and returns the merged ones, or None if the request doesn't fit
+        Returns:
+            bool: True if the request was merged, False if the job has moved on or the request doesn't fit
+        """
+        with self._lock:
+            if self._job.progress.phase not in WAITING_PHASES or self._job.status.is_finished or self._job.cancel_requested:
+                return False
+            parameters = merge(dict(self._job.parameters))
+            if parameters is None:
+                return False
+            self._job.parameters = parameters
+            return True
+
+    def take_parameters(self, phase: str) -> Dict[str, Any]:
+        """Move on to phase and return the parameters, nothing can be coalesced into the job after this"""
+        self.check_cancelled()
+        with self._lock:
+            self._job.progress.phase = phase
+            return dict(self._job.parameters)
+
+    @contextmanager
+    def track_file_transactions(self, file_transaction_manager: FileTransactionManager, transactions: List[FileTransaction]):
+        """Report the progress of applying the transactions, and stop between them when cancelled
+
+        The callbacks of the file transaction manager are set for the duration of the block.
+        """
+        sizes = {}
+        for transaction in transactions:
+            if transaction.type in (FileOperationType.COPY, FileOperationType.MOVE):
+                try:
+                    sizes[id(transaction)] = os.path.getsize(transaction.source)
+                except OSError:
+                    sizes[id(transaction)] = 0
+        with self._lock:
+            self._sizes = sizes
+            self._copied = {}
+            self._progress_started_at = time.monotonic()
+            progress = self._job.progress
+            progress.transactions_total = len(transactions)
+            progress.transactions_done = 0
+            progress.bytes_total = sum(sizes.values())
+            progress.bytes_done = 0
+            progress.bytes_copied = 0
+            progress.eta_seconds = None
+
+        file_transaction_manager.before_transaction_callback = lambda transaction: self.check_cancelled()
+        file_transaction_manager.after_transaction_callback = self._on_transaction_done
+        file_transaction_manager.copy_progress_callback = self._on_copy_progress
+        try:
+            yield
+        finally:
+            file_transaction_manager.before_transaction_callback = None
+            file_transaction_manager.after_transaction_callback = None
+            file_transaction_manager.copy_progress_callback = None
+
+    def _on_copy_progress(self, transaction: FileTransaction, copied: int, total: int) -> None:
+        with self._lock:
+            delta = copied - self._copied.get(id(transaction), 0)
+            self._copied[id(transaction)] = copied
+            self._job.progress.bytes_done += delta
+            self._job.progress.bytes_copied += delta
+            self._update_eta()
+
+    def _on_transaction_done(self, transaction: FileTransaction) -> None:
+        with self._lock:
+            progress = self._job.progress
+            progress.transactions_done += 1
+            # A skipped or failed copy counts as done, so the ETA doesn't wait for bytes that will never come
+            progress.bytes_done += self._sizes.get(id(transaction), 0) - self._copied.pop(id(transaction), 0)
+            self._update_eta()
+
+    def _update_eta(self) -> None:
+        progress = self._job.progress
+        elapsed = time.monotonic() - self._progress_started_at
+        if progress.bytes_total and progress.bytes_done:
+            progress.eta_seconds = elapsed * (progress.bytes_total - progress.bytes_done) / progress.bytes_done
+        elif progress.transactions_total and progress.transactions_done:
+            progress.eta_seconds = elapsed * (progress.transactions_total - progress.transactions_done) / progress.transactions_done
+
+class JobManager:
+    """Runs operations as background jobs and keeps their state in memory
+
+    Jobs run on the event loop they are submitted from, their blocking work is expected to
+    be in worker threads. Finished jobs are kept until max_finished_jobs newer ones finished.
+    """
+    _instance = None
+
+    def __new__(cls, config: dict[str, Any]):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, config: dict[str, Any]):
+        if not self._initialized:
+            self.config = config
+            self.max_finished_jobs = config.get("jobs", {}).get("max_finished_jobs", 50)
+            self._lock = threading.Lock()
+            self._handles: Dict[str, JobHandle] = {}
+            self._tasks: Dict[str, asyncio.Task] = {}
+            self._initialized = True
+
+    def create_job(self, job_type: JobType, parameters: Optional[Dict[str, Any]] = None) -> JobHandle:
+        handle = JobHandle(Job(id=uuid.uuid4().hex, type=job_type, parameters=parameters or {}, created_at=time.time()))
+        with self._lock:
+            self._handles[handle.id] = handle
+        return handle
+
+    async def run_job(self, handle: JobHandle, function: Callable[[JobHandle], Awaitable[Any]]) -> Any:
+        """Run a job to completion on the current event loop, recording its outcome
+
+        Returns:
+            Any: The result of the function, None if the job failed or was cancelled
+        """
+        handle.start()
+        result = None
+        try:
+            result = await function(handle)
+        except JobCancelledError:
+            logger.info(f"Job {handle.id} cancelled")
+            handle.finish(JobStatus.CANCELLED)
+        except Exception as e:
+            logger.error(f"Job {handle.id} failed: {str(e)}")
+            handle.finish(JobStatus.FAILED, error=str(e))
+        else:
+            handle.finish(JobStatus.COMPLETED, result=result)
+        self._prune_finished_jobs()
+        return result
+
+    def submit(self, job_type: JobType, parameters: Dict[str, Any], function: Callable[[JobHandle], Awaitable[Any]]) -> Job:
+        """Start a job in the background of the running event loop and return it straight away"""
+        job, _ = self.submit_or_attach(job_type, parameters, function)
+        return job
+
+    def submit_or_attach(self, job_type: JobType, parameters: Dict[str, Any], function: Callable[[JobHandle], Awaitable[Any]],
+                         merge: Optional[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = None) -> Tuple[Job, bool]:
+        """Start a job, or coalesce the request into a job of the same type that hasn't started its work yet
+
+        Args:
+            merge (Optional[Callable]): Merges the request into the parameters of a waiting job, see JobHandle.merge_parameters,
+                without it a new job is always started
+        Returns:
+            Tuple[Job, bool]: The job and whether the request was attached to an existing one
+        """
+        with self._lock:
+            if merge:
+                for handle in sorted(self._handles.values(), key=lambda x: x.snapshot().created_at):
+                    if handle.snapshot().type == job_type and handle.merge_parameters(merge):
+                        logger.debug(f"Attached {job_type.value} request to job {handle.id}")
+                        return handle.snapshot(), True
+            handle = JobHandle(Job(id=uuid.uuid4().hex, type=job_type, parameters=parameters, created_at=time.time()))
+            self._handles[handle.id] = handle
+            task = asyncio.get_running_loop().create_task(self.run_job(handle, function))
+            # Hold a reference, the event loop only keeps weak ones to its tasks
+            self._tasks[handle.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(handle.id, None))
+        return handle.snapshot(), False
+
+    async def wait_for_job(self, job_id: str) -> Optional[Job]:
+        """Wait for a job submitted on this event loop to finish"""
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        handle = self._handles.get(job_id)
+        return handle.snapshot() if handle else None
+
+    def list_jobs(self) -> List[Job]:
+        with self._lock:
+            handles = list(self._handles.values())
+        return sorted((handle.snapshot() for handle in handles), key=lambda x: x.created_at, reverse=True)
+
+    def cancel_job(self, job_id: str) -> Optional[Job]:
+        """Ask a job to stop, it does so at the next phase or between two file transactions"""
+        handle = self._handles.get(job_id)
+        if handle is None:
+            return None
+        if not handle.is_finished():
+            handle.request_cancel()
+        return handle.snapshot()
+
+    def _prune_finished_jobs(self) -> None:
+        with self._lock:
+            finished = sorted((handle for handle in self._handles.values() if handle.is_finished()), key=lambda x: x.snapshot().created_at)
+            for handle in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+                del self._handles[handle.id]
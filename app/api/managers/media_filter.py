@@ -6,6 +6,19 @@ from app.api.models.search_request import SearchRequest
 class MediaFilter:
     def __init__(self, request: SearchRequest):
         self.request = request
+        # Title matches are remembered, most items share their title with many others
+        self._lowered_query = None
+        self._title_matches: dict[str, bool] = {}
+
+    def is_title_match(self, title: str) -> bool:
+        if not self.request.query:
+            return True
+        is_match = self._title_matches.get(title)
+        if is_match is None:
+            if self._lowered_query is None:
+                self._lowered_query = self.request.query.lower()
+            is_match = self._title_matches[title] = self._lowered_query in title.lower()
+        return is_match
 
     def is_match(self, media_item: MediaItem) -> bool:
         # Check if the media item matches the request
@@ -15,7 +28,7 @@ class MediaFilter:
             return False
         if self.request.quality and self.request.quality != media_item.quality:
             return False
-        if self.request.query and self.request.query.lower() not in media_item.title.lower():
+        if not self.is_title_match(media_item.title):
             return False
         if self.request.season and self.request.season != media_item.season:
             return False
@@ -0,0 +1,306 @@
+# Persistent index of the media files found under each db_type, stored in SQLite in the system data folder
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.api.managers.title_index import TitleIndex
+from app.api.models.media_models import ExtendedMediaInfo, MediaDbType, MediaItem
+from app.api.models.search_request import SearchRequest
+
+
+class MediaIndex:
+    _instance = None
+    INDEX_FILE_NAME = "media_index.db"
+    SCHEMA_VERSION = 2
+    MAX_SQL_TITLES = 500
+
+    def __new__(cls, config: dict[str, Any]):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, config: dict[str, Any]):
+        if not self._initialized:
+            self.config = config
+            self.system_folder = config["system_data_path"]
+            self.index_file = os.path.join(self.system_folder, self.INDEX_FILE_NAME)
+
+            # Create system folder if it doesn't exist
+            os.makedirs(self.system_folder, exist_ok=True)
+
+            # The connection is shared by the API worker threads and the scheduler, so guard it with a lock
+            self._lock = threading.RLock()
+            self._connection = sqlite3.connect(self.index_file, check_same_thread=False)
+            self._connection.row_factory = sqlite3.Row
+            self._create_schema()
+
+            # Held while a refresh reads and then writes back the folder state
+            self.refresh_lock = threading.Lock()
+            # Set by the media watcher while it keeps the index up to date from inotify events
+            self.live = False
+
+            # Distinct titles for substring title queries, kept in step with media_files
+            self.title_index = TitleIndex()
+            self._load_title_index()
+            self._initialized = True
+
+    def _create_schema(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+
+            # The index only caches the filesystem, so an outdated layout is simply rebuilt
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                self._connection.execute("DROP TABLE IF EXISTS media_files")
+                self._connection.execute("DROP TABLE IF EXISTS media_folders")
+                self._connection.execute("DROP TABLE IF EXISTS media_index_scans")
+                self._connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS media_files (
+                    full_file_path TEXT PRIMARY KEY,
+                    folder_path TEXT NOT NULL,
+                    db_type TEXT NOT NULL,
+                    media_type TEXT NOT NULL,
+                    media_prefix TEXT NOT NULL,
+                    quality TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    relative_title_filepath TEXT NOT NULL,
+                    season INTEGER,
+                    episode INTEGER,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    mtime REAL NOT NULL,
+                    inode INTEGER NOT NULL
+                )""")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_media_files_group ON media_files (db_type, media_prefix, quality)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_media_files_folder ON media_files (folder_path)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_media_files_title ON media_files (db_type, title)")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS media_folders (
+                    path TEXT PRIMARY KEY,
+                    parent_path TEXT NOT NULL,
+                    db_type TEXT NOT NULL,
+                    mtime_ns INTEGER NOT NULL
+                )""")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_media_folders_parent ON media_folders (parent_path)")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS media_index_scans (
+                    db_type TEXT PRIMARY KEY,
+                    scanned_at REAL NOT NULL
+                )""")
+
+    def _load_title_index(self) -> None:
+        with self._lock:
+            self.title_index.clear()
+            for row in self._connection.execute("SELECT title, COUNT(*) AS file_count FROM media_files GROUP BY title"):
+                self.title_index.add(row["title"], row["file_count"])
+
+    def find_titles(self, query: str) -> Set[str]:
+        """Get the distinct indexed titles containing the query, case-insensitively"""
+        with self._lock:
+            return self.title_index.search(query)
+
+    def is_scanned(self, db_type: MediaDbType) -> bool:
+        """Check if the db_type has been scanned into the index at least once"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT scanned_at FROM media_index_scans WHERE db_type = ?", (db_type.value,)).fetchone()
+        return row is not None
+
+    def get_total_size(self, db_type: MediaDbType) -> int:
+        """Get the summed size in bytes of the indexed files of a db_type"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) AS total_size FROM media_files WHERE db_type = ?", (db_type.value,)).fetchone()
+        return row["total_size"]
+
+    def get_folders(self, db_type: MediaDbType, root_paths: Optional[List[str]] = None) -> Dict[str, Tuple[str, int]]:
+        """Get the folders recorded by the last scan of a db_type
+
+        Args:
+            db_type (MediaDbType): The db_type to read
+            root_paths (Optional[List[str]]): If set, only return these folders and the folders below them
+        Returns:
+            Dict[str, Tuple[str, int]]: Parent path and mtime in nanoseconds, keyed by folder path
+        """
+        scope_sql, scope_params = self._get_scope_clause(root_paths)
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT path, parent_path, mtime_ns FROM media_folders WHERE db_type = ?{scope_sql}",
+                [db_type.value] + scope_params).fetchall()
+        return {row["path"]: (row["parent_path"], row["mtime_ns"]) for row in rows}
+
+    def get_child_folders(self, db_type: MediaDbType, parent_paths: List[str]) -> List[str]:
+        """Get the indexed folders directly below any of the parent paths"""
+        if not parent_paths:
+            return []
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT path FROM media_folders WHERE db_type = ? AND parent_path IN ({', '.join('?' * len(parent_paths))})",
+                [db_type.value] + parent_paths).fetchall()
+        return [row["path"] for row in rows]
+
+    def apply_folder_scan(self, db_type: MediaDbType, folders: Dict[str, Tuple[str, int]], changed_folders: Dict[str, List[MediaItem]], root_paths: Optional[List[str]] = None) -> None:
+        """Store the result of a folder scan of a db_type
+
+        Args:
+            db_type (MediaDbType): The db_type that was scanned
+            folders (Dict[str, Tuple[str, int]]): Every folder seen by the scan, with its parent path and mtime
+            changed_folders (Dict[str, List[MediaItem]]): The files of each folder that was listed, with extended info populated
+            root_paths (Optional[List[str]]): If set, the scan only covered these folders and the folders below them
+        """
+        scope_sql, scope_params = self._get_scope_clause(root_paths)
+        with self._lock, self._connection:
+            known_folders = {row["path"] for row in self._connection.execute(
+                f"SELECT path FROM media_folders WHERE db_type = ?{scope_sql}", [db_type.value] + scope_params)}
+
+            # Drop the files of folders that were relisted or have disappeared
+            stale_folders = set(changed_folders) | (known_folders - set(folders))
+            for path in stale_folders:
+                for row in self._connection.execute(
+                        "SELECT title, COUNT(*) AS file_count FROM media_files WHERE folder_path = ? GROUP BY title", (path,)):
+                    self.title_index.remove(row["title"], row["file_count"])
+            self._connection.executemany(
+                "DELETE FROM media_files WHERE folder_path = ?", [(path,) for path in stale_folders])
+            for items in changed_folders.values():
+                for item in items:
+                    self.title_index.add(item.title)
+
+            self._connection.executemany(
+                """INSERT OR REPLACE INTO media_files (
+                    full_file_path, folder_path, db_type, media_type, media_prefix, quality, title,
+                    relative_title_filepath, season, episode, size, created_at, mtime, inode
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                [self._item_to_row(item) for items in changed_folders.values() for item in items])
+
+            self._connection.executemany(
+                "DELETE FROM media_folders WHERE path = ?", [(path,) for path in known_folders])
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO media_folders (path, parent_path, db_type, mtime_ns) VALUES (?, ?, ?, ?)",
+                [(path, parent_path, db_type.value, mtime_ns) for path, (parent_path, mtime_ns) in folders.items()])
+
+            if not root_paths:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO media_index_scans (db_type, scanned_at) VALUES (?, ?)",
+                    (db_type.value, time.time()))
+
+    def _get_scope_clause(self, root_paths: Optional[List[str]]) -> Tuple[str, List[Any]]:
+        """Build a SQL condition matching folders at or below any of the root paths"""
+        if not root_paths:
+            return "", []
+        conditions = []
+        params: List[Any] = []
+        for root_path in root_paths:
+            prefix = root_path.rstrip(os.sep) + os.sep
+            conditions.append("(path = ? OR substr(path, 1, ?) = ?)")
+            params.extend([root_path, len(prefix), prefix])
+        return f" AND ({' OR '.join(conditions)})", params
+
+    def iter_items(self, db_type: MediaDbType, request: SearchRequest, titles: Optional[Set[str]] = None, batch_size: int = 500) -> Iterator[MediaItem]:
+        """Lazily read the indexed items of a db_type, narrowed by the exact-match fields of the request
+
+        Only the fields that can be compared directly in SQL are applied here, the caller
+        is expected to run the full MediaFilter over the result. Rows are read in batches on
+        a connection of their own, so a slow consumer never holds the shared connection.
+
+        Args:
+            db_type (MediaDbType): The db_type to read
+            request (SearchRequest): The search request
+            titles (Optional[Set[str]]): If set, only read the files of these titles
+            batch_size (int): Number of rows fetched from SQLite at a time
+        Returns:
+            Iterator[MediaItem]: The matching items
+        """
+        clauses = ["db_type = ?"]
+        params: List[Any] = [db_type.value]
+        if request.media_type:
+            clauses.append("media_type = ?")
+            params.append(request.media_type)
+        if request.media_prefix:
+            clauses.append("media_prefix = ?")
+            params.append(request.media_prefix)
+        if request.quality:
+            clauses.append("quality = ?")
+            params.append(request.quality)
+        if request.season:
+            clauses.append("season = ?")
+            params.append(request.season)
+        if request.episode:
+            clauses.append("episode = ?")
+            params.append(request.episode)
+
+        # Small title sets go into the query, large ones are checked per row to stay clear of SQLite's variable limit
+        check_titles = False
+        if titles is not None:
+            if len(titles) <= self.MAX_SQL_TITLES:
+                clauses.append(f"title IN ({', '.join('?' * len(titles))})")
+                params.extend(titles)
+            else:
+                check_titles = True
+
+        sql = f"SELECT * FROM media_files WHERE {' AND '.join(clauses)} ORDER BY full_file_path"
+        connection = sqlite3.connect(self.index_file)
+        connection.row_factory = sqlite3.Row
+        try:
+            cursor = connection.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if check_titles and row["title"] not in titles:
+                        continue
+                    yield self._row_to_item(row, request.add_extended_info)
+        finally:
+            connection.close()
+
+    def _item_to_row(self, item: MediaItem) -> tuple:
+        return (
+            item.full_file_path,
+            os.path.dirname(item.full_file_path),
+            item.db_type.value,
+            item.media_type,
+            item.media_prefix,
+            item.quality,
+            item.title,
+            item.relative_title_filepath,
+            item.season,
+            item.episode,
+            item.extended.size,
+            item.extended.created_at,
+            item.extended.updated_at,
+            item.extended.inode or 0
+        )
+
+    def _row_to_item(self, row: sqlite3.Row, add_extended_info: bool) -> MediaItem:
+        extended = None
+        if add_extended_info:
+            extended = ExtendedMediaInfo(
+                size=row["size"],
+                created_at=row["created_at"],
+                updated_at=row["mtime"],
+                inode=row["inode"],
+                metadata={})
+
+        return MediaItem(
+            db_type=MediaDbType(row["db_type"]),
+            media_type=row["media_type"],
+            media_prefix=row["media_prefix"],
+            quality=row["quality"],
+            title=row["title"],
+            season=row["season"],
+            episode=row["episode"],
+            extended=extended,
+            relative_title_filepath=row["relative_title_filepath"],
+            full_file_path=row["full_file_path"],
+            source_item=None,
+            metadata={}
+        )
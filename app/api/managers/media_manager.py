@@ -4,19 +4,59 @@ from pathlib import Path
 from app.api.managers.data_manager import DataManager
 from app.api.managers.matrix_manager import MatrixManager
 from app.api.managers.media_filter import MediaFilter
+from app.api.managers.media_index import MediaIndex
+from app.api.managers.media_query_planner import MediaQueryPlanner
 from app.api.models.media_models import (
     ExtendedMediaInfo, MediaDbType, MediaGroupFolder, MediaGroupFolderList,
-    MediaItem, MediaItemGroup, MediaLibraryInfo, MediaMatrixInfo
+    MediaItem, MediaItemGroup, MediaLibraryInfo, MediaMatrixInfo, MediaScanSummary
 )
 from app.api.models.search_request import SearchCacheExportFilter, SearchRequest
 from app.core.config import Config
-from typing import Any, List, Optional, Tuple
+from app.core.metrics import SCAN_DURATION_SECONDS, SCAN_FILES_INDEXED, SCAN_FILES_STATTED
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 import re
 import hashlib
 import os
+import time
+
+@dataclass
+class MediaFolderScanState:
+    """Bookkeeping for one incremental scan of a media group or a whole db_type"""
+    summary: MediaScanSummary
+    known_folders: Dict[str, Tuple[str, int]]
+    known_children: Dict[str, List[str]]
+    seen_folders: Dict[str, Tuple[str, int]] = field(default_factory=dict)
+    changed_folders: Dict[str, List[MediaItem]] = field(default_factory=dict)
+    # Folders below a title folder that fail this check are not read, see MediaQueryPlanner
+    folder_filter: Optional[Callable[[str], bool]] = None
+
+    @classmethod
+    def from_known_folders(cls, db_type: MediaDbType, known_folders: Dict[str, Tuple[str, int]]) -> "MediaFolderScanState":
+        known_children: Dict[str, List[str]] = {}
+        for folder_path, (parent_path, _) in known_folders.items():
+            known_children.setdefault(parent_path, []).append(folder_path)
+        return cls(summary=MediaScanSummary(db_type=db_type), known_folders=known_folders, known_children=known_children)
+
+    def create_group_state(self) -> "MediaFolderScanState":
+        """Create an empty state for one media group that shares the read-only known folders"""
+        return MediaFolderScanState(
+            summary=MediaScanSummary(db_type=self.summary.db_type),
+            known_folders=self.known_folders,
+            known_children=self.known_children,
+            folder_filter=self.folder_filter)
+
+    def merge(self, other: "MediaFolderScanState") -> None:
+        self.seen_folders.update(other.seen_folders)
+        self.changed_folders.update(other.changed_folders)
+        self.summary.directories_visited += other.summary.directories_visited
+        self.summary.directories_skipped += other.summary.directories_skipped
+        self.summary.files_statted += other.summary.files_statted
+        self.summary.files_indexed += other.summary.files_indexed
 
 class MediaManager:
-    def __init__(self, config: dict[str, Any]):
+    def __init__(self, config: dict[str, Any], media_index: Optional[MediaIndex] = None):
         self.config = config
         # Initialize paths from config as strings
         self.media_base_path = str(Path(config.get("default_source_path")))
@@ -25,6 +65,8 @@ class MediaManager:
         self.export_base_path = str(Path(config.get("media_export_path")))
         self.system_data_path = str(Path(config.get("system_data_path")))
         self.data_manager = DataManager(config)
+        self.media_index = media_index or MediaIndex(config)
+        self.scan_max_workers = config.get("scan_max_workers", 4)
         # self.matrix_manager = MatrixManager(config)
 
     def _generate_media_id(self, relative_path: str, media_type: str, media_prefix: str, title: str, season: Optional[int] = None, episode: Optional[int] = None) -> str:
@@ -123,16 +165,174 @@ class MediaManager:
 
     def search_media(self, request: SearchRequest) -> MediaItemGroup:
         """Search media in cache by title and optional parameters"""
+        return MediaItemGroup(items=list(self.iter_media(request)))
+
+    def iter_media(self, request: SearchRequest) -> Iterator[MediaItem]:
+        """Lazily yield the media matching the request, one db_type after the other"""
+
+        # Create a media filter
+        media_filter = MediaFilter(request)
+
+        for db_type in request.db_type:
+            # Only go to the filesystem if this db_type has never been indexed
+            if not self.media_index.is_scanned(db_type):
+                self.refresh_media_index([db_type])
+
+        # Resolve the title query to the matching titles first, then read only their files
+        titles = self.media_index.find_titles(request.query) if request.query else None
+        if titles is not None and not titles:
+            return
+
+        for db_type in request.db_type:
+            for item in self.media_index.iter_items(db_type, request, titles=titles):
+                if media_filter.is_match(item):
+                    yield item
+
+    def refresh_media_index(self, db_types: Optional[List[MediaDbType]] = None, full: bool = False) -> List[MediaScanSummary]:
+        """Rescan the filesystem for the given db_types and store the result in the media index
 
-        # For each db_type get the base path and add to list
-        all_items = []
+        Every (db_type, media group) pair is scanned in its own worker, so the media library
+        and the cache, which usually live on different devices, are read in parallel.
+
+        Args:
+            db_types (Optional[List[MediaDbType]]): The db_types to rescan, defaults to media and cache
+            full (bool): If True, list every folder instead of only those whose mtime changed
+        Returns:
+            List[MediaScanSummary]: The scan counters for each db_type
+        """
+        start_time = time.perf_counter()
+        with self.media_index.refresh_lock:
+            states = {
+                db_type: MediaFolderScanState.from_known_folders(db_type, {} if full else self.media_index.get_folders(db_type))
+                for db_type in db_types or [MediaDbType.MEDIA, MediaDbType.CACHE]
+            }
+
+            with ThreadPoolExecutor(max_workers=self.scan_max_workers, thread_name_prefix="media-scan") as executor:
+                futures = {
+                    executor.submit(self._refresh_media_group, media_group, db_type, state.create_group_state()): db_type
+                    for db_type, state in states.items()
+                    for media_group in self.get_media_group_folders(self.get_db_path(db_type)).groups
+                }
+                for future in as_completed(futures):
+                    state = states[futures[future]]
+                    state.merge(future.result())
+                    state.summary.duration_seconds = time.perf_counter() - start_time
+
+            for db_type, state in states.items():
+                self.media_index.apply_folder_scan(db_type, state.seen_folders, state.changed_folders)
+
+        for state in states.values():
+            self._record_scan_metrics(state.summary)
+        return [state.summary for state in states.values()]
+
+    def get_indexed_db_types(self) -> List[MediaDbType]:
+        """Get the db_types to keep up to date, the export library only once something has searched it"""
+        db_types = [MediaDbType.MEDIA, MediaDbType.CACHE]
+        if self.media_index.is_scanned(MediaDbType.EXPORT):
+            db_types.append(MediaDbType.EXPORT)
+        return db_types
+
+    def update_media_index(self, db_types: Optional[List[MediaDbType]] = None) -> List[MediaScanSummary]:
+        """Refresh the media index, unless the media watcher is already keeping it up to date"""
+        if self.media_index.live:
+            return []
+        return self.refresh_media_index(db_types)
+
+    def refresh_media_for_request(self, request: SearchRequest) -> List[MediaScanSummary]:
+        """Refresh only the part of the media index a search request can match
+
+        The media groups are pruned by media type, prefix and quality, their title folders
+        by the title query and the season folders by the season, so a search for one show
+        only reads that show's folder. A db_type that has never been indexed gets a full
+        incremental refresh instead, a partial scan can't mark it as indexed.
+
+        Args:
+            request (SearchRequest): The search request
+        Returns:
+            List[MediaScanSummary]: The scan counters for each db_type that was touched
+        """
+        planner = MediaQueryPlanner(request)
+        summaries = []
+        title_folders = []
         for db_type in request.db_type:
-            result = self._search_media_db(request, self.get_db_path(db_type), db_type)
-            if result and result.items:
-                all_items.extend(result.items)
+            if not self.media_index.is_scanned(db_type):
+                summaries.extend(self.refresh_media_index([db_type]))
+                continue
+            media_groups = self.get_media_group_folders(self.get_db_path(db_type)).groups
+            known_title_folders = self.media_index.get_child_folders(db_type, [media_group.path for media_group in media_groups])
+            title_folders.extend(planner.get_title_folders(media_groups, known_title_folders))
 
-        # Return combined results
-        return MediaItemGroup(items=all_items)
+        if title_folders:
+            summaries.extend(self.refresh_media_folders(title_folders, folder_filter=planner.is_subfolder_match))
+        return summaries
+
+    def refresh_media_folders(self, folder_paths: List[str], folder_filter: Optional[Callable[[str], bool]] = None) -> List[MediaScanSummary]:
+        """Refresh only the given folders, and anything new below them, in the media index
+
+        Each folder is always relisted, its known subfolders are still skipped when their mtime
+        is unchanged. A change to a db_type root folder itself, such as a new group folder,
+        falls back to an incremental refresh of that db_type. Folders outside the media groups
+        are ignored.
+
+        Args:
+            folder_paths (List[str]): Folders whose contents changed
+            folder_filter (Optional[Callable[[str], bool]]): If set, folders below a title folder
+                whose name fails this check are left as they are in the index
+        Returns:
+            List[MediaScanSummary]: The scan counters for each db_type that was touched
+        """
+        root_db_types = []
+        folder_roots: Dict[MediaDbType, List[Tuple[str, MediaGroupFolder, Optional[str]]]] = {}
+        for db_type in self.get_indexed_db_types():
+            db_path = str(self.get_db_path(db_type))
+            media_groups = self.get_media_group_folders(Path(db_path)).groups
+            for folder_path in sorted(set(folder_paths)):
+                if folder_path == db_path:
+                    root_db_types.append(db_type)
+                    continue
+                for media_group in media_groups:
+                    if folder_path != media_group.path and not folder_path.startswith(media_group.path + os.sep):
+                        continue
+                    # Folders below a folder that is already being refreshed are covered by it
+                    roots = folder_roots.setdefault(db_type, [])
+                    if any(folder_path.startswith(root_path + os.sep) for root_path, _, _ in roots):
+                        break
+                    relative_parts = Path(folder_path).relative_to(media_group.path).parts
+                    roots.append((folder_path, media_group, relative_parts[0] if relative_parts else None))
+                    break
+
+        summaries = self.refresh_media_index(root_db_types) if root_db_types else []
+
+        with self.media_index.refresh_lock:
+            for db_type, roots in folder_roots.items():
+                if db_type in root_db_types:
+                    continue
+                start_time = time.perf_counter()
+                root_paths = [root_path for root_path, _, _ in roots]
+                known_folders = self.media_index.get_folders(db_type, root_paths)
+                # Forget the roots themselves so they are relisted even if their mtime is unchanged
+                for root_path in root_paths:
+                    known_folders.pop(root_path, None)
+                state = MediaFolderScanState.from_known_folders(db_type, known_folders)
+                state.folder_filter = folder_filter
+                for root_path, media_group, title in roots:
+                    try:
+                        mtime_ns = os.stat(root_path).st_mtime_ns
+                    except FileNotFoundError:
+                        continue
+                    self._refresh_media_folder(root_path, mtime_ns, media_group, title, db_type, state)
+                self.media_index.apply_folder_scan(db_type, state.seen_folders, state.changed_folders, root_paths)
+                state.summary.duration_seconds = time.perf_counter() - start_time
+                self._record_scan_metrics(state.summary)
+                summaries.append(state.summary)
+
+        return summaries
+
+    def _record_scan_metrics(self, summary: MediaScanSummary) -> None:
+        db_type = summary.db_type.value
+        SCAN_DURATION_SECONDS.observe(summary.duration_seconds, db_type=db_type)
+        SCAN_FILES_INDEXED.inc(summary.files_indexed, db_type=db_type)
+        SCAN_FILES_STATTED.inc(summary.files_statted, db_type=db_type)
 
     def get_relative_path_to_title(self, title_path: str, file_path: str) -> str:
         """Get the subpath of the file relative to its title folder by removing title_path"""
@@ -147,59 +347,88 @@ class MediaManager:
             # If paths are not related, return empty string
             return ""
 
-    def _search_media_db(self, request: SearchRequest, base_path: Path, db_type: MediaDbType) -> MediaItemGroup:
-        """Search media in cache by title and optional parameters"""
-
-        # Create a media filter
-        media_filter = MediaFilter(request)
-
-        # Get all media group folders
-        media_groups = self.get_media_group_folders(base_path)
+    def _refresh_media_group(self, media_group: MediaGroupFolder, db_type: MediaDbType, state: MediaFolderScanState) -> MediaFolderScanState:
+        """Bring the indexed files of one media group up to date with the filesystem
 
-        # Filter groups based on request
-        filtered_media_groups = []
-        for media_group in media_groups.groups:
+        Only folders whose mtime changed since the last scan are listed. Unchanged folders keep
+        their indexed files and are only descended into to check their known subfolders, so a
+        file replaced in place under the same name needs a full scan to be picked up.
+        """
+        try:
+            mtime_ns = os.stat(media_group.path).st_mtime_ns
+        except FileNotFoundError:
+            return state
+        self._refresh_media_folder(media_group.path, mtime_ns, media_group, None, db_type, state)
+        return state
 
-            if request.media_type and request.media_type != media_group.media_type:
-                continue
-            
-            if request.quality and request.quality != media_group.quality:
-                continue
+    def _refresh_media_folder(self, path: str, mtime_ns: int, media_group: MediaGroupFolder, title: Optional[str], db_type: MediaDbType, state: MediaFolderScanState) -> None:
+        """Refresh one folder of a media group, title is None for the group folder itself"""
+        state.seen_folders[path] = (os.path.dirname(path), mtime_ns)
 
-            # Get the media items
-            filtered_media_groups.append(media_group)   
+        # Unchanged folder, keep the indexed files and only check the known subfolders
+        known_folder = state.known_folders.get(path)
+        if known_folder and known_folder[1] == mtime_ns:
+            state.summary.directories_skipped += 1
+            for child_path in state.known_children.get(path, []):
+                if title and state.folder_filter and not state.folder_filter(os.path.basename(child_path)):
+                    self._keep_known_folder(child_path, state)
+                    continue
+                try:
+                    child_mtime_ns = os.stat(child_path).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                self._refresh_media_folder(child_path, child_mtime_ns, media_group, title or os.path.basename(child_path), db_type, state)
+            return
 
-        # Initialize empty list for media items
+        # Changed or new folder, list it and stat the files in it. DirEntry answers the
+        # file/folder question from the directory listing and caches its stat result.
+        state.summary.directories_visited += 1
         media_items = []
-
-        # Search through each media group
-        for media_group in filtered_media_groups:
-            path = Path(media_group.path)
-            
-            # Search through each folder in the media group
-            for folder in path.glob("*"):
-                if folder.is_dir():
-                    # Get all files in the folder
-                    for file in folder.glob("**/*"):
-                        if file.is_file():
-                            add_season_episode = media_group.media_type == "tv"
-                            media_item = self._create_media_item_from_file(
-                                full_file_path=file,
+        subfolders = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            subfolders.append((entry.path, entry.stat().st_mtime_ns, entry.name))
+                        elif title and entry.is_file():
+                            stat_result = entry.stat()
+                            state.summary.files_statted += 1
+                            media_items.append(self._create_media_item_from_file(
+                                full_file_path=Path(entry.path),
                                 media_group=media_group,
-                                title=folder.name,
+                                title=title,
                                 db_type=db_type,
-                                add_season_episode=add_season_episode,
-                                add_extended_info=request.add_extended_info
-                            )
-                            
-                            # Check if the media item matches the request
-                            if media_filter.is_match(media_item):
-                                media_items.append(media_item)
-
-        # Return the filtered results
-        return MediaItemGroup(items=media_items)
-
-    def _create_media_item_from_file(self, full_file_path: Path, media_group: MediaGroupFolder, title: str, db_type: MediaDbType, add_season_episode: bool = False, add_extended_info: bool = False) -> MediaItem:
+                                add_season_episode=media_group.media_type == "tv",
+                                add_extended_info=True,
+                                stat_result=stat_result
+                            ))
+                    except FileNotFoundError:
+                        continue
+        except FileNotFoundError:
+            return
+
+        state.changed_folders[path] = media_items
+        state.summary.files_indexed += len(media_items)
+
+        for subfolder_path, subfolder_mtime_ns, subfolder_name in subfolders:
+            if title and state.folder_filter and not state.folder_filter(subfolder_name):
+                self._keep_known_folder(subfolder_path, state)
+                # Record the old mtime so the next full refresh relists this folder and finds what was pruned
+                state.seen_folders[path] = (os.path.dirname(path), known_folder[1] if known_folder else 0)
+                continue
+            self._refresh_media_folder(subfolder_path, subfolder_mtime_ns, media_group, title or subfolder_name, db_type, state)
+
+    def _keep_known_folder(self, path: str, state: MediaFolderScanState) -> None:
+        """Carry a pruned folder and everything below it over from the index unread"""
+        known_folder = state.known_folders.get(path)
+        if known_folder is None:
+            return
+        state.seen_folders[path] = known_folder
+        for child_path in state.known_children.get(path, []):
+            self._keep_known_folder(child_path, state)
+
+    def _create_media_item_from_file(self, full_file_path: Path, media_group: MediaGroupFolder, title: str, db_type: MediaDbType, add_season_episode: bool = False, add_extended_info: bool = False, stat_result: Optional[os.stat_result] = None) -> MediaItem:
         season = None
         episode = None
         
@@ -208,11 +437,12 @@ class MediaManager:
         
         extended = None
         if add_extended_info:
-            stat = full_file_path.stat()
+            stat_result = stat_result or full_file_path.stat()
             extended = ExtendedMediaInfo(
-                size=stat.st_size,
-                created_at=stat.st_ctime,
-                updated_at=stat.st_mtime,
+                size=stat_result.st_size,
+                created_at=stat_result.st_ctime,
+                updated_at=stat_result.st_mtime,
+                inode=stat_result.st_ino,
                 metadata={})
             
 
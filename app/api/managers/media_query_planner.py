@@ -0,0 +1,69 @@
+# Plans which folders a search request can touch, so filesystem reads can skip the rest of the tree
+import os
+import re
+from typing import List, Optional
+
+from app.api.managers.media_filter import MediaFilter
+from app.api.models.media_models import MediaGroupFolder
+from app.api.models.search_request import SearchRequest
+
+
+class MediaQueryPlanner:
+    """Pushes the predicates of a search request down to the folder levels they describe.
+
+    The media groups carry the media type, prefix and quality, the title folders carry the
+    title and the `Season NN` folders of tv titles carry the season, so each level can be
+    pruned before anything below it is listed.
+    """
+    SEASON_FOLDER_PATTERN = re.compile(r"^season\s*(\d+)$", re.IGNORECASE)
+
+    def __init__(self, request: SearchRequest):
+        self.request = request
+        self.media_filter = MediaFilter(request)
+
+    def is_group_match(self, media_group: MediaGroupFolder) -> bool:
+        if self.request.media_type and self.request.media_type != media_group.media_type:
+            return False
+        if self.request.media_prefix and self.request.media_prefix != media_group.media_prefix:
+            return False
+        if self.request.quality and self.request.quality != media_group.quality:
+            return False
+        return True
+
+    def is_title_folder_match(self, title: str) -> bool:
+        return self.media_filter.is_title_match(title)
+
+    def is_subfolder_match(self, folder_name: str) -> bool:
+        """Check a folder below a title folder, only season folders of another season are pruned"""
+        if not self.request.season:
+            return True
+        match = self.SEASON_FOLDER_PATTERN.match(folder_name)
+        return match is None or int(match.group(1)) == self.request.season
+
+    def get_title_folders(self, media_groups: List[MediaGroupFolder], known_title_folders: Optional[List[str]] = None) -> List[str]:
+        """Get the title folders of the matching media groups whose title matches the request
+
+        Args:
+            media_groups (List[MediaGroupFolder]): The media groups of a db_type
+            known_title_folders (Optional[List[str]]): Title folders already in the media index,
+                included when they match so removed titles are noticed too
+        Returns:
+            List[str]: The matching title folder paths
+        """
+        title_folders = set()
+        for media_group in media_groups:
+            if not self.is_group_match(media_group):
+                continue
+            try:
+                with os.scandir(media_group.path) as entries:
+                    for entry in entries:
+                        if entry.is_dir() and self.is_title_folder_match(entry.name):
+                            title_folders.add(entry.path)
+            except FileNotFoundError:
+                continue
+
+        group_paths = {media_group.path for media_group in media_groups if self.is_group_match(media_group)}
+        for folder_path in known_title_folders or []:
+            if os.path.dirname(folder_path) in group_paths and self.is_title_folder_match(os.path.basename(folder_path)):
+                title_folders.add(folder_path)
+        return sorted(title_folders)
@@ -1,16 +1,17 @@
 from app.api.adapters.jellyfin import JellyfinClient
 from app.core.status import Status
 from app.core.settings import settings
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
 class MediaServer:
-    def __init__(self):
+    def __init__(self, jellyfin_client: Optional[JellyfinClient] = None):
         """
-        Initialize MediaServer with Jellyfin configuration from settings.
+        Initialize MediaServer with Jellyfin configuration from settings, or with a shared client.
         """
-        self.jellyfin_client = JellyfinClient(
+        self.jellyfin_client = jellyfin_client or JellyfinClient(
             url=settings.JELLYFIN["url"],
             api_key=settings.JELLYFIN["api_key"]
         )
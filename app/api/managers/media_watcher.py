@@ -0,0 +1,186 @@
+# Watches the media roots with inotify, keeps the media index live and requests library updates
+import logging
+import os
+import select
+import sys
+import threading
+import time
+from enum import Enum
+from typing import Any, Dict, Optional, Set
+
+from app.api.adapters.inotify import (
+    IN_CLOSE_WRITE, IN_CREATE, IN_DELETE, IN_IGNORED, IN_MOVED_FROM, IN_MOVED_TO,
+    IN_ONLYDIR, IN_Q_OVERFLOW, Inotify, InotifyEvent
+)
+from app.api.managers.media_manager import MediaManager
+from app.api.managers.sync_lock import SyncLock
+
+logger = logging.getLogger(__name__)
+
+class WatchRoot(str, Enum):
+    SOURCE = "source"
+    CACHE = "cache"
+    EXPORT = "export"
+
+class MediaWatcher:
+    WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_CLOSE_WRITE | IN_ONLYDIR
+
+    def __init__(self, config: dict[str, Any], media_manager: Optional[MediaManager] = None):
+        self.config = config
+        watcher_config = config.get("media_watcher", {})
+        self.enabled = watcher_config.get("enabled", False)
+        self.index_debounce_seconds = watcher_config.get("index_debounce_seconds", 2)
+        self.update_request_debounce_seconds = watcher_config.get("update_request_debounce_seconds", 30)
+        self.media_manager = media_manager or MediaManager(config)
+        self.sync_lock = SyncLock(config)
+
+        # Map each watched root to its role, export folders usually sit inside the source and cache roots
+        self.roots: Dict[str, WatchRoot] = {}
+        for path, role in [
+            (config.get("default_source_path"), WatchRoot.SOURCE),
+            (config.get("cache_path"), WatchRoot.CACHE),
+            (config.get("media_export_path"), WatchRoot.EXPORT),
+            (config.get("cache_export_path"), WatchRoot.EXPORT),
+        ]:
+            if path:
+                self.roots[os.path.normpath(path)] = role
+        # Never watch our own data folder, writing the index would feed events back to us
+        self.excluded_paths = [os.path.normpath(config.get("system_data_path"))]
+
+        self._inotify: Optional[Inotify] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._watches: Dict[int, str] = {}
+        self._watch_failed = False
+        self._dirty_folders: Set[str] = set()
+        self._full_refresh_requested = False
+        self._last_index_event: Optional[float] = None
+        self._last_update_event: Optional[float] = None
+
+    def start(self) -> None:
+        """Start watching in a background thread"""
+        if not self.enabled or self._thread:
+            return
+        if not sys.platform.startswith("linux"):
+            logger.warning("Media watcher requires Linux inotify, not starting")
+            return
+
+        try:
+            self._inotify = Inotify()
+        except OSError as e:
+            logger.error(f"Failed to start media watcher: {str(e)}")
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="media-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching and wait for the background thread to finish"""
+        if not self._thread:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self.media_manager.media_index.live = False
+
+    def _run(self) -> None:
+        try:
+            # Place the watches before the catch-up refresh so no change falls in between
+            for root_path in self.roots:
+                self._add_watch_tree(root_path)
+            self.media_manager.refresh_media_index(self.media_manager.get_indexed_db_types())
+            self.media_manager.media_index.live = not self._watch_failed
+            logger.info(f"Media watcher started with {len(self._watches)} watches")
+
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([self._inotify.fd], [], [], 0.5)
+                if readable:
+                    for event in self._inotify.read_events():
+                        self._handle_event(event)
+                self._flush(time.monotonic())
+        except Exception as e:
+            logger.error(f"Media watcher stopped: {str(e)}", exc_info=True)
+        finally:
+            self.media_manager.media_index.live = False
+            self._inotify.close()
+            self._watches.clear()
+
+    def _handle_event(self, event: InotifyEvent) -> None:
+        now = time.monotonic()
+        if event.mask & IN_Q_OVERFLOW:
+            # Events were lost, fall back to a refresh of everything
+            logger.warning("Media watcher event queue overflowed, scheduling a full refresh")
+            self._full_refresh_requested = True
+            self._last_index_event = now
+            self._last_update_event = now
+            return
+
+        folder_path = self._watches.get(event.wd)
+        if folder_path is None:
+            return
+        if event.mask & IN_IGNORED:
+            self._watches.pop(event.wd, None)
+            return
+
+        path = os.path.join(folder_path, event.name) if event.name else folder_path
+        if event.is_dir and event.mask & (IN_CREATE | IN_MOVED_TO):
+            self._add_watch_tree(path)
+        elif event.is_dir and event.mask & IN_MOVED_FROM:
+            self._remove_watch_tree(path)
+
+        role = self._get_root_role(path)
+        if role is not None:
+            self._dirty_folders.add(folder_path)
+            self._last_index_event = now
+        # New downloads need a sync, and so does anything removed from the exported library.
+        # Removals while a sync holds the lock are the sync's own, they don't need another one.
+        if role == WatchRoot.SOURCE or (role == WatchRoot.EXPORT and event.mask & (IN_DELETE | IN_MOVED_FROM) and not self.sync_lock.is_held()):
+            self._last_update_event = now
+
+    def _flush(self, now: float) -> None:
+        """Apply the collected changes once no new events have arrived for the debounce period"""
+        if self._last_index_event is not None and now - self._last_index_event >= self.index_debounce_seconds:
+            self._last_index_event = None
+            dirty_folders, self._dirty_folders = self._dirty_folders, set()
+            try:
+                if self._full_refresh_requested:
+                    self._full_refresh_requested = False
+                    self.media_manager.refresh_media_index(self.media_manager.get_indexed_db_types())
+                else:
+                    self.media_manager.refresh_media_folders(sorted(dirty_folders))
+            except Exception as e:
+                logger.error(f"Media watcher failed to refresh the media index: {str(e)}", exc_info=True)
+
+        if self._last_update_event is not None and now - self._last_update_event >= self.update_request_debounce_seconds:
+            self._last_update_event = None
+            logger.debug("Media watcher requesting a media library update")
+            self.media_manager.request_media_library_update()
+
+    def _add_watch_tree(self, root_path: str) -> None:
+        for folder_path, subfolders, _ in os.walk(root_path):
+            if self._is_excluded(folder_path):
+                subfolders.clear()
+                continue
+            wd = self._inotify.add_watch(folder_path, self.WATCH_MASK)
+            if wd is None:
+                self._watch_failed = True
+                continue
+            self._watches[wd] = folder_path
+
+    def _remove_watch_tree(self, root_path: str) -> None:
+        prefix = root_path + os.sep
+        for wd, folder_path in list(self._watches.items()):
+            if folder_path == root_path or folder_path.startswith(prefix):
+                self._inotify.remove_watch(wd)
+                self._watches.pop(wd, None)
+
+    def _is_excluded(self, path: str) -> bool:
+        return any(path == excluded or path.startswith(excluded + os.sep) for excluded in self.excluded_paths)
+
+    def _get_root_role(self, path: str) -> Optional[WatchRoot]:
+        """Get the role of the most specific watched root that contains the path"""
+        matches = [root_path for root_path in self.roots if path == root_path or path.startswith(root_path + os.sep)]
+        if not matches:
+            return None
+        return self.roots[max(matches, key=len)]
@@ -0,0 +1,38 @@
+# Rolling history of sync runs and their phase profiles, to spot a sync getting slower as the library grows
+import threading
+from typing import Any, List
+
+from app.api.managers.base_data_persistence import BaseDataPersistence
+from app.api.models.sync_models import SyncProfile
+
+class SyncHistoryManager(BaseDataPersistence):
+    _instance = None
+
+    def __new__(cls, config: dict[str, Any]):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, config: dict[str, Any]):
+        if not self._initialized:
+            super().__init__(system_folder=config["system_data_path"], data_filename="sync_history.json")
+            self.config = config
+            self.max_runs = config.get("sync_history", {}).get("max_runs", 200)
+            # A dry run can finish next to a real sync
+            self._lock = threading.Lock()
+            self._initialized = True
+
+    def append_run(self, profile: SyncProfile) -> None:
+        """Add a run to the history, dropping the oldest ones beyond max_runs"""
+        with self._lock:
+            runs = self.get_data("runs") or []
+            runs.append(profile.model_dump(mode="json"))
+            self.set_data("runs", runs[-self.max_runs:])
+            self.update()
+
+    def get_runs(self, limit: int = 20) -> List[SyncProfile]:
+        """Get the most recent runs, newest first"""
+        with self._lock:
+            runs = list(self.get_data("runs") or [])
+        return [SyncProfile.model_validate(run) for run in reversed(runs[-limit:])] if limit > 0 else []
@@ -1,125 +1,379 @@
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 from app.api.managers.cache_manager import CacheManager
 from app.api.managers.data_manager import DataManager
 from app.api.managers.file_transaction_manager import FileTransactionManager
 from app.api.managers.item_manager import ItemManager, ItemMatchKey
+from app.api.managers.job_manager import JobCancelledError, JobHandle, JobManager
+from app.api.managers.sync_history_manager import SyncHistoryManager
+from app.api.managers.sync_lock import SyncLock
 from app.api.managers.matrix_manager import MatrixManager
 from app.api.managers.media_manager import MediaManager
 from app.api.managers.media_query import MediaQuery
 from app.api.managers.media_server import MediaServer
-from app.api.models.file_transaction_models import FileSequenceTransaction, FileSequenceTransactionOperation, FileTransactionList, FileTransactionSettings, ExistingFileAction, FileOperationType
-from app.api.models.media_models import MediaDbType, MediaItemGroup, SyncDetailRequest
+from app.api.models.file_transaction_models import FileSequenceTransaction, FileSequenceTransactionOperation, FileTransaction, FileTransactionList, FileTransactionPriority, FileTransactionSettings, FileTransactionSummary, ExistingFileAction, FileOperationType
+from app.api.models.job_models import Job, JobType
+from app.api.models.media_models import MediaDbType, MediaItem, MediaItemGroup, MediaLibraryInfo, SyncDetailRequest
 from app.api.models.search_request import SearchRequest
+from app.api.models.sync_models import SyncProfile, SyncRunStatus
 from app.api.process.cache_processor import CacheProcessor
 from app.api.process.media_merger import MediaMerger
+from app.api.process.orphan_detector import OrphanDetector
+from app.api.process.space_admission import SpaceAdmission, SpaceAdmissionResult
+from app.api.process.sync_profiler import SyncProfiler
 from app.api.managers.manifest_manager import ManifestManager
+import asyncio
+import errno
 import logging
+import os
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
 
 logger = logging.getLogger(__name__)
 
+SYNC_LOCK_POLL_SECONDS = 0.5
+
+@dataclass
+class SyncPlan:
+    """The expected state of a sync and the file transactions that get there"""
+    expected_cache_group: MediaItemGroup
+    expected_merge_group: MediaItemGroup
+    file_transactions: FileTransactionList
+    admission_result: SpaceAdmissionResult
+    # The pre cache requests and update request count the plan was made from, only these are consumed when it finishes
+    add_cache_items: list[MediaItem] = field(default_factory=list)
+    remove_cache_items: list[MediaItem] = field(default_factory=list)
+    update_request_count: int = 0
+
 class SyncManager:
-    def __init__(self, config: dict[str, Any]):
+    def __init__(self, config: dict[str, Any], media_manager: Optional[MediaManager] = None, cache_manager: Optional[CacheManager] = None,
+                 item_manager: Optional[ItemManager] = None, media_library_info: Optional[MediaLibraryInfo] = None,
+                 media_server: Optional[MediaServer] = None):
         self.config = config
-        self.media_merger = MediaMerger(config)
-        self.media_manager = MediaManager(config)
+        self.media_library_info = media_library_info or MatrixManager(config).get_media_library_info()
+        self.media_manager = media_manager or MediaManager(config)
+        self.item_manager = item_manager or ItemManager(config, self.media_library_info)
+        self.media_merger = MediaMerger(config, self.media_manager, self.item_manager, self.media_library_info)
         self.file_transaction_manager = FileTransactionManager(config)
-        self.cache_processor = CacheProcessor(config)
-        self.cache_manager = CacheManager(config)
-        self.item_manager = ItemManager(config)
+        self.cache_processor = CacheProcessor(config, self.media_manager, self.item_manager, self.media_library_info)
+        self.cache_manager = cache_manager or CacheManager(config, self.media_manager, self.item_manager)
         self.data_manager = DataManager(config)
-        self.matrix_manager = MatrixManager(config)
-        self.media_library_info = self.matrix_manager.get_media_library_info()
         self.manifest_manager = ManifestManager(config)
-        self.media_server = MediaServer()
+        self.media_server = media_server or MediaServer()
+        # "set" compares against the indexed cache files, "sorted" streams a sorted walk for very large trees
+        self.orphan_detection = config.get("orphan_detection", "set")
+        self.free_space_reserve_gb = config.get("file_transactions", {}).get("free_space_reserve_gb", 10)
+        self.sync_lock = SyncLock(config)
+        self.sync_history_manager = SyncHistoryManager(config)
         
-    async def sync(self, dry_run: bool = False, details: SyncDetailRequest = SyncDetailRequest.NONE, force: bool = False) -> dict[str, Any]:
+    async def sync(self, dry_run: bool = False, details: SyncDetailRequest = SyncDetailRequest.NONE, force: bool = False, resume: bool = False, job: Optional[JobHandle] = None) -> dict[str, Any]:
         """Sync the cache with the media library
-        
+
+        Scanning, planning and applying block on the filesystem, so each phase runs in a worker
+        thread and the event loop keeps serving other requests in the meantime. Only the media
+        server refresh is awaited on the loop itself. Every phase is profiled, the profile is
+        returned with the summary and added to the sync history.
+
         Args:
             dry_run (bool): If True, only show what would be done without making changes
             details (SyncDetailRequest): If True, show details of the sync operation
+            resume (bool): If True, finish the file transactions of an interrupted sync instead of planning a new one
+            job (Optional[JobHandle]): If set, the phases and file progress are reported to it, and it can cancel the sync
         Returns:
             MediaItemGroupDict: The results of the sync operation
         """
+        # Syncs may come from the API, the scheduler and other processes, only one of them changes the files at a time.
+        # A dry run changes nothing, so it doesn't wait for the lock.
+        locked = False
+        waiting_since = time.perf_counter()
+        if not dry_run:
+            self._set_phase(job, "waiting")
+            while not self.sync_lock.try_acquire():
+                if job:
+                    job.check_cancelled()
+                await asyncio.sleep(SYNC_LOCK_POLL_SECONDS)
+            locked = True
+        profiler = SyncProfiler(dry_run=dry_run, force=force, resume=resume, lock_wait_seconds=time.perf_counter() - waiting_since)
+        status = SyncRunStatus.FAILED
         try:
+            if job:
+                # Requests coalesced into the job while it waited may have asked for more
+                parameters = job.take_parameters("starting")
+                force = parameters.get("force", force)
+                details = parameters.get("details", details)
+
+            if resume:
+                result = await self._resume(dry_run=dry_run, details=details, job=job, profiler=profiler)
+                status = SyncRunStatus.COMPLETED
+                return result
+
             # Only sync if the media_library_update_request_count is greater than 0 or a force flag is passed
             if self.data_manager.get_media_library_update_request() == 0 and not force:
                 logger.debug("No media library update request count, skipping sync")
                 return {
                     "message": "No media library update request count, skipping sync"
                 }
-            
+
             logger.debug(f"Starting sync{' (dry run)' if dry_run else ''}")
 
-            # Get current state
-            actual_media_model = self.media_manager.search_media(SearchRequest(db_type=[MediaDbType.MEDIA, MediaDbType.CACHE]))
+            self._set_phase(job, "planning")
+            sync_plan = await asyncio.to_thread(self._plan_sync, dry_run, profiler)
+            self._set_phase(job, "applying")
+            admitted_transactions = sync_plan.admission_result.transactions.transactions
+            with self._track_file_transactions(job, admitted_transactions, dry_run), profiler.phase("apply", len(admitted_transactions)) as phase:
+                file_transaction_summary, deferred_cache_items = await asyncio.to_thread(self._apply_sync, sync_plan, dry_run)
+                phase.items_out = len(file_transaction_summary.sequence_transactions)
+            await self._finish_sync(file_transaction_summary, dry_run=dry_run, sync_plan=sync_plan, deferred_cache_items=deferred_cache_items, job=job, profiler=profiler)
+            status = SyncRunStatus.COMPLETED
+            sync_profile = profiler.finish(status)
+
+            if details == SyncDetailRequest.DETAILS:
+                return {
+                    "file_transaction_summary": file_transaction_summary,
+                    "sync_profile": sync_profile,
+                    "expected_cache_group": sync_plan.expected_cache_group,
+                    "expected_merge_group": sync_plan.expected_merge_group,
+                    "file_transactions": sync_plan.file_transactions
+                }
+            elif details == SyncDetailRequest.SUMMARY:
+                return {
+                    "file_transaction_summary": file_transaction_summary,
+                    "sync_profile": sync_profile
+                }
+            elif details == SyncDetailRequest.TRANSACTIONS:
+                resultSummary = {
+                    "transactions": file_transaction_summary.sequence_transactions
+                }
+                return resultSummary
+            else:
+                return {}
+
+        except JobCancelledError:
+            status = SyncRunStatus.CANCELLED
+            logger.info("Sync cancelled, resume finishes the file transactions it had started")
+            raise
+        except Exception as e:
+            logger.error(f"Error in sync: {str(e)}", exc_info=True)
+            raise e
+        finally:
+            if locked:
+                self.sync_lock.release()
+            # A sync skipped for lack of update requests did nothing worth keeping
+            if profiler.phases:
+                await self._record_profile(profiler.finish(status))
+
+    def submit_sync_job(self, job_manager: JobManager, dry_run: bool = False, details: SyncDetailRequest = SyncDetailRequest.NONE, force: bool = False, resume: bool = False) -> tuple[Job, bool]:
+        """Start a sync job, or coalesce the request into the sync job that is waiting to run
+
+        While a sync runs, the first request gets a follow-up job that waits for it, and every
+        request after that attaches to the follow-up, so any number of requests during a run
+        lead to exactly one more run. Dry runs change nothing and always get their own job.
+
+        Returns:
+            tuple[Job, bool]: The job and whether the request was attached to an existing one
+        """
+        parameters = {"dry_run": dry_run, "details": SyncDetailRequest(details), "force": force, "resume": resume}
+
+        def merge(waiting: dict[str, Any]) -> Optional[dict[str, Any]]:
+            if dry_run or waiting.get("dry_run") or waiting.get("resume") != resume:
+                return None
+            # The most detailed result any of the requests asked for
+            detail_order = list(SyncDetailRequest)
+            waiting["details"] = max(SyncDetailRequest(waiting["details"]), parameters["details"], key=detail_order.index)
+            waiting["force"] = waiting.get("force", False) or force
+            return waiting
+
+        return job_manager.submit_or_attach(
+            JobType.SYNC,
+            parameters,
+            lambda job: self.sync(dry_run=dry_run, details=details, force=force, resume=resume, job=job),
+            merge=merge)
+
+    async def _record_profile(self, sync_profile: SyncProfile) -> None:
+        try:
+            await asyncio.to_thread(self.sync_history_manager.append_run, sync_profile)
+        except Exception as e:
+            # The history is for diagnosis, never fail a sync over it
+            logger.error(f"Error recording sync history: {str(e)}")
+
+    def _set_phase(self, job: Optional[JobHandle], phase: str) -> None:
+        if job:
+            job.set_phase(phase)
+
+    def _track_file_transactions(self, job: Optional[JobHandle], transactions: list[FileTransaction], dry_run: bool = False):
+        # A dry run doesn't hold the sync lock and may run next to a real sync, keep its hands off the shared callbacks
+        if job is None or dry_run:
+            return nullcontext()
+        return job.track_file_transactions(self.file_transaction_manager, transactions)
+
+    def _plan_sync(self, dry_run: bool = False, profiler: Optional[SyncProfiler] = None) -> SyncPlan:
+        """Scan the libraries and plan the file transactions of a sync, blocking"""
+        profiler = profiler or SyncProfiler(dry_run=dry_run)
+
+        # Requests made from here on are left for the next sync
+        update_request_count = self.data_manager.get_media_library_update_request()
+        add_cache_items = self.data_manager.get_add_cache_items()
+        remove_cache_items = self.data_manager.get_remove_cache_items()
+
+        # Refresh the media index, then get current state from it
+        with profiler.phase("scan") as phase:
+            scan_summaries = self.media_manager.update_media_index([MediaDbType.MEDIA, MediaDbType.CACHE])
+            phase.items_in = sum(summary.directories_visited + summary.directories_skipped for summary in scan_summaries)
+            phase.items_out = sum(summary.files_indexed for summary in scan_summaries)
+
+        with profiler.phase("load_index") as phase:
+            actual_media_model = self.media_manager.search_media(SearchRequest(db_type=[MediaDbType.MEDIA, MediaDbType.CACHE], add_extended_info=True))
             query = MediaQuery(actual_media_model)
 
             actual_media_group = query.get_items(SearchRequest(db_type=[MediaDbType.MEDIA]))
             actual_cache_group = query.get_items(SearchRequest(db_type=[MediaDbType.CACHE]))
+            phase.items_out = len(actual_media_group.items) + len(actual_cache_group.items)
 
+        with profiler.phase("link_cache_items", len(actual_cache_group.items)) as phase:
             self._link_cache_items_to_media_items(actual_cache_group, actual_media_group)
+            phase.items_out = sum(1 for item in actual_cache_group.items if item.source_item)
 
-            # Process cache
-            # Get the max cache size
-            max_cache_size_gb = self.config.get("max_cache_size_gb", 100)
-            expected_cache_group = self.cache_processor.get_expected_cache(actual_media_group, actual_cache_group, dry_run=dry_run, max_cache_size_gb=max_cache_size_gb)
+        # Process cache
+        # Get the max cache size
+        max_cache_size_gb = self.config.get("max_cache_size_gb", 100)
+        with profiler.phase("expected_cache", len(actual_media_group.items) + len(actual_cache_group.items)) as phase:
+            expected_cache_group = self.cache_processor.get_expected_cache(actual_media_group, actual_cache_group, dry_run=dry_run, max_cache_size_gb=max_cache_size_gb,
+                                                                       add_cache_items=add_cache_items, remove_cache_items=remove_cache_items)
+            phase.items_out = len(expected_cache_group.items)
 
-            # Get merged items
+        # Get merged items
+        with profiler.phase("merge_libraries", len(actual_media_group.items) + len(expected_cache_group.items)) as phase:
             expected_merge_group = self.media_merger.merge_libraries(actual_media_group, expected_cache_group)
+            phase.items_out = len(expected_merge_group.items)
 
-            file_transactions = FileTransactionList(transactions=[])
+        file_transactions = FileTransactionList(transactions=[])
 
+        with profiler.phase("plan_transactions", len(expected_cache_group.items) + len(expected_merge_group.items)) as phase:
             # Get file transactions for delete group
             group_list = [expected_cache_group, expected_merge_group]
             path_list = [self.media_library_info.cache_library_path, self.media_library_info.export_library_path]
-            self._add_file_delete_transactions(file_transactions, group_list, path_list)
+            self._add_file_delete_transactions(file_transactions, group_list, path_list, actual_cache_group)
 
             # Get file transactions for cache
-            self._add_file_transactions(file_transactions, expected_cache_group, FileOperationType.COPY)
+            self._add_file_transactions(file_transactions, expected_cache_group, FileOperationType.COPY, dry_run=dry_run)
 
             # Get file transactions for merge group
-            self._add_file_transactions(file_transactions, expected_merge_group, FileOperationType.LINK)
+            self._add_file_transactions(file_transactions, expected_merge_group, FileOperationType.LINK, dry_run=dry_run)
+            phase.items_out = len(file_transactions.transactions)
+
+        # Order deletes first and hold back copies that would fill the cache disk
+        with profiler.phase("space_admission", len(file_transactions.transactions)) as phase:
+            space_admission = SpaceAdmission(
+                roots=[self.media_library_info.cache_library_path, self.media_library_info.cache_export_library_path],
+                reserve_bytes=int(self.free_space_reserve_gb * 1024 * 1024 * 1024),
+                export_redirects={self.media_library_info.cache_export_library_path: self.media_library_info.export_library_path})
+            admission_result = space_admission.admit(file_transactions)
+            phase.items_out = len(admission_result.transactions.transactions)
 
-            file_transaction_summary = self.file_transaction_manager.apply_file_transactions(file_transactions, settings=None, dry_run=dry_run)
+        return SyncPlan(
+            expected_cache_group=expected_cache_group,
+            expected_merge_group=expected_merge_group,
+            file_transactions=file_transactions,
+            admission_result=admission_result,
+            add_cache_items=add_cache_items,
+            remove_cache_items=remove_cache_items,
+            update_request_count=update_request_count)
 
-            # Delete empty folders
-            self._delete_empty_folders([self.media_library_info.cache_library_path, self.media_library_info.export_library_path], file_transaction_summary.sequence_transactions, dry_run=dry_run)
+    def _apply_sync(self, sync_plan: SyncPlan, dry_run: bool = False) -> tuple[FileTransactionSummary, list[MediaItem]]:
+        """Apply the admitted file transactions of a plan, blocking
 
-            # clear precache
-            if not dry_run:
-                self.cache_manager.clear_pre_cache()
+        Returns:
+            tuple[FileTransactionSummary, list[MediaItem]]: The summary and the requested cache items that were deferred
+        """
+        if self.file_transaction_manager.has_interrupted_transactions() and not dry_run:
+            logger.warning("Replacing the file transactions of an interrupted sync, use resume to finish them instead")
+
+        admission_result = sync_plan.admission_result
+        file_transaction_summary = self.file_transaction_manager.apply_file_transactions(admission_result.transactions, settings=None, dry_run=dry_run)
+        file_transaction_summary.deferred_transactions = admission_result.deferred_transactions
+
+        # Requested cache adds that were deferred stay requested, workflow fills are picked again anyway
+        deferred_sources = {transaction.source for transaction in admission_result.deferred_transactions
+                            if transaction.type == FileOperationType.COPY and transaction.priority != FileTransactionPriority.BACKGROUND}
+        deferred_cache_items = [item.source_item for item in sync_plan.expected_cache_group.items
+                                if item.source_item and str(item.source_item.full_file_path) in deferred_sources]
+        return file_transaction_summary, deferred_cache_items
+
+    async def _resume(self, dry_run: bool = False, details: SyncDetailRequest = SyncDetailRequest.NONE, job: Optional[JobHandle] = None,
+                      profiler: Optional[SyncProfiler] = None) -> dict[str, Any]:
+        """Finish the file transactions journaled by an interrupted sync, then run the usual post-sync steps"""
+        logger.debug(f"Resuming interrupted sync{' (dry run)' if dry_run else ''}")
+        profiler = profiler or SyncProfiler(dry_run=dry_run, resume=True)
+        self._set_phase(job, "applying")
+        file_transaction_summary = None
+        with profiler.phase("apply") as phase:
+            # Read the journal once, the job tracks the remaining transactions so it gets totals and an ETA
+            state = await asyncio.to_thread(self.file_transaction_manager.load_interrupted_transactions, dry_run)
+            if state is not None:
+                remaining_transactions = [state.transactions[i] for i in state.get_remaining_indexes()]
+                phase.items_in = len(remaining_transactions)
+                with self._track_file_transactions(job, remaining_transactions, dry_run):
+                    file_transaction_summary = await asyncio.to_thread(self.file_transaction_manager.resume_file_transactions, dry_run, state)
+                phase.items_out = len(file_transaction_summary.sequence_transactions) if file_transaction_summary else 0
+        if file_transaction_summary is None:
+            return {
+                "message": "No interrupted sync to resume"
+            }
+
+        await self._finish_sync(file_transaction_summary, dry_run=dry_run, job=job, profiler=profiler)
 
-                # clear media library update request count
-                self.data_manager.clear_media_library_update_request()
-                self.data_manager.update()
+        if details in (SyncDetailRequest.DETAILS, SyncDetailRequest.SUMMARY):
+            return {
+                "file_transaction_summary": file_transaction_summary,
+                "sync_profile": profiler.finish(SyncRunStatus.COMPLETED)
+            }
+        elif details == SyncDetailRequest.TRANSACTIONS:
+            return {
+                "transactions": file_transaction_summary.sequence_transactions
+            }
+        return {}
 
-                # Refresh media server
+    async def _finish_sync(self, file_transaction_summary: FileTransactionSummary, dry_run: bool = False, sync_plan: Optional[SyncPlan] = None,
+                           deferred_cache_items: Optional[list[MediaItem]] = None, job: Optional[JobHandle] = None,
+                           profiler: Optional[SyncProfiler] = None) -> None:
+        profiler = profiler or SyncProfiler(dry_run=dry_run)
+        # The files have been applied, a cancel from here on would only leave the bookkeeping behind
+        if job:
+            job.set_phase("finishing", cancellable=False)
+        with profiler.phase("update_after_sync", len(file_transaction_summary.sequence_transactions)):
+            await asyncio.to_thread(self._update_after_sync, file_transaction_summary, dry_run, sync_plan, deferred_cache_items)
+
+        if not dry_run:
+            # Refresh media server
+            with profiler.phase("media_server_refresh"):
                 await self.media_server.refresh_media()
 
-            if details == SyncDetailRequest.DETAILS:
-                return {
-                    "file_transaction_summary": file_transaction_summary,
-                    "expected_cache_group": expected_cache_group,
-                    "expected_merge_group": expected_merge_group,
-                    "file_transactions": file_transactions
-                }
-            elif details == SyncDetailRequest.SUMMARY:
-                return {
-                    "file_transaction_summary": file_transaction_summary
-                }
-            elif details == SyncDetailRequest.TRANSACTIONS:
-                resultSummary = {
-                    "transactions": file_transaction_summary.sequence_transactions
-                }
-                return resultSummary
-            else:
-                return {}
+    def _update_after_sync(self, file_transaction_summary: FileTransactionSummary, dry_run: bool = False, sync_plan: Optional[SyncPlan] = None,
+                           deferred_cache_items: Optional[list[MediaItem]] = None) -> None:
+        # Delete empty folders
+        self._delete_empty_folders([self.media_library_info.cache_library_path, self.media_library_info.export_library_path], file_transaction_summary.sequence_transactions, dry_run=dry_run)
 
-        except Exception as e:
-            logger.error(f"Error in sync: {str(e)}", exc_info=True)
-            raise e
+        # clear precache
+        if not dry_run:
+            # The cache and export trees have changed, so bring their index up to date
+            self.media_manager.update_media_index([db_type for db_type in self.media_manager.get_indexed_db_types() if db_type != MediaDbType.MEDIA])
+
+            # A resume wasn't planned from the pre cache or the update requests, so it leaves them to the next sync
+            if sync_plan is None:
+                return
+
+            # Consume only what the plan was made from, requests added during a long apply stay queued
+            self.cache_manager.remove_pre_cache_items(sync_plan.add_cache_items, sync_plan.remove_cache_items)
+            if deferred_cache_items:
+                self.data_manager.append_add_cache_items(deferred_cache_items)
+
+            self.data_manager.remove_media_library_update_requests(sync_plan.update_request_count)
+            self.data_manager.update()
+
+            # Leave one request behind, so the next scheduled sync retries the deferred copies
+            if file_transaction_summary.deferred_transactions and self.data_manager.get_media_library_update_request() == 0:
+                self.data_manager.set_media_library_update_request()
 
     def _link_cache_items_to_media_items(self, cache_group: MediaItemGroup, media_group: MediaItemGroup) -> None:
         """Link cache items to their corresponding media items.
@@ -128,12 +382,13 @@ class SyncManager:
             cache_group (MediaItemGroup): Group containing cache items
             media_group (MediaItemGroup): Group containing media items
         """
+        media_index = self.item_manager.create_item_index(media_group.items, ItemMatchKey.TITLE_PATH)
         for item in cache_group.items:
             if item.source_item:
                 continue
 
             # Find matching media item
-            matching_media_item = self.item_manager.get_matching_item(item, media_group.items, ItemMatchKey.TITLE_PATH)
+            matching_media_item = self.item_manager.get_matching_item(item, media_index, ItemMatchKey.TITLE_PATH)
             if not matching_media_item:
                 continue
 
@@ -145,52 +400,86 @@ class SyncManager:
         self._add_file_transactions(file_transactions, expected_group, operation_type)
         return file_transactions
 
-    def _recurse_delete_empty_folders(self, folder: Path, sequence_transactions: list[FileSequenceTransaction], dry_run: bool = False) -> None:
-        for child in folder.iterdir():
-            if child.is_dir():
-                self._recurse_delete_empty_folders(child, sequence_transactions, dry_run)
-        
-        if folder.is_dir() and not any(folder.iterdir()):
-            if not dry_run:
-                folder.rmdir()
-                sequence_transactions.append(FileSequenceTransaction(operation=FileSequenceTransactionOperation.DELETE_FOLDER, source=str(folder), destination=str(folder)))
-
     def _delete_empty_folders(self, base_paths: list[str], sequence_transactions: list[FileSequenceTransaction], dry_run: bool = False) -> None:
-        for base_path in base_paths:
-            if not Path(base_path).exists():
+        """Delete the folders left empty by the files deleted or moved away, bottom-up
+
+        Only the parents of those files and their ancestors are looked at, and none of them
+        is listed, rmdir refuses a folder that isn't empty. The base paths and the group
+        folders directly below them are kept.
+        """
+        if dry_run:
+            return
+
+        base_paths = [os.path.normpath(base_path) for base_path in base_paths]
+        touched_folders = {os.path.dirname(sequence_transaction.source) for sequence_transaction in sequence_transactions
+                           if sequence_transaction.operation in (FileSequenceTransactionOperation.DELETE_FILE, FileSequenceTransactionOperation.MOVE_FILE)}
+
+        candidates = set()
+        for folder in touched_folders:
+            folder = os.path.normpath(folder)
+            bases = [base_path for base_path in base_paths if folder.startswith(base_path + os.sep)]
+            if not bases:
                 continue
+            # Keep the base path and its group folders
+            min_depth = max(bases, key=len).count(os.sep) + 2
+            while folder.count(os.sep) >= min_depth and folder not in candidates:
+                candidates.add(folder)
+                folder = os.path.dirname(folder)
 
-            # Get list of folders in base_path, only top level
-            folders = [f for f in Path(base_path).iterdir() if f.is_dir()]
-            for folder in folders:
-                child_folders = [f for f in folder.iterdir() if f.is_dir()]
-                for child_folder in child_folders:
-                    self._recurse_delete_empty_folders(child_folder, sequence_transactions, dry_run)
-
-    def _add_file_delete_transactions(self, file_transactions: FileTransactionList, group_list: list[MediaItemGroup], base_paths: list[str]) -> None:
-        # Get list of all allowed files from the group list
-        allowed_files = []
-        for group in group_list:
-            for item in group.items:
-                if item.full_file_path:
-                    allowed_files.append(Path(item.full_file_path))
-
-        # Get list of all files in the base paths
-        files = []
-        for base_path in base_paths:
-            files.extend([f for f in Path(base_path).glob("**/*") if f.is_file()])
-
-        # Get list of all files in the base paths that are not in the allowed files list
-        files_to_delete = [file for file in files if file not in allowed_files]
+        # Deepest first, so a folder is only tried once everything below it has been
+        not_empty = set()
+        for folder in sorted(candidates, key=lambda x: x.count(os.sep), reverse=True):
+            if folder in not_empty:
+                not_empty.add(os.path.dirname(folder))
+                continue
+            try:
+                os.rmdir(folder)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                    logger.warning(f"Failed to delete empty folder {folder}: {e}")
+                not_empty.add(os.path.dirname(folder))
+                continue
+            sequence_transactions.append(FileSequenceTransaction(operation=FileSequenceTransactionOperation.DELETE_FOLDER, source=folder, destination=folder))
+
+    def _add_file_delete_transactions(self, file_transactions: FileTransactionList, group_list: list[MediaItemGroup], base_paths: list[str], indexed_cache_group: Optional[MediaItemGroup] = None) -> None:
+        """Delete every file under the base paths that no item in the group list accounts for
+
+        Args:
+            file_transactions (FileTransactionList): The list to add the delete transactions to
+            group_list (list[MediaItemGroup]): The expected items
+            base_paths (list[str]): The roots to look for orphaned files under
+            indexed_cache_group (Optional[MediaItemGroup]): The cache items from the media index, their
+                title folders are not walked again
+        """
+        orphan_detector = OrphanDetector(item.full_file_path for group in group_list for item in group.items if item.full_file_path)
+
+        if self.orphan_detection == "sorted":
+            files_to_delete = orphan_detector.iter_orphans_sorted(base_paths)
+        else:
+            indexed_files = []
+            indexed_folders = []
+            if indexed_cache_group is not None:
+                indexed_files = [item.full_file_path for item in indexed_cache_group.items]
+                indexed_folders = [media_group.path for media_group in self.media_manager.get_media_group_folders(Path(self.media_library_info.cache_library_path)).groups]
+            files_to_delete = orphan_detector.find_orphans(base_paths, indexed_files, indexed_folders)
 
         for file in files_to_delete:
             file_transactions.delete(
-                path=str(file),
+                path=file,
                 settings=FileTransactionSettings(existing_file_action=ExistingFileAction.SKIP_IF_SAME_SIZE),
                 metadata={}
             )
 
-    def _add_file_transactions(self, file_transactions: FileTransactionList, expected_group: MediaItemGroup, operation_type: FileOperationType) -> None:
+    def _add_file_transactions(self, file_transactions: FileTransactionList, expected_group: MediaItemGroup, operation_type: FileOperationType,
+                               dry_run: bool = False) -> None:
+        # Copies planned so far replace their destination with a new inode, so links to them can't be judged yet.
+        # Copies that would be skipped are never planned, so they don't hold back the links to them.
+        copy_destinations = {transaction.destination for transaction in file_transactions.transactions if transaction.type == FileOperationType.COPY}
+        already_linked = 0
+        already_copied = 0
+
         for item in expected_group.items:
             if not item.source_item:
                 file_transactions.delete(
@@ -200,12 +489,38 @@ class SyncManager:
                 )
                 continue
 
+            source = str(item.source_item.full_file_path)
+            destination = str(item.full_file_path)
+            priority = FileTransactionPriority((item.metadata or {}).get("cache_priority", FileTransactionPriority.NORMAL.value))
+            if operation_type == FileOperationType.LINK:
+                # Leave links that already point at the source inode out of the plan, stale ones are replaced
+                if source not in copy_destinations and self.file_transaction_manager.is_same_inode(source, destination):
+                    already_linked += 1
+                    continue
+                existing_file_action = ExistingFileAction.SKIP_IF_SAME_INODE
+            elif operation_type == FileOperationType.COPY:
+                # Copies are checked by content, a same-size re-encode must not be skipped.
+                # Leave those already in place out of the plan, like the links above. A dry run doesn't read
+                # the files to fingerprint them, it keeps every copy in the plan as pending.
+                if not dry_run and self.file_transaction_manager.is_same_content(source, destination):
+                    already_copied += 1
+                    continue
+                existing_file_action = ExistingFileAction.SKIP_IF_SAME_FINGERPRINT
+            else:
+                existing_file_action = ExistingFileAction.SKIP_IF_SAME_SIZE
+
             file_transactions.add(
-                source=str(item.source_item.full_file_path),
-                destination=str(item.full_file_path),
+                source=source,
+                destination=destination,
                 type=operation_type,
-                settings=FileTransactionSettings(existing_file_action=ExistingFileAction.SKIP_IF_SAME_SIZE),
-                metadata={})
+                settings=FileTransactionSettings(existing_file_action=existing_file_action),
+                metadata={},
+                priority=priority)
+
+        if already_linked:
+            logger.debug(f"Left {already_linked} existing hard links out of the plan")
+        if already_copied:
+            logger.debug(f"Left {already_copied} existing copies out of the plan")
 
     #def update_manifest(self, manifest_group: ManifestItemGroup, media_items: list[MediaItem]) -> None:
     #    items = [ManifestItem(full_file_path=item.full_file_path) for item in media_items]
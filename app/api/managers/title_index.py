@@ -0,0 +1,82 @@
+# In-memory trigram index over the distinct media titles, used to resolve substring title queries
+from typing import Dict, Iterable, Set
+
+
+class TitleIndex:
+    """Maps lowercased trigrams to the titles containing them.
+
+    Titles are reference counted by the number of indexed files, so the index can be
+    updated incrementally as files are added to and removed from the media index.
+    """
+    GRAM_SIZE = 3
+
+    def __init__(self):
+        self._lowered_titles: Dict[str, str] = {}
+        self._file_counts: Dict[str, int] = {}
+        self._grams: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._lowered_titles)
+
+    def _get_grams(self, lowered: str) -> Set[str]:
+        return {lowered[i:i + self.GRAM_SIZE] for i in range(len(lowered) - self.GRAM_SIZE + 1)}
+
+    def add(self, title: str, count: int = 1) -> None:
+        """Add files for a title, indexing the title if it is new"""
+        if title in self._file_counts:
+            self._file_counts[title] += count
+            return
+
+        lowered = title.lower()
+        self._file_counts[title] = count
+        self._lowered_titles[title] = lowered
+        for gram in self._get_grams(lowered):
+            self._grams.setdefault(gram, set()).add(title)
+
+    def remove(self, title: str, count: int = 1) -> None:
+        """Remove files for a title, dropping the title once it has no files left"""
+        if title not in self._file_counts:
+            return
+        self._file_counts[title] -= count
+        if self._file_counts[title] > 0:
+            return
+
+        lowered = self._lowered_titles.pop(title)
+        del self._file_counts[title]
+        for gram in self._get_grams(lowered):
+            titles = self._grams.get(gram)
+            if titles is not None:
+                titles.discard(title)
+                if not titles:
+                    del self._grams[gram]
+
+    def clear(self) -> None:
+        self._lowered_titles.clear()
+        self._file_counts.clear()
+        self._grams.clear()
+
+    def search(self, query: str) -> Set[str]:
+        """Get the titles containing the query, case-insensitively"""
+        lowered_query = query.lower()
+
+        # Queries shorter than a trigram can't use the postings, check every distinct title instead
+        if len(lowered_query) < self.GRAM_SIZE:
+            return self._verify(self._lowered_titles, lowered_query)
+
+        # Intersect the postings, smallest first, then verify the survivors against the full query
+        postings = []
+        for gram in self._get_grams(lowered_query):
+            titles = self._grams.get(gram)
+            if not titles:
+                return set()
+            postings.append(titles)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for titles in postings[1:]:
+            candidates &= titles
+            if not candidates:
+                return set()
+        return self._verify(candidates, lowered_query)
+
+    def _verify(self, titles: Iterable[str], lowered_query: str) -> Set[str]:
+        return {title for title in titles if lowered_query in self._lowered_titles[title]}
@@ -0,0 +1,130 @@
+# Write-ahead journal of the file transactions being applied, so an interrupted apply can be resumed
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Set
+
+from app.api.models.file_transaction_models import FileApplyTransactionSettings, FileTransaction
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class TransactionJournalState:
+    """The planned transactions of an interrupted apply and the indexes of the ones that finished"""
+    created_at: float
+    settings: FileApplyTransactionSettings
+    transactions: List[FileTransaction]
+    done_indexes: Set[int] = field(default_factory=set)
+
+    def get_remaining_indexes(self) -> List[int]:
+        return [i for i in range(len(self.transactions)) if i not in self.done_indexes]
+
+class TransactionJournal:
+    """Journal of one apply, kept as JSON lines in the system data folder.
+
+    The first line is the plan, written atomically before anything is applied. Each
+    finished transaction appends a done line with its index. The journal is removed once
+    the apply completes, so if it exists at startup the last apply was interrupted. A torn
+    last line from a crash is ignored, that transaction is simply applied again.
+    """
+    JOURNAL_FILE_NAME = "file_transaction_journal.jsonl"
+
+    def __init__(self, config: dict[str, Any]):
+        self.system_folder = config["system_data_path"]
+        self.journal_file = os.path.join(self.system_folder, self.JOURNAL_FILE_NAME)
+        self._lock = threading.Lock()
+        self._file = None
+
+        # Create system folder if it doesn't exist
+        os.makedirs(self.system_folder, exist_ok=True)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.journal_file)
+
+    def begin(self, transactions: List[FileTransaction], settings: FileApplyTransactionSettings) -> None:
+        """Record the plan of a new apply, replacing any earlier journal"""
+        plan = {
+            "type": "plan",
+            "created_at": time.time(),
+            "settings": settings.model_dump(mode="json"),
+            "transactions": [transaction.model_dump(mode="json") for transaction in transactions],
+        }
+        temp_file = f"{self.journal_file}.tmp"
+        with open(temp_file, "w") as f:
+            f.write(json.dumps(plan) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.journal_file)
+        self._fsync_folder()
+        self._open()
+
+    def resume(self) -> Optional[TransactionJournalState]:
+        """Load the journal of an interrupted apply and keep recording into it, None if there is nothing to resume"""
+        state = self.load()
+        if state is not None:
+            self._open()
+        return state
+
+    def load(self) -> Optional[TransactionJournalState]:
+        if not self.exists():
+            return None
+
+        state = None
+        with open(self.journal_file, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring a torn entry in {self.journal_file}")
+                    continue
+                if entry.get("type") == "plan":
+                    state = TransactionJournalState(
+                        created_at=entry["created_at"],
+                        settings=FileApplyTransactionSettings.model_validate(entry["settings"]),
+                        transactions=[FileTransaction.model_validate(transaction) for transaction in entry["transactions"]])
+                elif entry.get("type") == "done" and state is not None:
+                    state.done_indexes.add(entry["index"])
+        return state
+
+    def mark_done(self, index: int, durable: bool = False) -> None:
+        """Record a finished transaction, durable forces it to disk before returning
+
+        Only transactions that are expensive to repeat need to be durable, anything replayed
+        after a crash is skipped again by its existing file action.
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps({"type": "done", "index": index}) + "\n")
+            self._file.flush()
+            if durable:
+                os.fsync(self._file.fileno())
+
+    def complete(self) -> None:
+        """Remove the journal once every transaction has been applied"""
+        self.close()
+        if self.exists():
+            os.remove(self.journal_file)
+            self._fsync_folder()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._file = open(self.journal_file, "a")
+
+    def _fsync_folder(self) -> None:
+        fd = os.open(self.system_folder, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Any, List
+from typing import Any, List, Optional
 from pydantic import BaseModel
 
 class FileOperationType(Enum):
@@ -15,15 +15,39 @@ class FileOperationType(Enum):
     def __lt__(self, other):
         return self.order < other.order
 
+    @classmethod
+    def _missing_(cls, value):
+        # Members are defined as (order, value) tuples, so look them up by the value alone
+        return next((member for member in cls if member.value == value), None)
+
 class ExistingFileAction(Enum):
     OVERWRITE = (0, "overwrite")
     SKIP = (1, "skip")
     SKIP_IF_SAME_SIZE = (2, "skip_if_same_size")
+    SKIP_IF_SAME_FINGERPRINT = (3, "skip_if_same_fingerprint") # Size and a hash of sampled blocks, see FingerprintCache
+    SKIP_IF_SAME_INODE = (4, "skip_if_same_inode") # The destination is already a hard link to the source
 
     def __init__(self, order: int, value: str):
         self.order = order
         self._value_ = value
 
+    @classmethod
+    def _missing_(cls, value):
+        return next((member for member in cls if member.value == value), None)
+
+class FileTransactionPriority(Enum):
+    USER = (0, "user")              # Requested by a user, such as a cache add
+    NORMAL = (1, "normal")
+    BACKGROUND = (2, "background")  # Workflow fills such as latest_added, run in the idle I/O class
+
+    def __init__(self, order: int, value: str):
+        self.order = order
+        self._value_ = value
+
+    @classmethod
+    def _missing_(cls, value):
+        return next((member for member in cls if member.value == value), None)
+
 class FileTransactionSettings(BaseModel):
     existing_file_action: ExistingFileAction
 
@@ -35,6 +59,7 @@ class FileApplyTransactionSettings(BaseModel):
     write_file_metadata: bool = False
     clear_file_paths: list[str] = []
     remove_empty_folders: bool = False
+    parallel: Optional[bool] = None # None uses file_transactions.parallel from the config
 
 class FileTransaction(BaseModel):
     type: FileOperationType
@@ -42,6 +67,7 @@ class FileTransaction(BaseModel):
     source: str
     destination: str
     metadata: dict[str, Any] = None
+    priority: FileTransactionPriority = FileTransactionPriority.NORMAL
 
 class FileSequenceTransactionOperation(str,Enum):
     CREATE_FOLDER = "create_folder"
@@ -57,6 +83,14 @@ class FileSequenceTransaction(BaseModel):
     source: str
     destination: str
 
+class FileCopyStats(BaseModel):
+    source: str
+    destination: str
+    bytes_copied: int
+    duration_seconds: float
+    throughput_mb_s: float
+    method: str # copy_file_range, sendfile or read
+
 class FileTransactionSummary(BaseModel):
     added_transactions: List[FileTransaction]
     updated_transactions: List[FileTransaction]
@@ -64,6 +98,13 @@ class FileTransactionSummary(BaseModel):
     deleted_transactions: List[FileTransaction]
     linked_transactions: List[FileTransaction]
     sequence_transactions: List[FileSequenceTransaction]
+    copy_stats: List[FileCopyStats] = []
+    copied_bytes: int = 0
+    # Target folders are created once before the file operations, their cost is kept apart
+    folders_created: int = 0
+    folder_creation_seconds: float = 0.0
+    # Copies held back to keep the free space reserve, and the links that depend on them
+    deferred_transactions: List[FileTransaction] = []
 
 class FileTransactionList(BaseModel):
     transactions: List[FileTransaction]
@@ -80,5 +121,5 @@ class FileTransactionList(BaseModel):
     def link(self, source: str, destination: str, settings: FileTransactionSettings = None, metadata: dict[str, Any] = None) -> None:
         self.transactions.append(FileTransaction(type=FileOperationType.LINK, source=source, destination=destination, settings=settings, metadata=metadata))
 
-    def add(self, source: str, destination: str, type: FileOperationType, settings: FileTransactionSettings = None, metadata: dict[str, Any] = None) -> None:
-        self.transactions.append(FileTransaction(type=type, source=source, destination=destination, settings=settings, metadata=metadata))
\ No newline at end of file
+    def add(self, source: str, destination: str, type: FileOperationType, settings: FileTransactionSettings = None, metadata: dict[str, Any] = None, priority: FileTransactionPriority = FileTransactionPriority.NORMAL) -> None:
+        self.transactions.append(FileTransaction(type=type, source=source, destination=destination, settings=settings, metadata=metadata, priority=priority))
\ No newline at end of file
@@ -0,0 +1,40 @@
+from enum import Enum
+from typing import Any, Dict, Optional
+from pydantic import BaseModel
+
+class JobType(str,Enum):
+    SYNC = "sync"
+    CACHE_ADD = "cache_add"
+
+class JobStatus(str,Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    @property
+    def is_finished(self) -> bool:
+        return self in (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+class JobProgress(BaseModel):
+    phase: str = "pending"
+    transactions_total: int = 0
+    transactions_done: int = 0
+    bytes_total: int = 0        # Size of the files to copy
+    bytes_done: int = 0         # Size of the copies finished or skipped, and the part copied of running ones
+    bytes_copied: int = 0       # Bytes actually written
+    eta_seconds: Optional[float] = None
+
+class Job(BaseModel):
+    id: str
+    type: JobType
+    status: JobStatus = JobStatus.PENDING
+    parameters: Dict[str, Any] = {}
+    progress: JobProgress = JobProgress()
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_requested: bool = False
+    result: Optional[Any] = None
+    error: Optional[str] = None
@@ -20,6 +20,7 @@ class ExtendedMediaInfo(BaseModel):
     size: int
     created_at: float
     updated_at: float
+    inode: Optional[int] = None
     metadata: Optional[dict] = None
 
 class MediaFileItem(BaseModel):
@@ -153,6 +154,14 @@ class MediaMatrixInfo(BaseModel):
     merge_quality: str
     use_cache: bool
     
+class MediaScanSummary(BaseModel):
+    db_type: MediaDbType
+    directories_visited: int = 0    # Folders that were listed because their mtime changed
+    directories_skipped: int = 0    # Folders whose mtime was unchanged since the last scan
+    files_statted: int = 0
+    files_indexed: int = 0
+    duration_seconds: float = 0.0
+
 class MediaLibraryInfo(BaseModel):
     media_matrix_info: Dict[str, MediaMatrixInfo]
     media_library_path: str
@@ -0,0 +1,29 @@
+from enum import Enum
+from typing import List, Optional
+from pydantic import BaseModel
+
+class SyncRunStatus(str,Enum):
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class SyncPhaseProfile(BaseModel):
+    name: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0            # Process wide, includes other requests served meanwhile
+    items_in: Optional[int] = None
+    items_out: Optional[int] = None
+    syscalls: Optional[int] = None      # Read and write class syscalls, process wide, None where not measurable
+    peak_rss_bytes: int = 0             # Process high-water mark at the end of the phase
+
+class SyncProfile(BaseModel):
+    started_at: float
+    status: SyncRunStatus = SyncRunStatus.COMPLETED
+    dry_run: bool = False
+    force: bool = False
+    resume: bool = False
+    lock_wait_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_rss_bytes: int = 0
+    phases: List[SyncPhaseProfile] = []
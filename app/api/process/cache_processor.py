@@ -1,11 +1,12 @@
 import json
 import os
-from typing import Any, List
+from typing import Any, List, Optional
 from app.api.managers.data_manager import DataManager
-from app.api.managers.item_manager import ItemManager
+from app.api.managers.item_manager import ItemManager, ItemMatchKey
 from app.api.managers.matrix_manager import MatrixManager
 from app.api.managers.media_manager import MediaManager
-from app.api.models.media_models import ExtendedMediaInfo, MediaDbType, MediaItemGroup
+from app.api.models.file_transaction_models import FileTransactionPriority
+from app.api.models.media_models import ExtendedMediaInfo, MediaDbType, MediaItem, MediaItemGroup, MediaLibraryInfo
 from pydantic import BaseModel
 
 class CacheManifestItem(BaseModel):
@@ -14,22 +15,29 @@ class CacheManifestItem(BaseModel):
     extended: ExtendedMediaInfo
 
 class CacheProcessor:
-    def __init__(self, config: dict[str, Any]):
+    def __init__(self, config: dict[str, Any], media_manager: Optional[MediaManager] = None, item_manager: Optional[ItemManager] = None,
+                 media_library_info: Optional[MediaLibraryInfo] = None):
         self.config = config
-        self.media_manager = MediaManager(config)
-        self.item_manager = ItemManager(config)
+        self.media_manager = media_manager or MediaManager(config)
+        self.item_manager = item_manager or ItemManager(config)
         self.data_manager = DataManager(config)
-        self.matrix_manager = MatrixManager(config)
-        self.media_library_info = self.matrix_manager.get_media_library_info()
+        self.media_library_info = media_library_info or MatrixManager(config).get_media_library_info()
         self.media_path = self.media_library_info.media_library_path
         self.cache_workflow = self.config.get("cache_workflow", {})
         
-    def get_expected_cache(self, current_media: MediaItemGroup, current_cache: MediaItemGroup, dry_run: bool=False, max_cache_size_gb: int=100) -> MediaItemGroup:
+    def _set_cache_priority(self, items: List[MediaItem], priority: FileTransactionPriority) -> None:
+        """Record why an item is in the cache, so its copy gets the matching transaction priority"""
+        for item in items:
+            item.metadata = {**(item.metadata or {}), "cache_priority": priority.value}
+
+    def get_expected_cache(self, current_media: MediaItemGroup, current_cache: MediaItemGroup, dry_run: bool=False, max_cache_size_gb: int=100,
+                           add_cache_items: Optional[List[MediaItem]] = None, remove_cache_items: Optional[List[MediaItem]] = None) -> MediaItemGroup:
         """Get the expected cache structure
         
         Args:
             current_cache (MediaItemGroup | None): Current cache state. If None, will be fetched from media manager
             cache_path (str): The path to the cache
+            add_cache_items, remove_cache_items (Optional[List[MediaItem]]): The pre cache requests to apply, read from the data manager if not set
         Returns:
             MediaItemGroup: The expected cache structure
 
@@ -40,12 +48,13 @@ class CacheProcessor:
         expected_cache_items = current_cache.items
 
         # Remove items from expected cache, using get_matrix_filepath() as the comparison key
-        remove_items = self.data_manager.get_remove_cache_items()
+        remove_items = remove_cache_items if remove_cache_items is not None else self.data_manager.get_remove_cache_items()
         
         expected_cache_items = self.item_manager.remove_items_from_list(expected_cache_items, remove_items)
 
         # Add items to expected cache, if they don't already exist
-        add_items = self.item_manager.copy_update_items(self.data_manager.get_add_cache_items(), MediaDbType.CACHE)
+        add_items = self.item_manager.copy_update_items(add_cache_items if add_cache_items is not None else self.data_manager.get_add_cache_items(), MediaDbType.CACHE)
+        self._set_cache_priority(add_items, FileTransactionPriority.USER)
 
         # max_cache_size in bytes
         max_cache_size = max_cache_size_gb * 1024 * 1024 * 1024
@@ -73,15 +82,18 @@ class CacheProcessor:
         if self.cache_workflow.get("latest_added", {}).get("enabled", False):
             current_media_items_desc_time = sorted(current_media.items, key=lambda x: self.item_manager.get_extended_info(x).created_at, reverse=True)
             add_expected_cache_items = []
+            expected_cache_index = self.item_manager.create_item_index(expected_cache_items, ItemMatchKey.TITLE_PATH)
             for media_item in current_media_items_desc_time:
             # Check if the item already exists in the expected cache items, using title_file_path as the comparison key
-                if self.item_manager.get_title_file_path(media_item) not in [self.item_manager.get_title_file_path(item) for item in expected_cache_items]:
+                if media_item not in expected_cache_index:
                     expected_cache_size += self.item_manager.get_extended_info(media_item).size
                     if expected_cache_size > max_cache_size:
                         break
                     add_expected_cache_items.append(media_item)
 
-            expected_cache_items.extend(self.item_manager.copy_update_items(add_expected_cache_items, MediaDbType.CACHE))
+            latest_added_items = self.item_manager.copy_update_items(add_expected_cache_items, MediaDbType.CACHE)
+            self._set_cache_priority(latest_added_items, FileTransactionPriority.BACKGROUND)
+            expected_cache_items.extend(latest_added_items)
             # Add the expected cache items to the cache manifest
             cache_manifest['latest_added_cache_items'] = [CacheManifestItem(full_file_path=item.full_file_path, title_file_path=self.item_manager.get_title_file_path(item), extended=self.item_manager.get_extended_info(item)) for item in add_expected_cache_items]
 
@@ -3,14 +3,14 @@ from pathlib import Path
 import shutil
 from enum import Enum
 from dataclasses import dataclass
-from typing import Any, List, Dict
+from typing import Any, List, Dict, Optional
 
 from app.api.managers.item_manager import ItemManager, ItemMatchKey
 from app.api.managers.matrix_manager import MatrixManager
 from app.api.managers.media_filter import MediaFilter
 from app.api.managers.media_manager import MediaManager
 from app.api.managers.media_query import MediaQuery
-from app.api.models.media_models import MediaDbType, MediaItem, MediaItemGroup
+from app.api.models.media_models import MediaDbType, MediaItem, MediaItemGroup, MediaLibraryInfo
 from app.api.models.search_request import SearchRequest
 
 class FolderOperationStatus(Enum):
@@ -19,14 +19,14 @@ class FolderOperationStatus(Enum):
     SKIPPED = "skipped"
 
 class MediaMerger:
-    def __init__(self, config: dict[str, Any]):
+    def __init__(self, config: dict[str, Any], media_manager: Optional[MediaManager] = None, item_manager: Optional[ItemManager] = None,
+                 media_library_info: Optional[MediaLibraryInfo] = None):
         self.config = config
         self.media_filter = MediaFilter(config)
         self.cache_path = config["cache_path"]
-        self.media_manager = MediaManager(config)
-        self.matrix_manager = MatrixManager(config)
-        self.media_library_info = self.matrix_manager.get_media_library_info()   
-        self.item_manager = ItemManager(config)
+        self.media_manager = media_manager or MediaManager(config)
+        self.media_library_info = media_library_info or MatrixManager(config).get_media_library_info()
+        self.item_manager = item_manager or ItemManager(config)
 
     def merge_libraries(self, current_media: MediaItemGroup, current_cache: MediaItemGroup) -> MediaItemGroup:
         """Merge the libraries into a single media item group
@@ -81,11 +81,14 @@ class MediaMerger:
             # Flatten the lists of items
             all_merged_items = [item for items in merged_items_dict.values() for item in items]
 
+            # Index the cache once rather than scanning it for every merged item
+            cache_index = self.item_manager.create_item_index(current_cache.items, ItemMatchKey.TITLE_PATH) if use_cache else None
+
             for item in all_merged_items:
                 current_item = item
                 target_db_type = MediaDbType.EXPORT
                 if use_cache:
-                    cache_item = self.item_manager.get_matching_item(item, current_cache.items, ItemMatchKey.TITLE_PATH)
+                    cache_item = self.item_manager.get_matching_item(item, cache_index, ItemMatchKey.TITLE_PATH)
                     if cache_item:
                         current_item = cache_item
                         target_db_type = MediaDbType.CACHE_EXPORT
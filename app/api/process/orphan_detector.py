@@ -0,0 +1,85 @@
+import os
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+
+def get_path_key(path: str) -> str:
+    """Normalize a path so the same file always compares equal as a plain string"""
+    return os.path.normpath(str(path))
+
+
+def get_sort_key(path_key: str) -> Tuple[str, ...]:
+    """Sort paths by component, which is the order a sorted depth-first walk produces them in"""
+    return tuple(path_key.split(os.sep))
+
+
+class OrphanDetector:
+    """Finds the files under the managed roots that none of the expected items account for.
+
+    Folders that the media index already covers don't have to be walked again, their
+    files are passed in from the index instead. For very large trees the comparison can
+    also stream two sorted lists rather than hold every file found in a set.
+    """
+    def __init__(self, allowed_paths: Iterable[str]):
+        self.allowed: Set[str] = {get_path_key(path) for path in allowed_paths}
+
+    def find_orphans(self, base_paths: List[str], indexed_files: Iterable[str] = (), indexed_folders: Iterable[str] = ()) -> List[str]:
+        """Get the orphaned files, sorted by path
+
+        Args:
+            base_paths (List[str]): The roots to look for orphans under
+            indexed_files (Iterable[str]): Files already known from the media index
+            indexed_folders (Iterable[str]): Folders whose subfolders are fully covered by indexed_files,
+                only the files directly inside them are listed
+        Returns:
+            List[str]: The files that are not allowed
+        """
+        files = {get_path_key(path) for path in indexed_files}
+        files.update(self._iter_files(base_paths, {get_path_key(path) for path in indexed_folders}))
+        return sorted(files - self.allowed, key=get_sort_key)
+
+    def iter_orphans_sorted(self, base_paths: List[str]) -> Iterator[str]:
+        """Lazily yield the orphaned files by merging a sorted walk of the roots with the sorted allowed paths"""
+        allowed = sorted(self.allowed, key=get_sort_key)
+        for base_path in sorted(get_path_key(path) for path in base_paths):
+            yield from self.merge_sorted_orphans(self._iter_files_sorted(base_path), allowed)
+
+    @staticmethod
+    def merge_sorted_orphans(files: Iterable[str], allowed: List[str]) -> Iterator[str]:
+        """Yield the files missing from allowed, both must be sorted by get_sort_key"""
+        allowed_index = 0
+        for path_key in files:
+            sort_key = get_sort_key(path_key)
+            while allowed_index < len(allowed) and get_sort_key(allowed[allowed_index]) < sort_key:
+                allowed_index += 1
+            if allowed_index < len(allowed) and allowed[allowed_index] == path_key:
+                allowed_index += 1
+                continue
+            yield path_key
+
+    def _iter_files(self, base_paths: List[str], indexed_folders: Set[str]) -> Iterator[str]:
+        folders = [get_path_key(path) for path in base_paths]
+        while folders:
+            folder = folders.pop()
+            is_indexed = folder in indexed_folders
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not is_indexed:
+                                folders.append(entry.path)
+                        elif entry.is_file():
+                            yield entry.path
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+    def _iter_files_sorted(self, folder: str) -> Iterator[str]:
+        try:
+            with os.scandir(folder) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from self._iter_files_sorted(entry.path)
+            elif entry.is_file():
+                yield entry.path
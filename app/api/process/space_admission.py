@@ -0,0 +1,145 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.api.models.file_transaction_models import FileOperationType, FileTransaction, FileTransactionList
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class SpaceAdmissionResult:
+    transactions: FileTransactionList
+    deferred_transactions: List[FileTransaction] = field(default_factory=list)
+
+class SpaceAdmission:
+    """Admits planned file transactions against the real free space of the managed filesystems.
+
+    Deletes are moved ahead of everything else and the space they release is credited
+    first. Copies are then admitted in priority order for as long as they leave the
+    reserve free, the rest are deferred to a later sync. A link to a deferred copy is
+    deferred with it, or redirected to the uncached source when it lives under one of the
+    export_redirects roots, so the title stays in the library.
+    """
+    def __init__(self, roots: List[str], reserve_bytes: int, export_redirects: Optional[Dict[str, str]] = None):
+        self.roots = [os.path.normpath(root) for root in roots if root]
+        self.reserve_bytes = reserve_bytes
+        self.export_redirects = {os.path.normpath(source): os.path.normpath(target) for source, target in (export_redirects or {}).items()}
+
+    def admit(self, file_transactions: FileTransactionList) -> SpaceAdmissionResult:
+        """Order and filter the transactions so the managed filesystems never fall below the reserve
+
+        Args:
+            file_transactions (FileTransactionList): The planned transactions
+        Returns:
+            SpaceAdmissionResult: The transactions to apply, deletes first, and the deferred ones
+        """
+        free_bytes = self._get_free_bytes()
+        transactions = file_transactions.transactions
+        deletes = [transaction for transaction in transactions if transaction.type == FileOperationType.DELETE]
+        others = [transaction for transaction in transactions if transaction.type != FileOperationType.DELETE]
+
+        # Credit the space the deletes release, a file only goes once all of its hard links do
+        inode_deletes: Dict[Tuple[int, int], List[os.stat_result]] = {}
+        for transaction in deletes:
+            device = self._get_device(transaction.source)
+            if device is None:
+                continue
+            try:
+                stat_result = os.stat(transaction.source)
+            except FileNotFoundError:
+                continue
+            inode_deletes.setdefault((stat_result.st_dev, stat_result.st_ino), []).append(stat_result)
+        for (device, _), stat_results in inode_deletes.items():
+            if device in free_bytes and len(stat_results) >= stat_results[0].st_nlink:
+                free_bytes[device] += stat_results[0].st_size
+
+        # Admit the copies, highest priority first
+        deferred_ids: Set[int] = set()
+        copies = sorted((transaction for transaction in others if transaction.type == FileOperationType.COPY), key=lambda x: x.priority.order)
+        for transaction in copies:
+            device = self._get_device(transaction.destination)
+            if device not in free_bytes:
+                continue
+            needed_bytes, released_bytes = self._get_copy_bytes(transaction)
+            if needed_bytes > 0 and free_bytes[device] - needed_bytes < self.reserve_bytes:
+                deferred_ids.add(id(transaction))
+                continue
+            free_bytes[device] += released_bytes - needed_bytes
+
+        deferred_transactions = [transaction for transaction in others if id(transaction) in deferred_ids]
+        deferred_destinations = {transaction.destination: transaction for transaction in deferred_transactions}
+
+        admitted = []
+        redirected_destinations = set()
+        for transaction in others:
+            if id(transaction) in deferred_ids:
+                continue
+            deferred_copy = deferred_destinations.get(transaction.source)
+            if transaction.type == FileOperationType.LINK and deferred_copy:
+                redirect = self._get_redirect(transaction, deferred_copy)
+                deferred_transactions.append(transaction)
+                if redirect is None:
+                    continue
+                transaction = redirect
+                redirected_destinations.add(redirect.destination)
+            admitted.append(transaction)
+
+        # A redirected link replaces the uncached entry the plan was going to delete
+        deletes = [transaction for transaction in deletes if transaction.source not in redirected_destinations]
+
+        if deferred_transactions:
+            logger.warning(f"Deferred {len(deferred_transactions)} file transactions to keep {self.reserve_bytes} bytes free")
+        return SpaceAdmissionResult(
+            transactions=FileTransactionList(transactions=deletes + admitted),
+            deferred_transactions=deferred_transactions)
+
+    def _get_free_bytes(self) -> Dict[int, int]:
+        """Get the space available to us on each managed filesystem, keyed by st_dev"""
+        free_bytes = {}
+        for root in self.roots:
+            try:
+                device = os.stat(root).st_dev
+                statvfs = os.statvfs(root)
+            except FileNotFoundError:
+                continue
+            free_bytes[device] = statvfs.f_bavail * statvfs.f_frsize
+        return free_bytes
+
+    def _get_device(self, path: str) -> Optional[int]:
+        """Get the st_dev of the managed root a path is under, None if it's outside them"""
+        path = os.path.normpath(path)
+        matches = [root for root in self.roots if path == root or path.startswith(root + os.sep)]
+        if not matches:
+            return None
+        try:
+            return os.stat(max(matches, key=len)).st_dev
+        except FileNotFoundError:
+            return None
+
+    def _get_copy_bytes(self, transaction: FileTransaction) -> Tuple[int, int]:
+        """Get the space a copy needs while it runs and the space it releases once the old file is replaced"""
+        try:
+            source_size = os.stat(transaction.source).st_size
+        except FileNotFoundError:
+            return 0, 0
+        try:
+            dest_stat = os.stat(transaction.destination)
+        except FileNotFoundError:
+            return source_size, 0
+        # Copies already in place are left out of the plan, so even a same-size destination is rewritten.
+        # The new copy is written next to the old file, which is released after the rename unless it's linked elsewhere.
+        return source_size, dest_stat.st_size if dest_stat.st_nlink == 1 else 0
+
+    def _get_redirect(self, link: FileTransaction, deferred_copy: FileTransaction) -> Optional[FileTransaction]:
+        destination = os.path.normpath(link.destination)
+        for source_root, target_root in self.export_redirects.items():
+            if destination.startswith(source_root + os.sep):
+                return FileTransaction(
+                    type=FileOperationType.LINK,
+                    source=deferred_copy.source,
+                    destination=target_root + destination[len(source_root):],
+                    settings=link.settings,
+                    metadata=link.metadata,
+                    priority=link.priority)
+        return None
@@ -0,0 +1,59 @@
+# Times the phases of a sync, so a slow run shows where its time went
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from app.api.adapters.process_stats import get_process_stats
+from app.api.models.sync_models import SyncPhaseProfile, SyncProfile, SyncRunStatus
+from app.core.metrics import SYNC_PHASE_DURATION_SECONDS, SYNC_RUNS
+
+logger = logging.getLogger(__name__)
+
+class SyncProfiler:
+    """Collects a profile per phase of one sync run
+
+    Phases run one after the other, in a worker thread or on the event loop. The CPU time,
+    syscalls and peak RSS come from process wide counters, so they also hold whatever else
+    the process did meanwhile.
+    """
+    def __init__(self, dry_run: bool = False, force: bool = False, resume: bool = False, lock_wait_seconds: float = 0.0):
+        self.phases: List[SyncPhaseProfile] = []
+        self._profile = SyncProfile(started_at=time.time(), dry_run=dry_run, force=force, resume=resume, lock_wait_seconds=lock_wait_seconds)
+        self._started = time.perf_counter()
+        self._start_stats = get_process_stats()
+        self._finished = False
+
+    @contextmanager
+    def phase(self, name: str, items_in: Optional[int] = None) -> Iterator[SyncPhaseProfile]:
+        """Profile the block as a phase, set items_out on the yielded profile when known"""
+        phase = SyncPhaseProfile(name=name, items_in=items_in)
+        start_stats = get_process_stats()
+        started = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            end_stats = get_process_stats()
+            phase.wall_seconds = time.perf_counter() - started
+            phase.cpu_seconds = end_stats.cpu_seconds - start_stats.cpu_seconds
+            if start_stats.syscalls is not None and end_stats.syscalls is not None:
+                phase.syscalls = end_stats.syscalls - start_stats.syscalls
+            phase.peak_rss_bytes = end_stats.peak_rss_bytes
+            self.phases.append(phase)
+            SYNC_PHASE_DURATION_SECONDS.observe(phase.wall_seconds, phase=name, dry_run=str(self._profile.dry_run).lower())
+            logger.debug(f"Sync phase {name}: {phase.wall_seconds:.3f}s wall, {phase.cpu_seconds:.3f}s cpu, items {items_in} -> {phase.items_out}")
+
+    def finish(self, status: SyncRunStatus) -> SyncProfile:
+        """Close the run, only the first call sets the status and the totals"""
+        if not self._finished:
+            end_stats = get_process_stats()
+            self._profile.status = status
+            self._profile.wall_seconds = time.perf_counter() - self._started
+            self._profile.cpu_seconds = end_stats.cpu_seconds - self._start_stats.cpu_seconds
+            self._profile.peak_rss_bytes = end_stats.peak_rss_bytes
+            self._profile.phases = list(self.phases)
+            self._finished = True
+            # Runs skipped before their first phase did no work
+            if self.phases:
+                SYNC_RUNS.inc(status=status.value, dry_run=str(self._profile.dry_run).lower())
+        return self._profile
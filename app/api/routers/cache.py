@@ -1,28 +1,37 @@
 # Cache group router
 
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
 import logging
 from typing import Optional, Dict
 
+from app.api.dependencies import get_cache_manager, get_job_manager
 from app.api.managers.cache_manager import CacheManager
+from app.api.managers.job_manager import JobHandle, JobManager
+from app.api.models.job_models import JobType
 from app.api.managers.media_query import MediaQuery
 from app.core.status import Status
-from app.core.settings import settings
 from app.api.models.response import APIResponse
-from app.api.managers.media_manager import MediaManager
 from app.api.models.media_models import MediaDbType
 from app.api.models.search_request import SearchRequest
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-media_manager = MediaManager(settings.MEDIA_LIBRARY)
-cache_manager = CacheManager(settings.MEDIA_LIBRARY)
 
 @router.get("/list", status_code=200)
-async def list_cache():
+async def list_cache(stream: bool = Query(False, description="Stream the items as NDJSON, one {group, item} object per line"),
+                     cache_manager: CacheManager = Depends(get_cache_manager)):
     """List all cache contents"""
     try:
         logger.debug("Listing cache contents")
+        if stream:
+            return StreamingResponse(
+                (json.dumps({"group": group, "item": item.model_dump(mode="json")}) + "\n" for group, item in cache_manager.iter_cache()),
+                media_type="application/x-ndjson"
+            )
+
         result = cache_manager.list_cache()
         return APIResponse.success(
             data=result,
@@ -33,14 +42,30 @@ async def list_cache():
         raise APIResponse.error(str(e))
 
 @router.post("/add", status_code=200)
-async def add_to_cache(data: Dict = Body(...)):
-    """Add items to cache based on search criteria"""
+async def add_to_cache(data: Dict = Body(...), cache_manager: CacheManager = Depends(get_cache_manager),
+                       job_manager: JobManager = Depends(get_job_manager)):
+    """Add items to cache based on search criteria
+
+    Runs as a background job and returns the job, unless wait is set.
+    """
     try:
         dry_run = data.pop("dry_run", False)
+        wait = data.pop("wait", False)
         logger.debug(f"Adding items to cache with data: {data} (dry_run: {dry_run})")
-        
+
+        if not wait:
+            async def add_job(job: JobHandle):
+                job.set_phase("adding")
+                return await asyncio.to_thread(cache_manager.add_to_cache, data, dry_run)
+
+            job = job_manager.submit(JobType.CACHE_ADD, {**data, "dry_run": dry_run}, add_job)
+            return APIResponse.success(
+                data=job,
+                message="Cache add started"
+            )
+
         # Use the media manager to search and add to cache
-        result = cache_manager.add_to_cache(data, dry_run=dry_run)
+        result = await asyncio.to_thread(cache_manager.add_to_cache, data, dry_run)
             
         return APIResponse.success(
             data=result,
@@ -51,7 +76,7 @@ async def add_to_cache(data: Dict = Body(...)):
         raise APIResponse.error(str(e))
 
 @router.post("/remove", status_code=200)
-async def remove_from_cache(data: Dict = Body(...)):
+async def remove_from_cache(data: Dict = Body(...), cache_manager: CacheManager = Depends(get_cache_manager)):
     """Remove items from cache based on search criteria"""
     try:
         dry_run = data.pop("dry_run", False)
@@ -69,7 +94,7 @@ async def remove_from_cache(data: Dict = Body(...)):
         raise APIResponse.error(str(e))
 
 @router.post("/pre-cache/clear", status_code=200)
-async def clear_pre_cache():
+async def clear_pre_cache(cache_manager: CacheManager = Depends(get_cache_manager)):
     """Clear the pre cache"""
     try:
         cache_manager.clear_pre_cache()
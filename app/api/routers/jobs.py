@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends
+import logging
+
+from app.api.dependencies import get_job_manager
+from app.api.managers.job_manager import JobManager
+from app.api.models.response import APIResponse
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+@router.get("/", status_code=200)
+async def list_jobs(job_manager: JobManager = Depends(get_job_manager)):
+    """List the running jobs and the recently finished ones, newest first"""
+    try:
+        return APIResponse.success(
+            data=job_manager.list_jobs(),
+            message="Jobs retrieved successfully"
+        )
+    except Exception as e:
+        logger.error(f"Error listing jobs: {str(e)}", exc_info=True)
+        raise APIResponse.error(str(e))
+
+@router.get("/{job_id}", status_code=200)
+async def get_job(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    """Get the status, phase and progress of a job"""
+    job = job_manager.get_job(job_id)
+    if job is None:
+        raise APIResponse.not_found(f"Job {job_id} not found")
+    return APIResponse.success(
+        data=job,
+        message=f"Job is {job.status.value}"
+    )
+
+@router.post("/{job_id}/cancel", status_code=200)
+async def cancel_job(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    """Ask a job to stop, it does so at its next phase or between two file transactions"""
+    job = job_manager.cancel_job(job_id)
+    if job is None:
+        raise APIResponse.not_found(f"Job {job_id} not found")
+    return APIResponse.success(
+        data=job,
+        message="Job already finished" if job.status.is_finished else "Job cancellation requested"
+    )
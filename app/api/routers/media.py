@@ -1,19 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+import asyncio
 import logging
 
+from app.api.dependencies import get_media_manager, get_media_server
 from app.api.managers.media_server import MediaServer
 from app.api.managers.media_manager import MediaManager
 from app.core.status import Status
-from app.core.settings import settings
 from app.api.models.response import APIResponse
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-media_server = MediaServer()
-media_manager = MediaManager(settings.MEDIA_LIBRARY)
 
 @router.post("/refresh", status_code=200)
-async def refresh_media():
+async def refresh_media(media_server: MediaServer = Depends(get_media_server)):
     """Refresh the media library by calling the Media Library API."""
     try:
         logger.debug("Starting media refresh")
@@ -28,14 +27,16 @@ async def refresh_media():
         raise APIResponse.error(str(e))
 
 @router.post("/update", status_code=200)
-async def update_media():
+async def update_media(media_manager: MediaManager = Depends(get_media_manager)):
     """Update the media library by scanning for changes and updating metadata."""
     try:
         logger.debug("Starting media update")
 
-        media_manager.request_media_library_update()
+        # The scan blocks on the filesystem, and on a sync holding the index refresh lock
+        scan_summaries = await asyncio.to_thread(media_manager.update_media_index)
+        await asyncio.to_thread(media_manager.request_media_library_update)
 
-        result = {"status": "success", "message": "Media update completed"}
+        result = {"status": "success", "message": "Media update completed", "scans": scan_summaries}
         logger.debug(f"Media update completed: {result}")
         return APIResponse.success(
             data=result,
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+import asyncio
 import logging
 from typing import List
 
 from app.core.status import Status
-from app.core.settings import settings
+from app.api.dependencies import get_media_manager
 from app.api.models.search_request import SearchRequest
 from app.api.models.response import APIResponse
 from app.api.managers.media_manager import MediaManager
@@ -12,10 +14,9 @@ from app.api.models.media_models import MediaDbType
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-media_manager = MediaManager(settings.MEDIA_LIBRARY)
 
 @router.get("/", status_code=200)
-def search_media(
+async def search_media(
     query: str = Query(None, description="Search query string"),
     media_type: str = Query(None, description="Media type (tv,movie)"),
     quality: str = Query(None, description="Quality (hd,uhd,4k)"),
@@ -24,7 +25,11 @@ def search_media(
     db_type: str = Query("media", description="Comma-separated list of database types (media,cache,shadow)"),
     matrix_filepath: str = Query(None, description="Matrix filepath"),
     relative_filepath: str = Query(None, description="Relative filepath"),
-    cache_export_filter: str = Query("all", description="Cache export filter (all,apply,exclude)")
+    cache_export_filter: str = Query("all", description="Cache export filter (all,apply,exclude)"),
+    add_extended_info: bool = Query(False, description="Add extended info"),
+    stream: bool = Query(False, description="Stream the matching items as NDJSON, one item per line"),
+    media_manager: MediaManager = Depends(get_media_manager),
+    refresh: bool = Query(False, description="Re-read the folders the search can match before searching")
 ):
     """Search the media library by calling the Media Library API."""
     try:
@@ -50,9 +55,21 @@ def search_media(
             db_type=db_types,
             matrix_filepath=matrix_filepath,
             relative_filepath=relative_filepath,
-            cache_export_filter=cache_export_filter
+            cache_export_filter=cache_export_filter,
+            add_extended_info=add_extended_info
         )
-        result = media_manager.search_media(request)
+
+        # A refresh waits for any sync holding the index refresh lock, keep it off the event loop
+        if refresh:
+            await asyncio.to_thread(media_manager.refresh_media_for_request, request)
+
+        if stream:
+            return StreamingResponse(
+                (item.model_dump_json() + "\n" for item in media_manager.iter_media(request)),
+                media_type="application/x-ndjson"
+            )
+
+        result = await asyncio.to_thread(media_manager.search_media, request)
         logger.debug(f"Media search completed: {result}")
         return APIResponse.success(
             data=result,
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import Dict, Any
+from app.api.dependencies import get_media_server
 from app.api.managers.media_server import MediaServer
 from app.core.settings import settings
 from app.core.status import Status
@@ -14,10 +15,6 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-def get_media_server() -> MediaServer:
-    """Dependency to get MediaServer instance"""
-    return MediaServer()
-
 @router.get("/recent", response_model=Dict[str, Any])
 async def get_recently_viewed(
     limit: int = 20,
@@ -1,29 +1,58 @@
 import logging
 
-from fastapi import APIRouter, Body
+from fastapi import APIRouter, Body, Depends, Query
 from typing import Dict
 
+from app.api.dependencies import get_job_manager, get_sync_history_manager, get_sync_manager
 from app.api.models.media_models import SyncDetailRequest
-from app.core.settings import settings
 from app.api.models.response import APIResponse 
 from app.api.managers.sync_manager import SyncManager
+from app.api.managers.job_manager import JobManager
+from app.api.managers.sync_history_manager import SyncHistoryManager
 logger = logging.getLogger(__name__)
 router = APIRouter()
-sync_manager = SyncManager(settings.MEDIA_LIBRARY)
 
 @router.post("/", status_code=200)
-async def sync_cache(data: Dict = Body(...)):
-    """Sync the cache with the media library"""
+async def sync_cache(data: Dict = Body(...), sync_manager: SyncManager = Depends(get_sync_manager),
+                     job_manager: JobManager = Depends(get_job_manager)):
+    """Sync the cache with the media library
+
+    Starts the sync as a background job and returns the job, follow it with /api/jobs/{id}.
+    A request made while a sync runs is coalesced into a single follow-up job. With wait set
+    the request blocks until its own sync has finished and returns its result.
+    """
     try:
         dry_run = data.get("dry_run", False)    
         details = data.get("details", SyncDetailRequest.NONE)
         force = data.get("force", False)
+        resume = data.get("resume", False)
+        wait = data.get("wait", False)
         logger.debug(f"Syncing cache with media library{' (dry run)' if dry_run else ''}")
-        result = await sync_manager.sync(dry_run=dry_run, details=details, force=force)
+        if wait:
+            result = await sync_manager.sync(dry_run=dry_run, details=details, force=force, resume=resume)
+            return APIResponse.success(
+                data=result,
+                message="Cache would be synced successfully" if dry_run else "Cache synced successfully"
+            )
+
+        job, attached = sync_manager.submit_sync_job(job_manager, dry_run=dry_run, details=details, force=force, resume=resume)
         return APIResponse.success(
-            data=result,
-            message="Cache would be synced successfully" if dry_run else "Cache synced successfully"
+            data=job,
+            message="Sync already queued, attached to its job" if attached else "Sync started"
         )
     except Exception as e:
         logger.error(f"Error syncing cache: {str(e)}", exc_info=True)
         raise APIResponse.error(str(e))
+
+@router.get("/history", status_code=200)
+async def sync_history(limit: int = Query(20, description="Number of runs to return, newest first"),
+                       sync_history_manager: SyncHistoryManager = Depends(get_sync_history_manager)):
+    """Get the recent sync runs with the wall time, CPU time, items, syscalls and peak RSS of each phase"""
+    try:
+        return APIResponse.success(
+            data=sync_history_manager.get_runs(limit),
+            message="Sync history retrieved successfully"
+        )
+    except Exception as e:
+        logger.error(f"Error getting sync history: {str(e)}", exc_info=True)
+        raise APIResponse.error(str(e))
@@ -1,17 +1,21 @@
-from fastapi import APIRouter, status
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import Response
 from datetime import datetime
+import asyncio
 import logging
 
+from app.api.dependencies import get_container, get_data_manager
+from app.api.models.media_models import MediaDbType
 from app.api.models.response import APIResponse
 from app.api.managers.data_manager import DataManager
-from app.core.settings import settings
+from app.core.container import AppContainer
+from app.core.metrics import CACHE_FILL_RATIO, CACHE_MAX_SIZE_BYTES, CACHE_SIZE_BYTES, registry
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-data_manager = DataManager(settings.MEDIA_LIBRARY)
 
 @router.get("/health", status_code=status.HTTP_200_OK)
-async def health_check():
+async def health_check(data_manager: DataManager = Depends(get_data_manager)):
     """
     Health check endpoint to verify the system is running
     """
@@ -26,4 +30,21 @@ async def health_check():
         )
     except Exception as e:
         logger.error(f"Error during health check: {str(e)}", exc_info=True)
-        raise APIResponse.error(str(e)) 
\ No newline at end of file
+        raise APIResponse.error(str(e)) 
+
+@router.get("/metrics", status_code=status.HTTP_200_OK)
+async def metrics(container: AppContainer = Depends(get_container)):
+    """
+    Metrics in the Prometheus text exposition format, for scraping
+    """
+    try:
+        # The cache gauges are read from the media index at scrape time
+        cache_size = await asyncio.to_thread(container.media_index.get_total_size, MediaDbType.CACHE)
+        max_cache_size = container.config.get("max_cache_size_gb", 100) * 1024 * 1024 * 1024
+        CACHE_SIZE_BYTES.set(cache_size)
+        CACHE_MAX_SIZE_BYTES.set(max_cache_size)
+        CACHE_FILL_RATIO.set(cache_size / max_cache_size if max_cache_size else 0)
+        return Response(registry.render(), media_type=registry.CONTENT_TYPE)
+    except Exception as e:
+        logger.error(f"Error rendering metrics: {str(e)}", exc_info=True)
+        raise APIResponse.error(str(e))
@@ -1,8 +1,10 @@
 import typer
 import httpx
 import asyncio
-from typing import Optional
+from typing import AsyncIterator, Optional
+from urllib.parse import urlencode
 from rich.console import Console
+from rich.markup import escape
 from rich.table import Table
 from app.api.models.media_models import MediaDbType, SyncDetailRequest
 from app.api.models.search_request import SearchCacheExportFilter
@@ -16,14 +18,39 @@ app = typer.Typer()
 media_app = typer.Typer(help="Media management commands")
 system_app = typer.Typer(help="System management commands")
 cache_app = typer.Typer(help="Cache management commands")
+jobs_app = typer.Typer(help="Background job commands")
 
 # Add the command groups to the main app
 app.add_typer(media_app, name="media")
 app.add_typer(system_app, name="system")
 app.add_typer(cache_app, name="cache")
+app.add_typer(jobs_app, name="jobs")
 
 console = Console()
 
+def print_http_error(e: httpx.HTTPError) -> None:
+    """Print the error message of a failed API request"""
+    try:
+        error_detail = e.response.json() if e.response and e.response.content else {"message": str(e)}
+        if isinstance(error_detail, dict):
+            if "detail" in error_detail:
+                if isinstance(error_detail["detail"], dict):
+                    # Handle APIResponse error format
+                    if "message" in error_detail["detail"]:
+                        console.print(f"[red]Error:[/red] {error_detail['detail']['message']}")
+                    else:
+                        console.print(f"[red]Error:[/red] {error_detail['detail']}")
+                else:
+                    console.print(f"[red]Error:[/red] {error_detail['detail']}")
+            else:
+                console.print(f"[red]Error:[/red] {str(e)}")
+        else:
+            console.print(f"[red]Error:[/red] {str(e)}")
+    except json.JSONDecodeError:
+        # Handle non-JSON error responses
+        error_message = e.response.text if e.response and e.response.text else str(e)
+        console.print(f"[red]Error:[/red] {error_message}")
+
 async def make_request(method: str, endpoint: str, data: Optional[dict] = None) -> dict:
     """Make an HTTP request to the API"""
     async with httpx.AsyncClient(timeout=cli_settings.TIMEOUT) as client:
@@ -47,28 +74,93 @@ async def make_request(method: str, endpoint: str, data: Optional[dict] = None)
                 return result
             return result
         except httpx.HTTPError as e:
-            try:
-                error_detail = e.response.json() if e.response and e.response.content else {"message": str(e)}
-                if isinstance(error_detail, dict):
-                    if "detail" in error_detail:
-                        if isinstance(error_detail["detail"], dict):
-                            # Handle APIResponse error format
-                            if "message" in error_detail["detail"]:
-                                console.print(f"[red]Error:[/red] {error_detail['detail']['message']}")
-                            else:
-                                console.print(f"[red]Error:[/red] {error_detail['detail']}")
-                        else:
-                            console.print(f"[red]Error:[/red] {error_detail['detail']}")
-                    else:
-                        console.print(f"[red]Error:[/red] {str(e)}")
-                else:
-                    console.print(f"[red]Error:[/red] {str(e)}")
-            except json.JSONDecodeError:
-                # Handle non-JSON error responses
-                error_message = e.response.text if e.response and e.response.text else str(e)
-                console.print(f"[red]Error:[/red] {error_message}")
+            print_http_error(e)
+            raise typer.Exit(1)
+
+async def stream_request(endpoint: str) -> AsyncIterator[dict]:
+    """Make a GET request to an NDJSON endpoint of the API and yield each line as it arrives"""
+    async with httpx.AsyncClient(timeout=cli_settings.TIMEOUT) as client:
+        url = f"{cli_settings.API_BASE_URL}/{endpoint}"
+        try:
+            async with client.stream("GET", url) as response:
+                if response.is_error:
+                    await response.aread()
+                    response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line.strip():
+                        yield json.loads(line)
+        except httpx.HTTPError as e:
+            print_http_error(e)
             raise typer.Exit(1)
 
+def format_bytes(size: int) -> str:
+    return f"{size / (1024 * 1024 * 1024):,.2f} GB" if size >= 1024 * 1024 * 1024 else f"{size / (1024 * 1024):,.1f} MB"
+
+def format_job_progress(job: dict) -> str:
+    """Format the phase and progress of a job as a single status line"""
+    progress = job["progress"]
+    line = f"{job['type']} {job['status']}: {progress['phase']}"
+    if progress["transactions_total"]:
+        line += f"  {progress['transactions_done']}/{progress['transactions_total']} transactions"
+    if progress["bytes_total"]:
+        line += f"  {format_bytes(progress['bytes_done'])} of {format_bytes(progress['bytes_total'])}"
+    if progress.get("eta_seconds") is not None and job["status"] == "running":
+        line += f"  ETA {int(progress['eta_seconds']) // 60}m{int(progress['eta_seconds']) % 60:02d}s"
+    if job.get("cancel_requested") and job["status"] == "running":
+        line += "  (cancelling)"
+    return escape(line)
+
+async def follow_job(job_id: str) -> dict:
+    """Poll a job until it finishes, showing its progress, and return the finished job"""
+    with console.status(f"Waiting for job {job_id}...") as status:
+        while True:
+            job = (await make_request("GET", f"api/jobs/{job_id}"))["data"]
+            if job["status"] in ("completed", "failed", "cancelled"):
+                return job
+            status.update(format_job_progress(job))
+            await asyncio.sleep(cli_settings.JOB_POLL_SECONDS)
+
+def run_job(endpoint: str, data: dict, follow: bool = True) -> Optional[dict]:
+    """Start a job through the API and follow it, returning its result
+
+    Stopping the CLI with Ctrl-C leaves the job running on the server.
+    """
+    job = asyncio.run(make_request("POST", endpoint, data=data))["data"]
+    if not follow:
+        console.print(f"[green]Started job:[/green] {job['id']}")
+        return None
+    try:
+        job = asyncio.run(follow_job(job["id"]))
+    except KeyboardInterrupt:
+        console.print(f"\n[yellow]Stopped following job {job['id']}, it keeps running. Use 'jobs status {job['id']}' or 'jobs cancel {job['id']}'.[/yellow]")
+        raise typer.Exit(130)
+    if job["status"] == "failed":
+        console.print(f"[red]Error:[/red] {job['error']}")
+        raise typer.Exit(1)
+    if job["status"] == "cancelled":
+        console.print(f"[yellow]Job {job['id']} was cancelled[/yellow]")
+        raise typer.Exit(1)
+    return job["result"]
+
+def format_media_item_row(item: dict) -> str:
+    """Format a media item as a single line of search output"""
+    row = f"{item['db_type']:<12} {item['media_prefix']}-{item['quality']}/{item['title']}/{item['relative_title_filepath']}"
+    if item.get("season") is not None or item.get("episode") is not None:
+        row += f"  S{item.get('season') or 0:02d}E{item.get('episode') or 0:02d}"
+    if item.get("extended"):
+        row += f"  {item['extended']['size'] / (1024 * 1024):,.1f} MB"
+    return escape(row)
+
+async def print_search_results(endpoint: str) -> int:
+    """Print search results from the streaming search endpoint as they arrive"""
+    count = 0
+    async for item in stream_request(endpoint):
+        if count == 0:
+            console.print("\n[cyan]Search Results:[/cyan]")
+        console.print(format_media_item_row(item), highlight=False)
+        count += 1
+    return count
+
 # Media commands
 @media_app.command()
 def refresh():
@@ -98,7 +190,8 @@ def search(
     all_items: bool = typer.Option(False, "--all-items", "-a", help="Show all items"),
     matrix_filepath: Optional[str] = typer.Option(None, "--matrix-filepath", "-f", help="Matrix filepath"),
     relative_filepath: Optional[str] = typer.Option(None, "--relative-filepath", "-r", help="Relative filepath"),
-    cache_export_filter: Optional[str] = typer.Option(None, "--cache-export-filter", "-c", help="Cache export filter (comma-separated: all,cache_export,not_cache_export)")
+    cache_export_filter: Optional[str] = typer.Option(None, "--cache-export-filter", "-c", help="Cache export filter (comma-separated: all,cache_export,not_cache_export)"),
+    as_json: bool = typer.Option(False, "--json", "-j", help="Wait for all results and print them as one JSON document")
 ):
     """Search for media using the search request endpoint"""
     try:
@@ -145,8 +238,19 @@ def search(
                 console.print(f"[red]Error:[/red] Invalid cache export filter '{cache_export_filter}'. Valid types are: {', '.join(t.value for t in SearchCacheExportFilter)}")
                 raise typer.Exit(1)
             
+        # Without --json, print each result row as soon as the server streams it
+        if not as_json:
+            params["stream"] = "true"
+            query_string = urlencode(params)
+            count = asyncio.run(print_search_results(f"api/search/?{query_string}"))
+            if count:
+                console.print(f"\n[green]Success:[/green] {count} item(s) found")
+            else:
+                console.print("[yellow]No results found[/yellow]")
+            return
+
         # Convert params to query string
-        query_string = "&".join(f"{k}={v}" for k, v in params.items())
+        query_string = urlencode(params)
         result = asyncio.run(make_request("GET", f"api/search/?{query_string}"))
         
         console.print(f"[green]Success:[/green] {result['message']}")
@@ -210,7 +314,7 @@ def add(
         else:
             console.print(f"[yellow]Adding item(s) to cache...[/yellow]")
         
-        result = asyncio.run(make_request("POST", "api/cache/add", data={
+        result = run_job("api/cache/add", data={
             "query": query, 
             "media_type": media_type, 
             "quality": quality, 
@@ -219,22 +323,25 @@ def add(
             "matrix_filepath": matrix_filepath,
             "relative_filepath": relative_filepath,
             "dry_run": dry_run
-        }))
+        })
         
         if dry_run:
-            console.print(f"[green]Dry run completed:[/green] {result['message']}")
+            console.print("[green]Dry run completed[/green]")
         else:
-            console.print(f"[green]Success:[/green] {result['message']}")
+            console.print("[green]Success:[/green] Items added to cache")
         
         # Display the data if it exists
-        if result.get('data'):
+        if result and result.get('items'):
             if dry_run:
                 console.print("\n[cyan]Files that would be added to cache:[/cyan]")
             else:
                 console.print("\n[cyan]Files added to cache:[/cyan]")
-            console.print_json(data=result['data'])
+            console.print_json(data=result)
         else:
             console.print("[yellow]No results found[/yellow]")
+    except typer.Exit:
+        # run_job has already reported the failure or the cancel, keep its exit code
+        raise
     except Exception as e:
         console.print(f"[red]Error:[/red] {str(e)}")
         raise typer.Exit(1)
@@ -300,21 +407,62 @@ def sync(
     dry_run: bool = typer.Option(False, "--dry-run", "-n", help="Show what would be synced without making changes"),
     details: SyncDetailRequest = typer.Option("transactions", "--details", "-d", help="Show details of the sync operation"),
     force: bool = typer.Option(False, "--force", "-f", help="Force sync even if the media library update request count is 0"),
+    resume: bool = typer.Option(False, "--resume", "-r", help="Finish the file operations of an interrupted sync without planning again"),
+    follow: bool = typer.Option(True, "--follow/--no-follow", help="Follow the sync job until it finishes, or only start it"),
 ):
     """Sync the cache with the media library"""
     if dry_run:
         console.print("[yellow]Dry run - showing what would be synced...[/yellow]")
+    elif resume:
+        console.print("[yellow]Resuming interrupted sync...[/yellow]")
     else:
         console.print("[yellow]Syncing cache with media library...[/yellow]")
     
-    result = asyncio.run(make_request("POST", "api/sync/", data={"dry_run": dry_run, "details": details, "force": force}))
+    result = run_job("api/sync/", data={"dry_run": dry_run, "details": details, "force": force, "resume": resume}, follow=follow)
+    if not follow:
+        return
     
     # Display the data if it exists
-    if result.get('data'):
+    if result:
         if dry_run:
             console.print("\n[cyan]Files that would be synced:[/cyan]")
         else:
             console.print("\n[cyan]Files synced:[/cyan]")
-        console.print_json(data=result['data'])
+        console.print_json(data=result)
     else:
-        console.print("[yellow]No results found[/yellow]") 
\ No newline at end of file
+        console.print("[yellow]No results found[/yellow]")
+
+# Job commands
+@jobs_app.command("list")
+def list_jobs():
+    """List the running and recently finished jobs"""
+    result = asyncio.run(make_request("GET", "api/jobs/"))
+    jobs = result.get("data") or []
+    if not jobs:
+        console.print("[yellow]No jobs[/yellow]")
+        return
+    table = Table("Id", "Type", "Status", "Phase", "Progress")
+    for job in jobs:
+        progress = job["progress"]
+        table.add_row(job["id"], job["type"], job["status"], progress["phase"], f"{progress['transactions_done']}/{progress['transactions_total']}")
+    console.print(table)
+
+@jobs_app.command("status")
+def job_status(
+    job_id: str = typer.Argument(..., help="Job id"),
+    follow: bool = typer.Option(False, "--follow", "-f", help="Follow the job until it finishes"),
+):
+    """Show the status and progress of a job"""
+    if follow:
+        job = asyncio.run(follow_job(job_id))
+    else:
+        job = asyncio.run(make_request("GET", f"api/jobs/{job_id}"))["data"]
+    console.print(format_job_progress(job), highlight=False)
+    if job.get("error"):
+        console.print(f"[red]Error:[/red] {job['error']}")
+
+@jobs_app.command("cancel")
+def cancel_job(job_id: str = typer.Argument(..., help="Job id")):
+    """Cancel a job, it stops at its next phase or between two file operations"""
+    result = asyncio.run(make_request("POST", f"api/jobs/{job_id}/cancel"))
+    console.print(f"[green]Success:[/green] {result['message']}") 
\ No newline at end of file
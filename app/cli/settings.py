@@ -9,6 +9,7 @@ class CLISettings(BaseSettings):
     """
     API_BASE_URL: str = "http://127.0.0.1:8000"  # Default to localhost
     TIMEOUT: int = 300  # 5 minutes default timeout
+    JOB_POLL_SECONDS: float = 1.0  # How often a followed job is polled
     DEBUG: bool = False
 
     def __init__(self, **data):
@@ -0,0 +1,54 @@
+# Application scoped managers, built once in the lifespan and shared by the routers and the scheduler
+import asyncio
+import logging
+from typing import Any, Optional
+
+from app.api.adapters.jellyfin import JellyfinClient
+from app.api.managers.cache_manager import CacheManager
+from app.api.managers.data_manager import DataManager
+from app.api.managers.item_manager import ItemManager
+from app.api.managers.job_manager import JobManager
+from app.api.managers.matrix_manager import MatrixManager
+from app.api.managers.media_index import MediaIndex
+from app.api.managers.media_manager import MediaManager
+from app.api.managers.media_server import MediaServer
+from app.api.managers.media_watcher import MediaWatcher
+from app.api.managers.sync_history_manager import SyncHistoryManager
+from app.api.managers.sync_manager import SyncManager
+
+logger = logging.getLogger(__name__)
+
+class AppContainer:
+    """Owns the shared state of the application: the media index, the media library info and the Jellyfin client
+
+    Every manager is built once on top of them, so they all see the same index and library info,
+    and nothing is recomputed per request or per scheduled sync.
+    """
+    def __init__(self, config: dict[str, Any], jellyfin_config: dict[str, str]):
+        self.config = config
+        self.media_library_info = MatrixManager(config).get_media_library_info()
+        self.media_index = MediaIndex(config)
+        self.jellyfin_client = JellyfinClient(url=jellyfin_config["url"], api_key=jellyfin_config["api_key"])
+
+        self.item_manager = ItemManager(config, self.media_library_info)
+        self.data_manager = DataManager(config)
+        self.media_manager = MediaManager(config, self.media_index)
+        self.media_server = MediaServer(self.jellyfin_client)
+        self.cache_manager = CacheManager(config, self.media_manager, self.item_manager)
+        self.sync_manager = SyncManager(config, self.media_manager, self.cache_manager, self.item_manager,
+                                        self.media_library_info, self.media_server)
+        self.sync_history_manager = SyncHistoryManager(config)
+        self.job_manager = JobManager(config)
+        self.media_watcher = MediaWatcher(config, self.media_manager)
+
+        # The event loop serving the API, set on start. Jobs and the Jellyfin client are bound to it.
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.media_watcher.start()
+
+    async def stop(self) -> None:
+        self.media_watcher.stop()
+        await self.jellyfin_client.close()
+        self.loop = None
@@ -0,0 +1,173 @@
+# Counters, gauges and histograms rendered in the Prometheus text exposition format, without a client library
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds, from a quick API call to a sync that copies a season
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LONG_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 600, 1800, 3600)
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """A metric family, one value per combination of label values"""
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _get_label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError(f"Counter {self.name} can only increase")
+        key = self._get_label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+class Gauge(Metric):
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._get_label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        if "le" in self.labelnames:
+            raise ValueError(f"Histogram {self.name} can't have a label named le")
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label values: the count in each bucket (not cumulative), the sum and the count
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._get_label_values(labels)
+        with self._lock:
+            bucket_counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    bucket_counts[i] += 1
+                    break
+            self._values[key] = (bucket_counts, total + value, count + 1)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(bucket_counts), total, count)) for key, (bucket_counts, total, count) in self._values.items())
+        lines = []
+        for key, (bucket_counts, total, count) in values:
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(upper_bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class MetricsRegistry:
+    """The metrics of the process, rendered together for a scrape"""
+    # The response adds the charset to text types, naming it here would send it twice
+    CONTENT_TYPE = "text/plain; version=0.0.4"
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+SCAN_DURATION_SECONDS = registry.register(Histogram(
+    "mediavault_scan_duration_seconds", "Duration of media index scans", ["db_type"], buckets=LONG_BUCKETS))
+SCAN_FILES_INDEXED = registry.register(Counter(
+    "mediavault_scan_files_indexed_total", "Files found by media index scans", ["db_type"]))
+SCAN_FILES_STATTED = registry.register(Counter(
+    "mediavault_scan_files_statted_total", "Files statted by media index scans", ["db_type"]))
+FILE_TRANSACTIONS = registry.register(Counter(
+    "mediavault_file_transactions_total", "Applied file transactions by operation type and result", ["type", "result"]))
+FILE_TRANSACTION_BYTES = registry.register(Counter(
+    "mediavault_file_transaction_bytes_total", "Bytes written by applied file transactions", ["type"]))
+SYNC_PHASE_DURATION_SECONDS = registry.register(Histogram(
+    "mediavault_sync_phase_duration_seconds", "Wall time of each sync phase", ["phase", "dry_run"], buckets=LONG_BUCKETS))
+SYNC_RUNS = registry.register(Counter(
+    "mediavault_sync_runs_total", "Sync runs by outcome", ["status", "dry_run"]))
+CACHE_SIZE_BYTES = registry.register(Gauge(
+    "mediavault_cache_size_bytes", "Size of the indexed cache files"))
+CACHE_MAX_SIZE_BYTES = registry.register(Gauge(
+    "mediavault_cache_max_size_bytes", "Configured max_cache_size_gb in bytes"))
+CACHE_FILL_RATIO = registry.register(Gauge(
+    "mediavault_cache_fill_ratio", "Size of the indexed cache files against max_cache_size_gb"))
+JELLYFIN_REQUEST_DURATION_SECONDS = registry.register(Histogram(
+    "mediavault_jellyfin_request_duration_seconds", "Latency of Jellyfin API calls", ["method", "endpoint", "status"]))
+HTTP_REQUEST_DURATION_SECONDS = registry.register(Histogram(
+    "mediavault_http_request_duration_seconds", "Latency of API requests by route", ["method", "route", "status"]))
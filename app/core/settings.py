@@ -39,7 +39,7 @@ class Settings(BaseSettings):
     MEDIA_LIBRARY: Dict[str, Any] = {}
 
     # Devices settings (optional)
-    DEVICES: Optional[Dict[str, Dict[str, str]]] = {}
+    DEVICES: Optional[Dict[str, Dict[str, Any]]] = {}
 
     # Cache settings
     MEDIA_CACHE: Dict[str, Any] = {
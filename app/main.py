@@ -7,6 +7,7 @@ from datetime import datetime
 from contextlib import asynccontextmanager
 import logging
 import sys
+import time
 
 from app.core.settings import settings
 from app.api.routers import views
@@ -15,6 +16,9 @@ from app.api.routers.search import router as search_router
 from app.api.routers.cache import router as cache_router
 from app.api.routers.sync import router as sync_router
 from app.api.routers.system import router as system_router
+from app.api.routers.jobs import router as jobs_router
+from app.core.container import AppContainer
+from app.core.metrics import HTTP_REQUEST_DURATION_SECONDS
 from app.scheduler import start_scheduler, stop_scheduler
 
 log_file_path = '/var/log/mediavault-manager/mediavault-manager.log'
@@ -39,9 +43,14 @@ logging.basicConfig(
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handle startup and shutdown events"""
-    start_scheduler()
+    # One set of managers for the whole application, the routers get them from app.state
+    container = AppContainer(settings.MEDIA_LIBRARY, settings.JELLYFIN)
+    app.state.container = container
+    container.start()
+    start_scheduler(container)
     yield
     stop_scheduler()
+    await container.stop()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -50,6 +59,23 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Record the latency of every request by its route template, so path parameters don't split the series"""
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=str(status_code))
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -64,6 +90,7 @@ app.include_router(media_router, prefix="/api/media", tags=["media"])
 app.include_router(search_router, prefix="/api/search", tags=["search"])
 app.include_router(cache_router, prefix="/api/cache", tags=["cache"])
 app.include_router(sync_router, prefix="/api/sync", tags=["sync"])
+app.include_router(jobs_router, prefix="/api/jobs", tags=["jobs"])
 
 @app.get("/")
 async def root(request: Request):
@@ -8,7 +8,7 @@ from dataclasses import dataclass
 import asyncio
 import logging
 
-from app.api.managers.sync_manager import SyncManager
+from app.core.container import AppContainer
 from app.core.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -45,7 +45,7 @@ scheduler = BackgroundScheduler()
 task_registry: Dict[str, Callable] = {}
 
 def register_task(name: str, func: Callable) -> None:
-    """Register a task function with the scheduler"""
+    """Register a task function with the scheduler, it is called with the application container as container"""
     task_registry[name] = func
 
 def get_task_function(name: str) -> Callable:
@@ -54,7 +54,7 @@ def get_task_function(name: str) -> Callable:
         raise ValueError(f"Task function '{name}' not registered")
     return task_registry[name]
 
-def start_scheduler():
+def start_scheduler(container: AppContainer):
     """Start the scheduler and add default jobs"""
     if not scheduler.running:
         scheduler.start()
@@ -68,14 +68,16 @@ def start_scheduler():
                     function_name=task_data.get("function_name", task_id),
                     cron_hour=task_data.get("cron_hour", 0),
                     cron_minute=task_data.get("cron_minute", 0),
-                    cron_second=task_data.get("cron_second", 0)
+                    cron_second=task_data.get("cron_second", 0),
+                    kwargs={"container": container}
                 )
                 add_task(task_id, config)
 
 def stop_scheduler():
     """Stop the scheduler"""
     if scheduler.running:
-        scheduler.shutdown()
+        # Don't wait for running tasks, a scheduled sync runs on the event loop that is shutting down
+        scheduler.shutdown(wait=False)
 
 def add_task(task_id: str, task_config: TaskConfig) -> None:
     """Add a new task to the scheduler"""
@@ -117,19 +119,21 @@ def remove_task(task_id: str) -> None:
     """Remove a task from the scheduler"""
     scheduler.remove_job(task_id)
 
-def sync_task():
+def sync_task(container: AppContainer):
     """Run the sync task"""
     try:
         logger.info(f"Running sync task at {datetime.now()}")
-        sync_manager = SyncManager(settings.MEDIA_LIBRARY)
         
-        # Create event loop for async operation
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # Run the sync operation
-        result = loop.run_until_complete(sync_manager.sync())
-        loop.close()
+        # Run the sync operation as a job on the application event loop, so it can be followed and cancelled
+        # like one started through the API, and shares its managers and Jellyfin client.
+        # If a sync is already waiting to run, the scheduled one is coalesced into it.
+        async def run_sync():
+            job, attached = container.sync_manager.submit_sync_job(container.job_manager)
+            if attached:
+                return f"Attached to waiting sync job {job.id}"
+            return (await container.job_manager.wait_for_job(job.id)).result
+
+        result = asyncio.run_coroutine_threadsafe(run_sync(), container.loop).result()
         
         logger.info(f"Sync task completed: {result}")
     except Exception as e:
@@ -0,0 +1,82 @@
+# Benchmark of the copy ordering strategies of FileTransactionManager
+#
+# Run from the repository root, with --dir on the hard disk to measure:
+#   python -m benchmarks.copy_order --files 200 --size-mb 16 --dir /srv/storage/bench
+# The sources are written in shuffled order so their path order and disk order differ. Their
+# pages are dropped before each run, which measures the disk and not the page cache.
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from app.api.managers.file_transaction_manager import FileTransactionManager
+from app.api.models.file_transaction_models import ExistingFileAction, FileTransactionList, FileTransactionSettings
+
+STRATEGIES = ["plan", "path", "inode", "extent"]
+
+
+def create_sources(source_dir: str, files: int, size_mb: int) -> list[str]:
+    block = os.urandom(1024 * 1024)
+    paths = [os.path.join(source_dir, f"title{i % 17:02d}", f"file{i:05d}.mkv") for i in range(files)]
+    written = list(paths)
+    random.shuffle(written)
+    for path in written:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            for _ in range(size_mb):
+                f.write(block)
+            os.fsync(f.fileno())
+    return paths
+
+
+def drop_page_cache(paths: list[str]) -> None:
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the copy ordering strategies")
+    parser.add_argument("--files", type=int, default=100, help="Number of source files")
+    parser.add_argument("--size-mb", type=int, default=8, help="Size of each source file")
+    parser.add_argument("--dir", default=None, help="Folder for the fixture, put it on the disk to measure")
+    parser.add_argument("--strategy", choices=STRATEGIES, action="append", help="Strategies to run, all by default")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="mvm-order-bench-", dir=args.dir)
+    try:
+        source_dir = os.path.join(work_dir, "source")
+        destination_dir = os.path.join(work_dir, "destination")
+        sources = create_sources(source_dir, args.files, args.size_mb)
+        # The plan order of the sync follows the media groups, which is unrelated to the disk layout
+        planned = list(sources)
+        random.Random(0).shuffle(planned)
+
+        print(f"Copying {args.files} files of {args.size_mb} MB in {work_dir}")
+        for strategy in args.strategy or STRATEGIES:
+            shutil.rmtree(destination_dir, ignore_errors=True)
+            drop_page_cache(sources)
+            file_transactions = FileTransactionList(transactions=[])
+            for source in planned:
+                file_transactions.copy(
+                    source=source,
+                    destination=os.path.join(destination_dir, os.path.relpath(source, source_dir)),
+                    settings=FileTransactionSettings(existing_file_action=ExistingFileAction.OVERWRITE),
+                    metadata={})
+            manager = FileTransactionManager({"file_transactions": {"copy_order": strategy, "journal": False}})
+
+            start_time = time.perf_counter()
+            manager.apply_file_transactions(file_transactions)
+            duration = time.perf_counter() - start_time
+            print(f"  {strategy:8s} {duration:8.3f}s {args.files * args.size_mb / duration:10.1f} MB/s")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Benchmark of the FileCopier engine against shutil.copy
+#
+# Run from the repository root, on tmpfs by default or on a loopback mount with --dir:
+#   python -m benchmarks.file_copy --size-mb 1024 --dir /mnt/loop
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from app.api.adapters.file_copy import FileCopier
+
+
+def create_source(path: str, size_mb: int) -> None:
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FileCopier with shutil.copy")
+    parser.add_argument("--size-mb", type=int, default=512, help="Size of the test file")
+    parser.add_argument("--dir", default="/dev/shm" if os.path.isdir("/dev/shm") else None, help="Folder for the fixture, tmpfs by default")
+    parser.add_argument("--repeat", type=int, default=3, help="Copies per engine, the best run is reported")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="mvm-copy-bench-", dir=args.dir)
+    try:
+        source = os.path.join(work_dir, "source.bin")
+        destination = os.path.join(work_dir, "destination.bin")
+        create_source(source, args.size_mb)
+
+        engines = {
+            "shutil.copy": lambda: shutil.copy(source, destination),
+            "FileCopier": lambda: FileCopier(drop_cache=False).copy(source, destination),
+            "FileCopier (drop cache)": lambda: FileCopier().copy(source, destination),
+        }
+        print(f"Copying {args.size_mb} MB in {work_dir}")
+        for name, copy in engines.items():
+            best = None
+            method = ""
+            for _ in range(args.repeat):
+                if os.path.exists(destination):
+                    os.remove(destination)
+                start_time = time.perf_counter()
+                result = copy()
+                duration = time.perf_counter() - start_time
+                best = duration if best is None else min(best, duration)
+                method = getattr(result, "method", "")
+            print(f"  {name:24s} {best:8.3f}s {args.size_mb / best:10.1f} MB/s {method}")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
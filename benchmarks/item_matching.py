@@ -0,0 +1,78 @@
+# Benchmark of matching media items by ItemMatchKey, linear list scans against a MediaItemIndex
+#
+# Run from the repository root:
+#   python -m benchmarks.item_matching --items 50000
+import argparse
+import time
+
+from app.api.managers.item_manager import ItemManager, ItemMatchKey
+from app.api.models.media_models import MediaDbType, MediaItem
+
+CONFIG = {
+    "default_source_path": "/media/storage",
+    "cache_path": "/media/cache",
+    "media_export_path": "/media/export",
+    "cache_export_path": "/media/cache/export",
+    "system_data_path": "/tmp/mvm-benchmark",
+    "source_matrix": {
+        "tv": {"prefix": "tv", "media_type": "tv", "quality_order": ["uhd", "hd"], "use_cache": True},
+    },
+}
+
+
+def create_items(count: int, db_type: MediaDbType, base_path: str) -> list[MediaItem]:
+    items = []
+    for i in range(count):
+        title = f"Show {i // 100:05d}"
+        season = (i % 100) // 10 + 1
+        episode = i % 10 + 1
+        relative_title_filepath = f"Season {season:02d}/show-S{season:02d}E{episode:02d}.mkv"
+        items.append(MediaItem(
+            db_type=db_type,
+            media_type="tv",
+            media_prefix="tv",
+            quality="hd",
+            title=title,
+            season=season,
+            episode=episode,
+            relative_title_filepath=relative_title_filepath,
+            full_file_path=f"{base_path}/tv-hd/{title}/{relative_title_filepath}",
+        ))
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare linear item matching with MediaItemIndex")
+    parser.add_argument("--items", type=int, default=50000, help="Number of media and cache items")
+    parser.add_argument("--linear-sample", type=int, default=500, help="Lookups timed for the linear scan, extrapolated to all items")
+    args = parser.parse_args()
+
+    item_manager = ItemManager(CONFIG)
+    media_items = create_items(args.items, MediaDbType.MEDIA, CONFIG["default_source_path"])
+    cache_items = create_items(args.items, MediaDbType.CACHE, CONFIG["cache_path"])
+    key_function = item_manager.get_match_key_function(ItemMatchKey.TITLE_PATH)
+
+    # The linear scan is quadratic, so only time a sample of lookups, spread over the list
+    sample = cache_items[::max(1, len(cache_items) // args.linear_sample)][:args.linear_sample]
+    start_time = time.perf_counter()
+    for item in sample:
+        key = key_function(item)
+        next((media_item for media_item in media_items if key_function(media_item) == key), None)
+    linear_seconds = (time.perf_counter() - start_time) / len(sample) * len(cache_items)
+
+    start_time = time.perf_counter()
+    media_index = item_manager.create_item_index(media_items, ItemMatchKey.TITLE_PATH)
+    build_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    matched = sum(1 for item in cache_items if item_manager.get_matching_item(item, media_index, ItemMatchKey.TITLE_PATH))
+    lookup_seconds = time.perf_counter() - start_time
+    indexed_seconds = build_seconds + lookup_seconds
+
+    print(f"Matching {len(cache_items)} cache items against {len(media_items)} media items by {ItemMatchKey.TITLE_PATH.value}")
+    print(f"  linear scan:   {linear_seconds:10.3f}s (extrapolated from {len(sample)} lookups)")
+    print(f"  MediaItemIndex:{indexed_seconds:10.3f}s (build {build_seconds:.3f}s, lookups {lookup_seconds:.3f}s, {matched} matched)")
+    print(f"  speedup:       {linear_seconds / indexed_seconds:10.0f}x")
+
+
+if __name__ == "__main__":
+    main()